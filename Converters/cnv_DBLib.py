@@ -11,10 +11,25 @@ try:
 except ImportError:
     from PythonExporter.Exporters.converter_base import ConverterBase
 
+from .. import querylog  # pylint: disable=wrong-import-position
+from .. import uploads  # pylint: disable=wrong-import-position
+
 if TYPE_CHECKING:
     from PythonExporter.Exporters.implementation import PythonExporterImpl
 
 
+def _not_exported(exporter: 'PythonExporterImpl', node: NodeBase, reason: str,
+                  value: str = ''):
+    """Export a callable node whose feature has no meaning in the script as a
+    comment (and `value` as its output if given), then continue the graph"""
+    if value:
+        exporter.add_call(f"{exporter.get_out_list(node, post=' = ')}{value}  # {reason}\n")
+    else:
+        exporter.add_call(f"# {node.name}: {reason}\n")
+    exporter.set_node_processed(node)
+    exporter.call_named_pin(node, 'outExec')
+
+
 class PyCnvDBLib(ConverterBase):  # type: ignore
     """A converter class for the DBLib conversion"""
 
@@ -30,7 +45,7 @@ class PyCnvDBLib(ConverterBase):  # type: ignore
         """Convert SQLServerConn node type"""
         if not exporter.is_node_function_processed(node):
             exporter.add_import('sqlalchemy', imports=['create_engine', 'URL'])
-            exporter.add_sys_function("""def connect_sqlserver(db_host, db_name, trusted_conn):
+            exporter.add_sys_function("""def connect_sqlserver(db_host, db_name, trusted_conn, fast_executemany):
     \"\"\"Connect to an SQL server according to the parameters\"\"\"
     engine = create_engine(
         URL.create('mssql+pyodbc', query={'odbc_connect':
@@ -38,13 +53,13 @@ class PyCnvDBLib(ConverterBase):  # type: ignore
             f"Database={db_name};" + \\
             f"Trusted_Connection={'yes' if trusted_conn else 'no'};"}
         ),
-        fast_executemany=False,
-        use_setinputsizes=False
+        fast_executemany=fast_executemany
     )
     return engine""")
             exporter.set_node_function_processed(node)
+        # the script connects once, the pool settings are not exported
         exporter.add_call(f"{exporter.get_out_list(node, post=' = ')}" + \
-                          f"connect_sqlserver({', '.join(inpnames)})\n")
+                          f"connect_sqlserver({', '.join(inpnames[:4])})\n")
         exporter.set_node_processed(node)
         exporter.call_named_pin(node, 'outExec')
 
@@ -62,8 +77,99 @@ class PyCnvDBLib(ConverterBase):  # type: ignore
     engine = create_engine(connection_url)
     return engine""")
             exporter.set_node_function_processed(node)
+        # the script connects once, the pool settings are not exported
+        exporter.add_call(f"{exporter.get_out_list(node, post=' = ')}" +
+                          f"connect_genericdb({inpnames[0]})\n")
+        exporter.set_node_processed(node)
+        exporter.call_named_pin(node, 'outExec')
+
+
+    @staticmethod
+    def SetQueryPoolSize(exporter: 'PythonExporterImpl',
+                         node: NodeBase,
+                         inpnames: list[str],  # pylint: disable=unused-argument
+                         *args, **kwargs):  # pylint: disable=unused-argument
+        """Convert SetQueryPoolSize node type"""
+        _not_exported(exporter, node, "the script runs its queries one after the other")
+
+
+    @staticmethod
+    def CancelQueries(exporter: 'PythonExporterImpl',
+                      node: NodeBase,
+                      inpnames: list[str],  # pylint: disable=unused-argument
+                      *args, **kwargs):  # pylint: disable=unused-argument
+        """Convert CancelQueries node type"""
+        _not_exported(exporter, node, "the script runs no queries in the background", '0')
+
+
+    @staticmethod
+    def DisposeEngines(exporter: 'PythonExporterImpl',
+                       node: NodeBase,
+                       inpnames: list[str],  # pylint: disable=unused-argument
+                       *args, **kwargs):  # pylint: disable=unused-argument
+        """Convert DisposeEngines node type"""
+        _not_exported(exporter, node, "the script keeps no registry of pooled engines", '0')
+
+
+    ################
+    ### Sessions ###
+    ################
+
+    @staticmethod
+    def BeginSession(exporter: 'PythonExporterImpl',
+                     node: NodeBase,
+                     inpnames: list[str],  # pylint: disable=unused-argument
+                     *args, **kwargs):  # pylint: disable=unused-argument
+        """Convert BeginSession node type"""
+        if not exporter.is_node_function_processed(node):
+            exporter.add_sys_function("""def begin_session(conn):
+    \"\"\"Open a connection with a transaction shared by the following queries\"\"\"
+    session = conn.engine.connect()
+    session.begin()
+    return session""")
+            exporter.set_node_function_processed(node)
+        exporter.add_call(f"{exporter.get_out_list(node, post=' = ')}" +
+                          f"begin_session({', '.join(inpnames)})\n")
+        exporter.set_node_processed(node)
+        exporter.call_named_pin(node, 'outExec')
+
+
+    @staticmethod
+    def CommitSession(exporter: 'PythonExporterImpl',
+                      node: NodeBase,
+                      inpnames: list[str],  # pylint: disable=unused-argument
+                      *args, **kwargs):  # pylint: disable=unused-argument
+        """Convert CommitSession node type"""
+        if not exporter.is_node_function_processed(node):
+            exporter.add_sys_function("""def commit_session(session):
+    \"\"\"Commit the work of the session and close it\"\"\"
+    try:
+        session.commit()
+    finally:
+        session.close()""")
+            exporter.set_node_function_processed(node)
+        exporter.add_call(f"{exporter.get_out_list(node, post=' = ')}" +
+                          f"commit_session({', '.join(inpnames)})\n")
+        exporter.set_node_processed(node)
+        exporter.call_named_pin(node, 'outExec')
+
+
+    @staticmethod
+    def RollbackSession(exporter: 'PythonExporterImpl',
+                        node: NodeBase,
+                        inpnames: list[str],  # pylint: disable=unused-argument
+                        *args, **kwargs):  # pylint: disable=unused-argument
+        """Convert RollbackSession node type"""
+        if not exporter.is_node_function_processed(node):
+            exporter.add_sys_function("""def rollback_session(session):
+    \"\"\"Undo the work of the session and close it\"\"\"
+    try:
+        session.rollback()
+    finally:
+        session.close()""")
+            exporter.set_node_function_processed(node)
         exporter.add_call(f"{exporter.get_out_list(node, post=' = ')}" +
-                          f"connect_genericdb({', '.join(inpnames)})\n")
+                          f"rollback_session({', '.join(inpnames)})\n")
         exporter.set_node_processed(node)
         exporter.call_named_pin(node, 'outExec')
 
@@ -80,11 +186,18 @@ class PyCnvDBLib(ConverterBase):  # type: ignore
         """Convert PandasUpload nodes"""
         # export function definition
         if not exporter.is_node_function_processed(node):
+            exporter.add_import('pandas', alias='pd')
+            exporter.add_import('sqlalchemy', imports=['Connection', 'Index', 'MetaData',
+                                                       'Table', 'inspect', 'NVARCHAR'])
+            exporter.add_import('contextlib', imports=['nullcontext'])
+            exporter.add_import('io')
+            exporter.add_import('typing', imports=['Iterable', 'Union', 'Optional'])
+            exporter.add_setup("uploads_functions", uploads.UPLOADS_STR)
             exporter.add_sys_function(
-"""def uploadPandas(conn, df, tablename, with_index, if_exists):
-    if not with_index:
-        df = df.reset_index(drop=True)
-    df.to_sql(tablename, conn, method='multi', index=with_index, if_exists=if_exists)
+"""def uploadPandas(conn, df, tablename, with_index, if_exists, chunksize, strategy,
+                 rebuild_indexes, merge_keys):
+    upload_frames(conn, df, tablename, with_index, if_exists, chunksize, strategy,
+                  rebuild_indexes, split_keys(merge_keys))
 """)
             exporter.set_node_function_processed(node)
         exporter.add_call(
@@ -94,6 +207,76 @@ class PyCnvDBLib(ConverterBase):  # type: ignore
         exporter.call_named_pin(node, DEFAULT_OUT_EXEC_NAME)
 
 
+    ###################
+    ### Query cache ###
+    ###################
+
+    @staticmethod
+    def call_QueryCacheStats(exporter: 'PythonExporterImpl',
+                             node: NodeBase,
+                             inpnames: list[str],  # pylint: disable=unused-argument
+                             *args, **kwargs):  # pylint: disable=unused-argument
+        """Convert QueryCacheStats nodes"""
+        # the script has no result cache, all counters stay zero
+        zeros = ', '.join('0' for _ in node.outputs)
+        return f"{exporter.get_out_list(node, post=' = ')}{zeros}\n"
+
+
+    @staticmethod
+    def ClearQueryCache(exporter: 'PythonExporterImpl',
+                        node: NodeBase,
+                        inpnames: list[str],  # pylint: disable=unused-argument
+                        *args, **kwargs):  # pylint: disable=unused-argument
+        """Convert ClearQueryCache node type"""
+        _not_exported(exporter, node, "the script has no result cache")
+
+
+    ######################
+    ### Slow query log ###
+    ######################
+
+    @staticmethod
+    def call_SlowQueryLog(exporter: 'PythonExporterImpl',
+                          node: NodeBase,
+                          inpnames: list[str],  # pylint: disable=unused-argument
+                          *args, **kwargs):  # pylint: disable=unused-argument
+        """Convert SlowQueryLog nodes"""
+        # the script logs no slow queries, the log is an empty frame
+        exporter.add_import('pandas', alias='pd')
+        columns = list(querylog.StatementStats._fields)
+        return f"{exporter.get_out_list(node, post=' = ')}pd.DataFrame(columns={columns!r})\n"
+
+
+    @staticmethod
+    def WriteSlowQueryLog(exporter: 'PythonExporterImpl',
+                          node: NodeBase,
+                          inpnames: list[str],  # pylint: disable=unused-argument
+                          *args, **kwargs):  # pylint: disable=unused-argument
+        """Convert WriteSlowQueryLog node type"""
+        # the script logs no slow queries, the file is written empty
+        exporter.add_call(f"open({inpnames[0]}, 'w', encoding='utf8').close()\n")
+        exporter.set_node_processed(node)
+        exporter.call_named_pin(node, 'outExec')
+
+
+    @staticmethod
+    def SetSlowQueryLogFile(exporter: 'PythonExporterImpl',
+                            node: NodeBase,
+                            inpnames: list[str],  # pylint: disable=unused-argument
+                            *args, **kwargs):  # pylint: disable=unused-argument
+        """Convert SetSlowQueryLogFile node type"""
+        _not_exported(exporter, node, "the script logs no slow queries")
+
+
+    @staticmethod
+    def ClearSlowQueryLog(exporter: 'PythonExporterImpl',
+                          node: NodeBase,
+                          inpnames: list[str],  # pylint: disable=unused-argument
+                          *args, **kwargs):  # pylint: disable=unused-argument
+        """Convert ClearSlowQueryLog node type"""
+        _not_exported(exporter, node, "the script logs no slow queries")
+
+
     #########################
     ### Data manipulation ###
     #########################
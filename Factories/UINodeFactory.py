@@ -3,6 +3,7 @@ from PyFlow.UI.Canvas.UINodeBase import UINodeBase
 
 from ..UI.UISQLQueryNode import UISQLQueryNode
 from ..UI.UIPandasSQLQueryNode import UIPandasSQLQueryNode
+from ..UI.UIDBConnNode import UIDBConnNode
 
 def createUINode(raw_instance):
     """The factory function for provided Node UI classes"""
@@ -10,4 +11,6 @@ def createUINode(raw_instance):
         return UISQLQueryNode(raw_instance)
     elif raw_instance.__class__.__name__ == 'PandasSQLQuery':
         return UIPandasSQLQueryNode(raw_instance)
+    elif raw_instance.__class__.__name__ in ('SQLServerConn', 'GenericDBConn'):
+        return UIDBConnNode(raw_instance)
     return UINodeBase(raw_instance)
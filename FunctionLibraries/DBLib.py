@@ -1,9 +1,16 @@
 """Database Tools Nodes"""  # pylint: disable=invalid-name
-from PyFlow.Core.Common import NodeTypes, NodeMeta, PinSpecifiers, PinOptions
+from PyFlow.Core.Common import NodeTypes, NodeMeta, PinSpecifiers, PinOptions, REF
 from PyFlow.Core import FunctionLibraryBase, IMPLEMENT_NODE
-from sqlalchemy.engine import create_engine, URL
+from sqlalchemy.engine import URL
 
 from ..constants import DB_HEADER_COLOR, PDLIB_HEADER_COLOR
+from ..querycache import QUERY_CACHE, DISK_CACHE
+from ..querylog import SLOW_QUERY_LOG
+from .. import queryexecutor
+from .. import querycancel
+from .. import sessions
+from .. import engines
+from .. import uploads
 
 # pylint: disable=wrong-import-order
 import pandas as pd
@@ -29,15 +36,29 @@ class DBLib(FunctionLibraryBase):
                     })
     def SQLServerConn(db_host=('StringPin', ''),  # pylint: disable=invalid-name
                      db_name=('StringPin', ''),
-                     trusted_conn=('BoolPin', False)):
-        """Create a DB Connection to be used in query nodes"""
-        engine = create_engine(
+                     trusted_conn=('BoolPin', False),
+                     fast_executemany=('BoolPin', True),
+                     pool_size=('IntPin', engines.DEFAULT_POOL_SIZE),
+                     max_overflow=('IntPin', engines.DEFAULT_MAX_OVERFLOW),
+                     pool_pre_ping=('BoolPin', engines.DEFAULT_POOL_PRE_PING),
+                     pool_recycle=('IntPin', engines.DEFAULT_POOL_RECYCLE),
+                     prewarm_connections=('IntPin', engines.DEFAULT_PREWARM_CONNECTIONS)):
+        """Create a DB Connection to be used in query nodes
+        (reusing the pooled engine of earlier runs with the same settings,
+        a new engine opens `prewarm_connections` in the background)
+        Note #1: `fast_executemany` makes pyodbc send uploads in array batches
+        (sized by the column types, the uploads create sized text columns)"""
+        engine = engines.get_engine(
             URL.create('mssql+pyodbc', query={
                 'odbc_connect': f"Driver=SQL Server;Server={db_host};" + \
                                 f"Database={db_name};" + \
                                 f"Trusted_Connection={'yes' if trusted_conn else 'no'};"}),
-                fast_executemany=False,
-                use_setinputsizes=False
+                fast_executemany=fast_executemany,
+                pool_size=pool_size,
+                max_overflow=max_overflow,
+                pool_pre_ping=pool_pre_ping,
+                pool_recycle=pool_recycle,
+                prewarm_connections=prewarm_connections
         )
         return engine
 
@@ -50,14 +71,109 @@ class DBLib(FunctionLibraryBase):
                         NodeMeta.KEYWORDS: ['Database', 'DB', 'Server', 'SQL'],
                         NodeMeta.HEADER_COLOR: DB_HEADER_COLOR
     })
-    def GenericDBConn(connection_url=('StringPin', '')):  # pylint: disable=invalid-name
-        """Create a DB Connection to be used in query nodes"""
-        engine = create_engine(connection_url)
+    def GenericDBConn(connection_url=('StringPin', ''),  # pylint: disable=invalid-name
+                      pool_size=('IntPin', engines.DEFAULT_POOL_SIZE),
+                      max_overflow=('IntPin', engines.DEFAULT_MAX_OVERFLOW),
+                      pool_pre_ping=('BoolPin', engines.DEFAULT_POOL_PRE_PING),
+                      pool_recycle=('IntPin', engines.DEFAULT_POOL_RECYCLE),
+                      prewarm_connections=('IntPin', engines.DEFAULT_PREWARM_CONNECTIONS)):
+        """Create a DB Connection to be used in query nodes
+        (reusing the pooled engine of earlier runs with the same settings,
+        a new engine opens `prewarm_connections` in the background)"""
+        engine = engines.get_engine(connection_url,
+                                    pool_size=pool_size,
+                                    max_overflow=max_overflow,
+                                    pool_pre_ping=pool_pre_ping,
+                                    pool_recycle=pool_recycle,
+                                    prewarm_connections=prewarm_connections)
         return engine
 
 
+    @staticmethod
+    @IMPLEMENT_NODE(returns=None,  # type: ignore
+                    nodeType=NodeTypes.Callable,
+                    meta={
+                        NodeMeta.CATEGORY: 'DatabaseTools|Server',
+                        NodeMeta.KEYWORDS: ['async', 'thread', 'pool'],
+                        NodeMeta.HEADER_COLOR: DB_HEADER_COLOR
+                    })
+    def SetQueryPoolSize(max_workers=('IntPin', queryexecutor.DEFAULT_MAX_WORKERS)):  # pylint: disable=invalid-name
+        """Sets the number of worker threads running asynchronous queries"""
+        queryexecutor.set_max_workers(max_workers)
+
+
+    @staticmethod
+    @IMPLEMENT_NODE(returns=('IntPin', 0),  # type: ignore
+                    nodeType=NodeTypes.Callable,
+                    meta={
+                        NodeMeta.CATEGORY: 'DatabaseTools|Server',
+                        NodeMeta.KEYWORDS: ['cancel', 'interrupt', 'stop', 'timeout'],
+                        NodeMeta.HEADER_COLOR: DB_HEADER_COLOR
+                    })
+    def CancelQueries():  # pylint: disable=invalid-name
+        """Interrupts every running query, returns their number"""
+        return querycancel.cancel_all()
+
+
+    @staticmethod
+    @IMPLEMENT_NODE(returns=('IntPin', 0),  # type: ignore
+                    nodeType=NodeTypes.Callable,
+                    meta={
+                        NodeMeta.CATEGORY: 'DatabaseTools|Server',
+                        NodeMeta.KEYWORDS: ['pool', 'engine', 'dispose', 'reconnect'],
+                        NodeMeta.HEADER_COLOR: DB_HEADER_COLOR
+                    })
+    def DisposeEngines():  # pylint: disable=invalid-name
+        """Closes the pooled connections of the registered engines (the next
+        run of the connection nodes connects again), returns their number"""
+        return engines.dispose_all()
+
+
     # TODO: add other specific database connections
 
+    ################
+    ### Sessions ###
+    ################
+
+    @staticmethod
+    @IMPLEMENT_NODE(returns=('DBSessionPin', None),  # type: ignore
+                    nodeType=NodeTypes.Callable,
+                    meta={
+                        NodeMeta.CATEGORY: 'DatabaseTools|Server',
+                        NodeMeta.KEYWORDS: ['session', 'transaction', 'begin', 'connection'],
+                        NodeMeta.HEADER_COLOR: DB_HEADER_COLOR
+                    })
+    def BeginSession(conn=('DBEnginePin', None)):  # pylint: disable=invalid-name
+        """Opens a connection with a transaction which the query and upload
+        nodes connected to it share (temporary tables live until it ends)"""
+        return sessions.open_session(conn)
+
+
+    @staticmethod
+    @IMPLEMENT_NODE(returns=None,  # type: ignore
+                    nodeType=NodeTypes.Callable,
+                    meta={
+                        NodeMeta.CATEGORY: 'DatabaseTools|Server',
+                        NodeMeta.KEYWORDS: ['session', 'transaction', 'commit'],
+                        NodeMeta.HEADER_COLOR: DB_HEADER_COLOR
+                    })
+    def CommitSession(session=('DBSessionPin', None)):  # pylint: disable=invalid-name
+        """Commits the work of the session and closes it"""
+        sessions.commit_session(session)
+
+
+    @staticmethod
+    @IMPLEMENT_NODE(returns=None,  # type: ignore
+                    nodeType=NodeTypes.Callable,
+                    meta={
+                        NodeMeta.CATEGORY: 'DatabaseTools|Server',
+                        NodeMeta.KEYWORDS: ['session', 'transaction', 'rollback'],
+                        NodeMeta.HEADER_COLOR: DB_HEADER_COLOR
+                    })
+    def RollbackSession(session=('DBSessionPin', None)):  # pylint: disable=invalid-name
+        """Rolls back the work of the session and closes it"""
+        sessions.rollback_session(session)
+
     ####################
     ### Data loaders ###
     ####################
@@ -95,13 +211,123 @@ class DBLib(FunctionLibraryBase):
                      df=('DataFramePin', None),
                      tablename=('StringPin', '#temptable'),
                      with_index=('BoolPin', False),
-                     if_exists=('StringPin', 'fail', { PinSpecifiers.VALUE_LIST: ['fail', 'replace', 'append'] })
+                     if_exists=('StringPin', 'fail', { PinSpecifiers.VALUE_LIST: ['fail', 'replace', 'append', 'merge'] }),
+                     chunksize=('IntPin', uploads.DEFAULT_CHUNKSIZE),
+                     strategy=('StringPin', 'auto', { PinSpecifiers.VALUE_LIST: ['auto', *uploads.LOADERS] }),
+                     rebuild_indexes=('BoolPin', False),
+                     merge_keys=('StringPin', '')
                ):
-        """Uploads a Pandas DataFrame to a database
-        Note #1: prefix table name with # for MSSQL to upload a temporary table"""
-        if not with_index:
-            df = df.reset_index(drop=True)
-        df.to_sql(tablename, conn, method='multi', index=with_index, if_exists=if_exists)
+        """Uploads a Pandas DataFrame (or an iterator of DataFrame chunks) to a
+        database in batches of `chunksize` rows (0: in one batch) in one transaction
+        Note #1: prefix table name with # for MSSQL to upload a temporary table
+        Note #2: the 'auto' strategy uses COPY on PostgreSQL, executemany with
+        synchronous=OFF on SQLite and INSERTs elsewhere, 'staging' moves the rows
+        from a staging table, `rebuild_indexes` drops the indexes while appending
+        Note #3: 'merge' upserts through a staging table on the comma separated
+        `merge_keys` columns (PostgreSQL and SQLite need a unique index on them)"""
+        uploads.upload_frames(conn, df, tablename, with_index, if_exists, chunksize,
+                              strategy, rebuild_indexes, uploads.split_keys(merge_keys))
+
+
+    ###################
+    ### Query cache ###
+    ###################
+
+    @staticmethod
+    @IMPLEMENT_NODE(returns=None,  # type: ignore
+                    nodeType=NodeTypes.Pure,
+                    meta={
+                        NodeMeta.CATEGORY: 'DatabaseTools|Cache',
+                        NodeMeta.KEYWORDS: ['cache', 'statistics'],
+                        NodeMeta.HEADER_COLOR: DB_HEADER_COLOR,
+                    })
+    def QueryCacheStats(entries=(REF, ('IntPin', 0)),  # pylint: disable=invalid-name
+                        cached_bytes=(REF, ('IntPin', 0)),
+                        hits=(REF, ('IntPin', 0)),
+                        misses=(REF, ('IntPin', 0)),
+                        evictions=(REF, ('IntPin', 0))):
+        """Returns the counters of the in-memory query result cache"""
+        stats = QUERY_CACHE.stats()
+        entries(stats['entries'])
+        cached_bytes(stats['bytes'])
+        hits(stats['hits'])
+        misses(stats['misses'])
+        evictions(stats['evictions'])
+
+
+    @staticmethod
+    @IMPLEMENT_NODE(returns=None,  # type: ignore
+                    nodeType=NodeTypes.Callable,
+                    meta={
+                        NodeMeta.CATEGORY: 'DatabaseTools|Cache',
+                        NodeMeta.KEYWORDS: ['cache', 'invalidate', 'clear'],
+                        NodeMeta.HEADER_COLOR: DB_HEADER_COLOR,
+                    })
+    def ClearQueryCache(memory=('BoolPin', True),  # pylint: disable=invalid-name
+                        disk=('BoolPin', True)):
+        """Drops the cached query results from memory and/or disk"""
+        if memory:
+            QUERY_CACHE.clear()
+        if disk:
+            DISK_CACHE.clear()
+
+
+    ######################
+    ### Slow query log ###
+    ######################
+
+    @staticmethod
+    @IMPLEMENT_NODE(returns=('DataFramePin', None),  # type: ignore
+                    nodeType=NodeTypes.Pure,
+                    meta={
+                        NodeMeta.CATEGORY: 'DatabaseTools|Diagnostics',
+                        NodeMeta.KEYWORDS: ['slow', 'log', 'explain', 'profile'],
+                        NodeMeta.HEADER_COLOR: DB_HEADER_COLOR,
+                    })
+    def SlowQueryLog(node_name=('StringPin', '')):  # pylint: disable=invalid-name
+        """Returns the slow statements logged by the query nodes
+        (of the given node only if `node_name` is not empty)"""
+        return SLOW_QUERY_LOG.to_frame(node_name or None)
+
+
+    @staticmethod
+    @IMPLEMENT_NODE(returns=None,  # type: ignore
+                    nodeType=NodeTypes.Callable,
+                    meta={
+                        NodeMeta.CATEGORY: 'DatabaseTools|Diagnostics',
+                        NodeMeta.KEYWORDS: ['slow', 'log', 'jsonl', 'save'],
+                        NodeMeta.HEADER_COLOR: DB_HEADER_COLOR,
+                    })
+    def WriteSlowQueryLog(path=('StringPin', 'slowqueries.jsonl')):  # pylint: disable=invalid-name
+        """Writes the slow query log to a JSONL file"""
+        SLOW_QUERY_LOG.write_jsonl(path)
+
+
+    @staticmethod
+    @IMPLEMENT_NODE(returns=None,  # type: ignore
+                    nodeType=NodeTypes.Callable,
+                    meta={
+                        NodeMeta.CATEGORY: 'DatabaseTools|Diagnostics',
+                        NodeMeta.KEYWORDS: ['slow', 'log', 'jsonl'],
+                        NodeMeta.HEADER_COLOR: DB_HEADER_COLOR,
+                    })
+    def SetSlowQueryLogFile(path=('StringPin', '')):  # pylint: disable=invalid-name
+        """Appends every new slow query log entry to a JSONL file
+        (an empty path stops writing)"""
+        SLOW_QUERY_LOG.log_file = path or None
+
+
+    @staticmethod
+    @IMPLEMENT_NODE(returns=None,  # type: ignore
+                    nodeType=NodeTypes.Callable,
+                    meta={
+                        NodeMeta.CATEGORY: 'DatabaseTools|Diagnostics',
+                        NodeMeta.KEYWORDS: ['slow', 'log', 'clear'],
+                        NodeMeta.HEADER_COLOR: DB_HEADER_COLOR,
+                    })
+    def ClearSlowQueryLog():  # pylint: disable=invalid-name
+        """Drops the entries of the slow query log"""
+        SLOW_QUERY_LOG.clear()
 
 
     ############################
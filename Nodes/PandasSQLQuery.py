@@ -1,9 +1,9 @@
 """A node running an SQL query against multiple Pandas DataFrames"""  # pylint: disable=invalid-name
 
 import json
-from typing import TYPE_CHECKING, Optional, cast
-import re
+from typing import TYPE_CHECKING, Optional, Union, cast
 import uuid
+import pandas as pd
 
 from PyFlow.Core import NodeBase, PinBase
 from PyFlow.Core.NodeBase import NodePinsSuggestionsHelper
@@ -15,6 +15,9 @@ if TYPE_CHECKING:
 
 from ..constants import PDLIB_HEADER_COLOR  # pylint: disable=wrong-import-position
 from .. import pandasql2  # pylint: disable=wrong-import-position
+from .. import duckdbsql  # pylint: disable=wrong-import-position
+from .. import sqlscript  # pylint: disable=wrong-import-position
+from ..querycache import DISK_CACHE, FINGERPRINT_STR, make_key, frame_fingerprint  # pylint: disable=wrong-import-position
 
 
 class PandasSQLQuery(NodeBase):
@@ -50,6 +53,50 @@ class PandasSQLQuery(NodeBase):
             group=''
         ))
         self.p_param_dict.enableOptions(PinOptions.AllowAny)
+        self.p_disk_cache = cast(PinBase, self.createInputPin(
+            pinName='disk_cache',
+            dataType='BoolPin',
+            defaultValue=False,
+            callback=None,
+            structure=StructureType.Single,
+            constraint=None,
+            structConstraint=None,
+            supportedPinDataTypes=[],
+            group='Caching'
+        ))
+        self.p_arrow_dtypes = cast(PinBase, self.createInputPin(
+            pinName='arrow_dtypes',
+            dataType='BoolPin',
+            defaultValue=False,
+            callback=None,
+            structure=StructureType.Single,
+            constraint=None,
+            structConstraint=None,
+            supportedPinDataTypes=[],
+            group='Result'
+        ))
+        self.p_use_duckdb = cast(PinBase, self.createInputPin(
+            pinName='use_duckdb',
+            dataType='BoolPin',
+            defaultValue=False,
+            callback=None,
+            structure=StructureType.Single,
+            constraint=None,
+            structConstraint=None,
+            supportedPinDataTypes=[],
+            group='Execution'
+        ))
+        self.p_indexes = cast(PinBase, self.createInputPin(
+            pinName='indexes',
+            dataType='StringPin',
+            defaultValue='',
+            callback=None,
+            structure=StructureType.Single,
+            constraint=None,
+            structConstraint=None,
+            supportedPinDataTypes=[],
+            group='Execution'
+        ))
         self.p_completed = cast(PinBase, self.createOutputPin(
             pinName='completed',
             dataType='ExecPin'
@@ -67,6 +114,8 @@ class PandasSQLQuery(NodeBase):
         self.p_result.disableOptions(PinOptions.Storable)
 
         self.headerColor = PDLIB_HEADER_COLOR
+        # kept between the runs to upload only the changed DataFrames
+        self._psql: Optional[Union[pandasql2.PandaSQL, duckdbsql.DuckDBSQL]] = None
 
 
     def addInPin(self, name: str, dataType: str):
@@ -118,6 +167,40 @@ class PandasSQLQuery(NodeBase):
         return 'A node running an SQL query against multiple Pandas DataFrames'
 
 
+    def _dynamic_pins(self) -> list[PinBase]:
+        """The dynamically added input table and query parameter pins"""
+        return [pin for pin in self.orderedInputs.values()
+                if pin not in [self.p_query,
+                               self.p_sql,
+                               self.p_param_dict,
+                               self.p_disk_cache,
+                               self.p_arrow_dtypes,
+                               self.p_use_duckdb,
+                               self.p_indexes]]
+
+
+    def _declared_indexes(self, declarations: str) -> dict[str, list[tuple[str, ...]]]:
+        """Parse the `indexes` declarations, raises if one names a table which
+        is not an input pin (e.g. after renaming the pin)"""
+        indexes = pandasql2.parse_indexes(declarations)
+        tables = {pin.name.lower() for pin in self._dynamic_pins()
+                  if pin.dataType=='DataFramePin'}
+        unknown = sorted(set(indexes) - tables)
+        if unknown:
+            raise ValueError(f"Indexes declared for unknown tables {', '.join(unknown)}, "
+                             f"the input tables are {', '.join(sorted(tables)) or 'none'}")
+        return indexes
+
+
+    def _export_names(self, inpnames: list[str]) -> dict[str, str]:
+        """Map the input pin names to the expressions the exporter passed in
+        `inpnames` (an unconnected param_dict pin is not passed)"""
+        pins = [pin for pin in self.orderedInputs.values()
+                if pin is not self.p_query
+                   and (pin is not self.p_param_dict or pin.hasConnections())]
+        return {pin.name: inpname for pin, inpname in zip(pins, inpnames)}
+
+
     def to_python(self,  # pylint: disable=unused-argument
                   exporter: 'PythonExporterImpl',
                   inpnames: list[str],  # pylint: disable=unused-argument
@@ -127,29 +210,40 @@ class PandasSQLQuery(NodeBase):
         # export function definition
         if not exporter.is_node_function_processed(self):
             exporter.add_import("pandas", alias="pd")
-            exporter.add_import("re")
             exporter.add_import("pandasql.sqldf", imports=["extract_table_names",
                                                            "write_table",
                                                            "get_outer_frame_variables",
                                                            "PandaSQLException",
                                                            "PandaSQL as pSQL"])
             exporter.add_import("sqlalchemy.exc", imports=["DatabaseError", "ResourceClosedError"])
+            exporter.add_import("sqlalchemy", imports=["text", "TextClause", "inspect"])
+            exporter.add_import("functools", imports=["lru_cache"])
+            exporter.add_import("typing", imports=["NamedTuple", "Optional", "Callable"])
+            exporter.add_import("hashlib")
+            exporter.add_import("logging")
+            exporter.add_import("operator")
+            exporter.add_import("re")
+            exporter.add_setup("sqlscript_functions", sqlscript.SQLSCRIPT_STR)
+            exporter.add_setup("fingerprint_functions", FINGERPRINT_STR)
             exporter.add_setup("pandasql_functions", pandasql2.PANDASQL_STR)
 
             exporter.add_sys_function(
-                """def queryPandas(sql, tables, params):
-    psql = PandaSQL(persist=True)
+                """def queryPandas(sql, tables, params, dtype_backend=None, psql=None):
+    if psql is None:
+        psql = PandaSQL(persist=True, fingerprint=frame_fingerprint)
 
-    sqlstatements = [s
-                        for s in sql.split(';\\n')
-                        if not re.search(r"^[;\\s]*$", s)]
+    sqlstatements = parse_sql_script(sql).statements
     results = []
 
-    for sqlstatement in sqlstatements:
-        res = psql(sqlstatement, tables, params=params)  # type: ignore
-        if res is not None:
-            res.columns = psql.uniquify(res.columns)
-            results.append(res)
+    try:
+        for sqlstatement in sqlstatements:
+            res = psql(sqlstatement, tables, params=params,  # type: ignore
+                       dtype_backend=dtype_backend)
+            if res is not None:
+                res.columns = psql.uniquify(res.columns)
+                results.append(res)
+    finally:
+        psql.end_run()
 
     if len(results)==0:
         return None
@@ -158,32 +252,48 @@ class PandasSQLQuery(NodeBase):
     return results
 """)
             exporter.set_node_function_processed(self)
+        # one persistent instance per node (reused when the call is in a loop)
+        psql_name = f"{self.name}_psql"
+        if self.p_use_duckdb.currentData():
+            exporter.add_import("duckdb")
+            exporter.add_import("re")
+            exporter.add_setup("duckdbsql_functions", duckdbsql.DUCKDBSQL_STR)
+            exporter.add_setup(psql_name, f"{psql_name} = DuckDBSQL()\n")
+        elif self.p_indexes.currentData():
+            indexes = self._declared_indexes(cast(str, self.p_indexes.currentData()))
+            exporter.add_setup(psql_name,
+                               f"{psql_name} = PandaSQL(persist=True, fingerprint=frame_fingerprint, "
+                               f"indexes={indexes!r})\n")
+        else:
+            exporter.add_setup(psql_name, f"{psql_name} = PandaSQL(persist=True, "
+                               "fingerprint=frame_fingerprint)\n")
         # export call
         call_str = f"{exporter.get_out_list(self, post=' = ')}queryPandas("
+        names = self._export_names(inpnames)
         tables = ""
         params = ""
-        idx = 1
-        for inpin in self.orderedInputs.values():
-            if inpin not in [self.p_query, self.p_sql, self.p_param_dict]:
-                curpar = f"{repr(inpin.name)}: {inpnames[idx]},\n{' '*(len(call_str)+8)}"
-                if inpin.dataType=='DataFramePin':
-                    tables+=curpar
-                else:
-                    params+=curpar
-                idx += 1
+        for inpin in self._dynamic_pins():
+            curpar = f"{repr(inpin.name)}: {names[inpin.name]},\n{' '*(len(call_str)+8)}"
+            if inpin.dataType=='DataFramePin':
+                tables+=curpar
+            else:
+                params+=curpar
         param_dict = cast(dict, self.p_param_dict.currentData())
         for k, v in param_dict.items():
             if k not in self.orderedInputs.keys():
                 params += f"{k}: {repr(v)},\n{' '*(len(call_str)+8)}"
         if self.p_sql.hasConnections():
-            sql=inpnames[0]
+            sql=names['sql']
         else:
             # beautify sql parameter
             sqllines = cast(str, self.p_sql.currentData()).replace('\t', ' ').splitlines()
             newline = '\n'+' '*(len(call_str)+3)
             sql='"""'+newline.join(sqllines)+'"""'
-        call_str += f"{sql},\n{' '*len(call_str)}tables={{{tables}}},\n{' '*len(call_str)}" + \
-                    f"params={{{params}}})\n"
+        indent = ' '*len(call_str)
+        call_str += f"{sql},\n{indent}tables={{{tables}}},\n{indent}params={{{params}}}"
+        if self.p_arrow_dtypes.currentData():
+            call_str += f",\n{indent}dtype_backend='pyarrow'"
+        call_str += f",\n{indent}psql={psql_name})\n"
         exporter.add_call(call_str)
         # flag that we are exported
         exporter.set_node_processed(self)
@@ -195,39 +305,66 @@ class PandasSQLQuery(NodeBase):
         # get inputs
         sql = self.getData('sql')
         param_dict = self.getData('param_dict')
+        disk_cache = self.getData('disk_cache')
+        dtype_backend = 'pyarrow' if self.getData('arrow_dtypes') else None
+        backend = duckdbsql.DuckDBSQL if self.getData('use_duckdb') else pandasql2.PandaSQL
 
         # get tables
         tables = {pin.name: pin.getData()
-                  for pin in self.orderedInputs.values()
-                  if pin not in [self.p_query, self.p_sql, self.p_param_dict]
-                     and pin.dataType=='DataFramePin'
+                  for pin in self._dynamic_pins()
+                  if pin.dataType=='DataFramePin'
                  }
 
         # tranform parameters
         parameters = {pin.name: pin.getData()
-                      for pin in self.orderedInputs.values()
-                      if pin not in [self.p_query,
-                                     self.p_sql,
-                                     self.p_param_dict]
-                         and pin.dataType!='DataFramePin'}
+                      for pin in self._dynamic_pins()
+                      if pin.dataType!='DataFramePin'}
 
         for k, v in param_dict.items():
             if not k in parameters:
                 parameters[k] = v
 
-        # query
-        psql = pandasql2.PandaSQL(persist=True)
-
-        sqlstatements = [s
-                         for s in sql.split(';\n')
-                         if not re.search(r"^[;\s]*$", s)]
+        # serve repeated queries on unchanged inputs from the disk cache
+        cache_key = None
+        if disk_cache:
+            fingerprints = {name: frame_fingerprint(df) if isinstance(df, pd.DataFrame) else None
+                            for name, df in tables.items()}
+            if None not in fingerprints.values():
+                cache_key = make_key('pandasql', sql, {'params': parameters,
+                                                       'tables': fingerprints,
+                                                       'dtype_backend': dtype_backend,
+                                                       'backend': backend.__name__})
+                cached = DISK_CACHE.get(cache_key)
+                if cached is not None:
+                    self.setData('result', cached)
+                    self.p_completed.call()
+                    return
+
+        # query (the unchanged tables of the previous run are still loaded)
+        if not isinstance(self._psql, backend):
+            if self._psql is not None:
+                self._psql.close()
+            self._psql = duckdbsql.DuckDBSQL() if backend is duckdbsql.DuckDBSQL \
+                         else pandasql2.PandaSQL(persist=True, fingerprint=frame_fingerprint)
+        psql = self._psql
+        if isinstance(psql, pandasql2.PandaSQL):
+            psql.indexes = self._declared_indexes(self.getData('indexes'))
+
+        sqlstatements = sqlscript.parse_sql_script(sql).statements
         results = []
 
-        for sqlstatement in sqlstatements:
-            res = psql(sqlstatement, tables, params=parameters)  # type: ignore
-            if res is not None:
-                res.columns = psql.uniquify(res.columns)
-                results.append(res)
+        try:
+            for sqlstatement in sqlstatements:
+                res = psql(sqlstatement, tables, params=parameters,  # type: ignore
+                           dtype_backend=dtype_backend)
+                if res is not None:
+                    res.columns = psql.uniquify(res.columns)
+                    results.append(res)
+        finally:
+            psql.end_run()
+
+        if cache_key is not None and len(results)==1:
+            DISK_CACHE.put(cache_key, results[0])
 
         # set result and continue graph
         if len(results)==0:
@@ -237,3 +374,10 @@ class PandasSQLQuery(NodeBase):
         else:
             self.setData('result', results)
         self.p_completed.call()
+
+
+    def kill(self, *args, **kwargs):
+        if self._psql is not None:
+            self._psql.close()
+            self._psql = None
+        super().kill(*args, **kwargs)
@@ -1,21 +1,35 @@
 """A node passing an SQL query to a database connection"""  # pylint: disable=invalid-name
 
+from functools import partial
 import json
-from typing import TYPE_CHECKING, Optional, cast
-import re
+import logging
+import time
+from typing import TYPE_CHECKING, Callable, Optional, cast
 import uuid
-from sqlalchemy import text
 import pandas as pd
 
 from PyFlow.Core import NodeBase, PinBase
 from PyFlow.Core.NodeBase import NodePinsSuggestionsHelper
-from PyFlow.Core.Common import StructureType, PinOptions
+from PyFlow.Core.Common import StructureType, PinOptions, push
 
 if TYPE_CHECKING:
     from PythonExporter.Exporters.implementation import PythonExporterImpl
 
 
 from ..constants import DB_HEADER_COLOR  # pylint: disable=wrong-import-position
+from ..querycache import QUERY_CACHE, DISK_CACHE, make_key  # pylint: disable=wrong-import-position
+from .. import queryexecutor  # pylint: disable=wrong-import-position
+from ..querycancel import QueryCanceller  # pylint: disable=wrong-import-position
+from .. import sqlscript  # pylint: disable=wrong-import-position
+from .. import dtypeopt  # pylint: disable=wrong-import-position
+from .. import spill  # pylint: disable=wrong-import-position
+from .. import sessions  # pylint: disable=wrong-import-position
+from ..watermarks import WATERMARKS, is_null_safe  # pylint: disable=wrong-import-position
+from ..querylog import SLOW_QUERY_LOG, explain, make_stats  # pylint: disable=wrong-import-position
+
+
+WATERMARK_PARAM = 'watermark'
+"""The query parameter the incremental mode binds the last high-water mark to"""
 
 
 class SQLQuery(NodeBase):
@@ -73,10 +87,179 @@ class SQLQuery(NodeBase):
             group=''
         ))
         self.p_param_dict.enableOptions(PinOptions.AllowAny)
+        self.p_chunksize = cast(PinBase, self.createInputPin(
+            pinName='chunksize',
+            dataType='IntPin',
+            defaultValue=0,
+            callback=None,
+            structure=StructureType.Single,
+            constraint=None,
+            structConstraint=None,
+            supportedPinDataTypes=[],
+            group='Streaming'
+        ))
+        self.p_yield_per = cast(PinBase, self.createInputPin(
+            pinName='yield_per',
+            dataType='IntPin',
+            defaultValue=0,
+            callback=None,
+            structure=StructureType.Single,
+            constraint=None,
+            structConstraint=None,
+            supportedPinDataTypes=[],
+            group='Streaming'
+        ))
+        self.p_cache_ttl = cast(PinBase, self.createInputPin(
+            pinName='cache_ttl',
+            dataType='FloatPin',
+            defaultValue=0.0,
+            callback=None,
+            structure=StructureType.Single,
+            constraint=None,
+            structConstraint=None,
+            supportedPinDataTypes=[],
+            group='Caching'
+        ))
+        self.p_disk_cache = cast(PinBase, self.createInputPin(
+            pinName='disk_cache',
+            dataType='BoolPin',
+            defaultValue=False,
+            callback=None,
+            structure=StructureType.Single,
+            constraint=None,
+            structConstraint=None,
+            supportedPinDataTypes=[],
+            group='Caching'
+        ))
+        self.p_run_async = cast(PinBase, self.createInputPin(
+            pinName='run_async',
+            dataType='BoolPin',
+            defaultValue=False,
+            callback=None,
+            structure=StructureType.Single,
+            constraint=None,
+            structConstraint=None,
+            supportedPinDataTypes=[],
+            group='Execution'
+        ))
+        self.p_timeout = cast(PinBase, self.createInputPin(
+            pinName='timeout',
+            dataType='FloatPin',
+            defaultValue=0.0,
+            callback=None,
+            structure=StructureType.Single,
+            constraint=None,
+            structConstraint=None,
+            supportedPinDataTypes=[],
+            group='Execution'
+        ))
+        self.p_param_rows = cast(PinBase, self.createInputPin(
+            pinName='param_rows',
+            dataType='DataFramePin',
+            defaultValue=None,
+            callback=None,
+            structure=StructureType.Single,
+            constraint=None,
+            structConstraint=None,
+            supportedPinDataTypes=[],
+            group='Bulk'
+        ))
+        self.p_batch_size = cast(PinBase, self.createInputPin(
+            pinName='batch_size',
+            dataType='IntPin',
+            defaultValue=1000,
+            callback=None,
+            structure=StructureType.Single,
+            constraint=None,
+            structConstraint=None,
+            supportedPinDataTypes=[],
+            group='Bulk'
+        ))
+        self.p_watermark_column = cast(PinBase, self.createInputPin(
+            pinName='watermark_column',
+            dataType='StringPin',
+            defaultValue='',
+            callback=None,
+            structure=StructureType.Single,
+            constraint=None,
+            structConstraint=None,
+            supportedPinDataTypes=[],
+            group='Incremental'
+        ))
+        self.p_arrow_dtypes = cast(PinBase, self.createInputPin(
+            pinName='arrow_dtypes',
+            dataType='BoolPin',
+            defaultValue=False,
+            callback=None,
+            structure=StructureType.Single,
+            constraint=None,
+            structConstraint=None,
+            supportedPinDataTypes=[],
+            group='Result'
+        ))
+        self.p_optimize_dtypes = cast(PinBase, self.createInputPin(
+            pinName='optimize_dtypes',
+            dataType='BoolPin',
+            defaultValue=False,
+            callback=None,
+            structure=StructureType.Single,
+            constraint=None,
+            structConstraint=None,
+            supportedPinDataTypes=[],
+            group='Result'
+        ))
+        self.p_dtype_overrides = cast(PinBase, self.createInputPin(
+            pinName='dtype_overrides',
+            dataType='StringPin',
+            callback=None,
+            structure=StructureType.Dict,
+            constraint=None,
+            structConstraint=None,
+            supportedPinDataTypes=[],
+            group='Result'
+        ))
+        self.p_spill_threshold_mb = cast(PinBase, self.createInputPin(
+            pinName='spill_threshold_mb',
+            dataType='IntPin',
+            defaultValue=0,
+            callback=None,
+            structure=StructureType.Single,
+            constraint=None,
+            structConstraint=None,
+            supportedPinDataTypes=[],
+            group='Result'
+        ))
+        self.p_slow_threshold = cast(PinBase, self.createInputPin(
+            pinName='slow_threshold',
+            dataType='FloatPin',
+            defaultValue=0.0,
+            callback=None,
+            structure=StructureType.Single,
+            constraint=None,
+            structConstraint=None,
+            supportedPinDataTypes=[],
+            group='Diagnostics'
+        ))
+        self.p_explain_slow = cast(PinBase, self.createInputPin(
+            pinName='explain_slow',
+            dataType='BoolPin',
+            defaultValue=False,
+            callback=None,
+            structure=StructureType.Single,
+            constraint=None,
+            structConstraint=None,
+            supportedPinDataTypes=[],
+            group='Diagnostics'
+        ))
         self.p_completed = cast(PinBase, self.createOutputPin(
             pinName='completed',
             dataType='ExecPin'
         ))
+        self.p_loop_body = cast(PinBase, self.createOutputPin(
+            pinName='loop_body',
+            dataType='ExecPin',
+            group='Streaming'
+        ))
         self.p_result = cast(PinBase, self.createOutputPin(
             pinName='result',
             dataType='DataFramePin',
@@ -87,7 +270,32 @@ class SQLQuery(NodeBase):
             supportedPinDataTypes=[],
             group=''
         ))
+        self.p_memory_before = cast(PinBase, self.createOutputPin(
+            pinName='memory_before',
+            dataType='IntPin',
+            defaultValue=0,
+            structure=StructureType.Single,
+            constraint=None,
+            structConstraint=None,
+            supportedPinDataTypes=[],
+            group='Result'
+        ))
+        self.p_memory_after = cast(PinBase, self.createOutputPin(
+            pinName='memory_after',
+            dataType='IntPin',
+            defaultValue=0,
+            structure=StructureType.Single,
+            constraint=None,
+            structConstraint=None,
+            supportedPinDataTypes=[],
+            group='Result'
+        ))
         self.headerColor = DB_HEADER_COLOR
+        self._pending = None
+        self._canceller: Optional[QueryCanceller] = None
+        self._spill_path: Optional[str] = None
+        # the rows fetched incrementally (also kept on disk with disk_cache)
+        self._increment: Optional[tuple[str, pd.DataFrame]] = None
 
     def addInPin(self, name: str, dataType: str):
         """Helper method to add a dynamic input pin"""
@@ -137,6 +345,41 @@ class SQLQuery(NodeBase):
         return 'A node passing an SQL query to a database connection'
 
 
+    def _param_pins(self) -> list[PinBase]:
+        """The dynamically added query parameter pins"""
+        return [pin for pin in self.orderedInputs.values()
+                if pin not in [self.p_query,
+                               self.p_conn,
+                               self.p_sql,
+                               self.p_has_result,
+                               self.p_param_dict,
+                               self.p_chunksize,
+                               self.p_yield_per,
+                               self.p_cache_ttl,
+                               self.p_disk_cache,
+                               self.p_run_async,
+                               self.p_timeout,
+                               self.p_param_rows,
+                               self.p_batch_size,
+                               self.p_watermark_column,
+                               self.p_arrow_dtypes,
+                               self.p_optimize_dtypes,
+                               self.p_dtype_overrides,
+                               self.p_spill_threshold_mb,
+                               self.p_slow_threshold,
+                               self.p_explain_slow]]
+
+
+    def _export_names(self, inpnames: list[str]) -> dict[str, str]:
+        """Map the input pin names to the expressions the exporter passed in
+        `inpnames` (unconnected dict pins are not passed)"""
+        pins = [pin for pin in self.orderedInputs.values()
+                if pin is not self.p_query
+                   and (pin not in [self.p_param_dict, self.p_dtype_overrides]
+                        or pin.hasConnections())]
+        return {pin.name: inpname for pin, inpname in zip(pins, inpnames)}
+
+
     def to_python(self,  # pylint: disable=unused-argument
                   exporter: 'PythonExporterImpl',
                   inpnames: list[str],  # pylint: disable=unused-argument
@@ -146,10 +389,16 @@ class SQLQuery(NodeBase):
         # export function definition
         if not exporter.is_node_function_processed(self):
             exporter.add_import("pandas", alias="pd")
-            exporter.add_import("sqlalchemy", imports=["text"])
+            exporter.add_import("sqlalchemy", imports=["text", "TextClause", "Connection"])
+            exporter.add_import("contextlib", imports=["nullcontext"])
+            exporter.add_import("functools", imports=["lru_cache"])
+            exporter.add_import("typing", imports=["NamedTuple"])
             exporter.add_import("re")
+            exporter.add_setup("sqlscript_functions", sqlscript.SQLSCRIPT_STR)
             exporter.add_sys_function(
-                """def queryDatabase(conn, sql, has_result, param_dict={}, **kwargs):
+                """def queryDatabase(conn, sql, has_result, param_dict={}, yield_per=0, dtype_backend=None,
+                  optimize=False, dtype_overrides={}, param_rows=None, batch_size=1000,
+                  **kwargs):
     # tranform parameters
     parameters = {}
     for k, v in kwargs.items():
@@ -160,45 +409,152 @@ class SQLQuery(NodeBase):
             parameters[k] = v
 
     # query
-    sqlstatements = [s
-                     for s in sql.split(';\\n')
-                     if not re.search(r"^[;\\s]*$", s)]
+    script = parse_sql_script(sql)
+    read_options = {} if dtype_backend is None else {'dtype_backend': dtype_backend}
     table = None
 
-    with conn.begin() as active_conn:
-        for i, sqlstatement in enumerate(sqlstatements):
-            if has_result and i==len(sqlstatements)-1: # only last statement can have result
-                table = pd.read_sql_query(text(sqlstatement),
+    # a session (Connection) is already in a transaction
+    with (nullcontext(conn) if isinstance(conn, Connection) else conn.begin()) as active_conn:
+        for i, statement in enumerate(script.clauses):
+            statement_params = {k: v for k, v in parameters.items()
+                                if k in script.bind_names[i]}
+            row_columns = [] if param_rows is None else \\
+                          [c for c in param_rows.columns if c in script.bind_names[i]]
+            if row_columns: # run once per parameter row (executemany) batch by batch
+                step = batch_size if batch_size>0 else max(len(param_rows), 1)
+                for start in range(0, len(param_rows), step):
+                    batch = param_rows[row_columns].iloc[start:start+step]
+                    batch = batch.astype(object).where(batch.notna(), None)
+                    active_conn.execute(statement, [{**statement_params, **row}
+                                                    for row in batch.to_dict('records')])
+            elif has_result and i==len(script.clauses)-1: # only last statement can have result
+                if yield_per>0: # use a server-side cursor
+                    statement = statement.execution_options(stream_results=True,
+                                                            yield_per=yield_per)
+                table = pd.read_sql_query(statement,
                                             active_conn,
-                                            params=parameters)
+                                            params=statement_params,
+                                            **read_options)
             else:
-                active_conn.execute(text(sqlstatement), parameters)
-    
-    return table""")
+                active_conn.execute(statement, statement_params)
+
+    # shrink the result
+    memory_before = memory_after = 0
+    if optimize and table is not None:
+        memory_before = frame_memory(table)
+        table = optimize_dtypes(table, dtype_overrides)
+        memory_after = frame_memory(table)
+
+    return table, memory_before, memory_after""")
+            exporter.add_sys_function(
+                """def queryDatabaseChunks(conn, sql, chunksize, param_dict={}, yield_per=0, dtype_backend=None,
+                        optimize=False, dtype_overrides={}, param_rows=None, batch_size=1000,
+                        **kwargs):
+    # tranform parameters
+    parameters = {}
+    for k, v in kwargs.items():
+        if not k in parameters:
+            parameters[k] = v
+    for k, v in param_dict.items():
+        if not k in parameters:
+            parameters[k] = v
+
+    # query (the result of the last statement is yielded chunk by chunk)
+    script = parse_sql_script(sql)
+    read_options = {} if dtype_backend is None else {'dtype_backend': dtype_backend}
+
+    # a session (Connection) is already in a transaction
+    with (nullcontext(conn) if isinstance(conn, Connection) else conn.begin()) as active_conn:
+        for i, statement in enumerate(script.clauses):
+            statement_params = {k: v for k, v in parameters.items()
+                                if k in script.bind_names[i]}
+            row_columns = [] if param_rows is None else \\
+                          [c for c in param_rows.columns if c in script.bind_names[i]]
+            if row_columns: # run once per parameter row (executemany) batch by batch
+                step = batch_size if batch_size>0 else max(len(param_rows), 1)
+                for start in range(0, len(param_rows), step):
+                    batch = param_rows[row_columns].iloc[start:start+step]
+                    batch = batch.astype(object).where(batch.notna(), None)
+                    active_conn.execute(statement, [{**statement_params, **row}
+                                                    for row in batch.to_dict('records')])
+            elif i==len(script.clauses)-1:
+                if yield_per>0: # use a server-side cursor
+                    statement = statement.execution_options(stream_results=True,
+                                                            yield_per=yield_per)
+                for chunk in pd.read_sql_query(statement,
+                                               active_conn,
+                                               params=statement_params,
+                                               chunksize=chunksize,
+                                               **read_options):
+                    if optimize:
+                        memory_before = frame_memory(chunk)
+                        chunk = optimize_dtypes(chunk, dtype_overrides)
+                        yield chunk, memory_before, frame_memory(chunk)
+                    else:
+                        yield chunk, 0, 0
+            else:
+                active_conn.execute(statement, statement_params)""")
             exporter.set_node_function_processed(self)
+        if self.p_optimize_dtypes.currentData():
+            exporter.add_import("typing", imports=["Optional"])
+            exporter.add_setup("dtypeopt_functions", dtypeopt.DTYPEOPT_STR)
         # export call
-        inputs = inpnames[2]
+        names = self._export_names(inpnames)
+        chunked = self.p_has_result.currentData() and \
+                  cast(int, self.p_chunksize.currentData())>0
+        if chunked:
+            inputs = names['chunksize']
+        else:
+            inputs = names['has_result']
         if self.p_param_dict.hasConnections():
-            inputs+=f", param_dict={inpnames[3]}"
-        i=3
-        for inpin in self.orderedInputs.values():
-            if inpin not in [self.p_query,
-                             self.p_conn,
-                             self.p_sql,
-                             self.p_has_result,
-                             self.p_param_dict]:
-                inputs += f", {inpin.name} = {inpnames[i]}"
-                i += 1
-        prg = f"{exporter.get_out_list(self, post=' = ')}queryDatabase({inpnames[0]}, "
+            inputs+=f", param_dict={names['param_dict']}"
+        if self.p_yield_per.hasConnections() or cast(int, self.p_yield_per.currentData())>0:
+            inputs+=f", yield_per={names['yield_per']}"
+        if self.p_arrow_dtypes.currentData():
+            inputs+=", dtype_backend='pyarrow'"
+        if self.p_param_rows.hasConnections():
+            inputs+=f", param_rows={names['param_rows']}"
+            if self.p_batch_size.hasConnections() or cast(int, self.p_batch_size.currentData())!=1000:
+                inputs+=f", batch_size={names['batch_size']}"
+        if self.p_optimize_dtypes.currentData():
+            inputs+=", optimize=True"
+            if self.p_dtype_overrides.hasConnections():
+                inputs+=f", dtype_overrides={names['dtype_overrides']}"
+            elif len(self.p_dtype_overrides.currentData())>0:
+                inputs+=f", dtype_overrides={repr(dict(self.p_dtype_overrides.currentData()))}"
+        for inpin in self._param_pins():
+            inputs += f", {inpin.name} = {names[inpin.name]}"
+        if self.p_watermark_column.currentData() and \
+           WATERMARK_PARAM not in self.orderedInputs.keys() and \
+           not self.p_param_dict.hasConnections() and \
+           WATERMARK_PARAM not in cast(dict, self.p_param_dict.currentData()):
+            # the exported script has no stored mark, the NULL-safe
+            # query fetches everything
+            if not self.p_sql.hasConnections():
+                self._check_incremental(sqlscript.parse_sql_script(
+                    cast(str, self.p_sql.currentData())))
+            inputs += f", {WATERMARK_PARAM} = None"
+        if chunked:
+            prg = f"for {exporter.get_out_list(self)} in queryDatabaseChunks({names['conn']}, "
+        else:
+            prg = f"{exporter.get_out_list(self, post=' = ')}queryDatabase({names['conn']}, "
         if self.p_sql.hasConnections():
-            prg += inpnames[1]+', '
+            prg += names['sql']+', '
         else:
             # beautify sql parameter
             sqllines = cast(str, self.p_sql.currentData()).replace('\t', '    ').splitlines()
             newline = '\n'+' '*(len(prg)+3)
             prg += '"""'+newline.join(sqllines)+'"""'
-        exporter.add_call(f"{prg}, {inputs})\n")
-        exporter.set_node_processed(self)
+        if chunked:
+            exporter.add_call(f"{prg}, {inputs}):\n")
+            exporter.set_node_processed(self)
+            # convert the loop body
+            exporter.increase_indent()
+            exporter.call_named_pin(self, 'loop_body')
+            exporter.decrease_indent()
+        else:
+            exporter.add_call(f"{prg}, {inputs})\n")
+            exporter.set_node_processed(self)
         exporter.call_named_pin(self, 'completed')
 
 
@@ -208,34 +564,307 @@ class SQLQuery(NodeBase):
         sql = self.getData('sql')
         has_result = self.getData('has_result')
         param_dict = self.getData('param_dict')
+        chunksize = self.getData('chunksize')
+        yield_per = self.getData('yield_per')
+        cache_ttl = self.getData('cache_ttl')
+        disk_cache = self.getData('disk_cache')
+        run_async = self.getData('run_async')
+        read_options = {'dtype_backend': 'pyarrow'} if self.getData('arrow_dtypes') else {}
+        bulk = {'param_rows': self.getData('param_rows'),
+                'batch_size': self.getData('batch_size')}
+        spill_bytes = self.getData('spill_threshold_mb') * 1024 * 1024
+        diagnostics = {'slow_threshold': self.getData('slow_threshold'),
+                       'explain_slow': self.getData('explain_slow')}
+        canceller = QueryCanceller(self.getData('timeout'))
+
+        if run_async and sessions.is_session(conn):
+            # the statements of a session must run in the order of the graph,
+            # on its single connection
+            raise ValueError(f"{self.name}: run_async can not be used with a session, "
+                             "the session connection can not be shared with the query pool")
+        if run_async and self._pending is not None:
+            raise RuntimeError(f"{self.name} is still running, wait for completed "
+                               "or cancel it before running it again")
 
         # tranform parameters
-        parameters = {pin.name: pin.getData()
-                      for pin in self.orderedInputs.values()
-                      if pin not in [self.p_query,
-                                     self.p_conn,
-                                     self.p_sql,
-                                     self.p_has_result,
-                                     self.p_param_dict]}
+        parameters = {pin.name: pin.getData() for pin in self._param_pins()}
         for k, v in param_dict.items():
             if not k in parameters:
                 parameters[k] = v
 
         # query
-        sqlstatements = [s
-                         for s in sql.split(';\n')
-                         if not re.search(r"^[;\s]*$", s)]
+        script = sqlscript.parse_sql_script(sql)
+
+        if has_result and chunksize>0:
+            # stream the result through the loop body one chunk at a time
+            def on_chunk(chunk):
+                self._set_result(chunk)
+                push(self.p_result)
+                self.p_loop_body.call(*args, **kwargs)
+            self._execute(conn, script, parameters, has_result, yield_per, read_options,
+                          chunksize, on_chunk, canceller, **bulk, **diagnostics)
+            self._set_result(None)
+            self.p_completed.call()
+            return
+
+        on_done = partial(self._finish, cache_key=None, cache_ttl=cache_ttl, disk_cache=disk_cache)
+        watermark_column = self.getData('watermark_column')
+        if has_result and bulk['param_rows'] is None and watermark_column:
+            # fetch only the rows above the last high-water mark and append
+            # them to the rows of the previous runs (with disk_cache these are
+            # read from disk only when the node has not run yet)
+            self._check_incremental(script)
+            increment_key = make_key(conn.engine.url, sql,
+                                     {'params': parameters, **read_options,
+                                      'watermark_column': watermark_column})
+            previous = self._increment[1] if self._increment is not None and \
+                                             self._increment[0]==increment_key else None
+            if previous is None and disk_cache:
+                previous = DISK_CACHE.get_parts(increment_key)
+            mark, previous = WATERMARKS.resume(increment_key, previous)
+            if mark is not None:
+                parameters[WATERMARK_PARAM] = mark
+            else:
+                parameters.setdefault(WATERMARK_PARAM, None)
+            on_done = partial(self._finish_increment, previous, increment_key,
+                              watermark_column, disk_cache)
+
+        # serve repeated queries from the result caches (a hit runs nothing,
+        # so only scripts whose statements before the result only read)
+        elif has_result and bulk['param_rows'] is None and (cache_ttl>0 or disk_cache) and \
+             not all(sqlscript.is_read_only(statement) for statement in script.statements[:-1]):
+            logging.getLogger('PyFlow.DataNodes').warning(
+                "%s: the statements before the result write data, the result is not cached",
+                self.name)
+        elif has_result and bulk['param_rows'] is None and (cache_ttl>0 or disk_cache):
+            cache_key = make_key(conn.engine.url, sql, {'params': parameters, **read_options})
+            table = QUERY_CACHE.get(cache_key) if cache_ttl>0 else None
+            if table is None and disk_cache:
+                table = DISK_CACHE.get(cache_key)
+                if table is not None and cache_ttl>0:
+                    QUERY_CACHE.put(cache_key, table, cache_ttl)
+            if table is not None:
+                self._set_result(table)
+                self.p_completed.call()
+                return
+            on_done = partial(self._finish, cache_key=cache_key, cache_ttl=cache_ttl,
+                              disk_cache=disk_cache)
+
+        if run_async:
+            # run on the query pool, `Tick` continues the graph when done
+            self._pending = (queryexecutor.submit(self._execute, conn, script,
+                                                  parameters, has_result, yield_per,
+                                                  read_options, canceller=canceller,
+                                                  spill_bytes=spill_bytes,
+                                                  **bulk, **diagnostics),
+                             on_done)
+            return
+
+        on_done(self._execute(conn, script, parameters, has_result, yield_per, read_options,
+                              canceller=canceller, spill_bytes=spill_bytes,
+                              **bulk, **diagnostics))
+
+
+    def _execute(self, conn, script: sqlscript.SQLScript, parameters: dict,  # pylint: disable=too-many-arguments
+                 has_result: bool, yield_per: int, read_options: dict,
+                 chunksize: int = 0,
+                 on_chunk: Optional[Callable[[pd.DataFrame], None]] = None,
+                 canceller: Optional[QueryCanceller] = None,
+                 spill_bytes: int = 0,
+                 param_rows: Optional[pd.DataFrame] = None,
+                 batch_size: int = 0,
+                 slow_threshold: float = 0.0,
+                 explain_slow: bool = False
+                ) -> Optional[pd.DataFrame]:
+        """Run the statements in one transaction (the running one if `conn`
+        is a session) and return the result of the last one (or pass it to
+        `on_chunk` in chunks)
+
+        Statements binding columns of `param_rows` run once per row with
+        `executemany`, `batch_size` rows (all if not positive) at a time
+
+        Every statement is timed; the ones running for at least `slow_threshold`
+        seconds (if positive) go to the slow query log, with their query plan
+        if `explain_slow` is set
+
+        The statements can be interrupted through `canceller`, which also
+        enforces the timeout; the transaction is rolled back then
+
+        A result larger than `spill_bytes` (if positive) is written to a
+        memory-mapped Arrow file instead of staying on the heap (with the
+        pyarrow dtype backend, otherwise it is read back once fetched)"""
         table = None
+        canceller = canceller or QueryCanceller()
+        self._canceller = canceller
 
-        with conn.begin() as active_conn:
-            for i, sqlstatement in enumerate(sqlstatements):
-                if has_result and i==len(sqlstatements)-1: # only last statement can have result
-                    table = pd.read_sql_query(text(sqlstatement),
-                                              active_conn,
-                                              params=parameters)
+        with sessions.transaction(conn) as active_conn, canceller.attached(active_conn):
+            for i, statement in enumerate(script.clauses):
+                canceller.check()
+                statement_params = {k: v for k, v in parameters.items()
+                                    if k in script.bind_names[i]}
+                started = time.perf_counter()
+                body_seconds = 0.0
+                rows = nbytes = 0
+                row_columns = [] if param_rows is None else \
+                              [c for c in param_rows.columns if c in script.bind_names[i]]
+                if row_columns:
+                    # run once per parameter row, batch by batch
+                    step = batch_size if batch_size>0 else max(len(param_rows), 1)
+                    for start in range(0, len(param_rows), step):
+                        canceller.check()
+                        batch = param_rows[row_columns].iloc[start:start+step]
+                        # DBAPI drivers want python scalars and None for missing values
+                        batch = batch.astype(object).where(batch.notna(), None)
+                        result = active_conn.execute(statement,
+                                                     [{**statement_params, **row}
+                                                      for row in batch.to_dict('records')])
+                        rows += max(result.rowcount, 0)
+                elif has_result and i==len(script.clauses)-1: # only last statement can have result
+                    if yield_per>0:
+                        # use a server-side cursor so the driver does not
+                        # buffer the whole result on the client
+                        statement = statement.execution_options(stream_results=True,
+                                                                yield_per=yield_per)
+                    if chunksize>0 and on_chunk is not None:
+                        for chunk in pd.read_sql_query(statement,
+                                                       active_conn,
+                                                       params=statement_params,
+                                                       chunksize=chunksize,
+                                                       **read_options):
+                            canceller.check()
+                            rows += len(chunk)
+                            nbytes += int(chunk.memory_usage(index=True).sum())
+                            # the loop body does not count as query time
+                            body_started = time.perf_counter()
+                            on_chunk(chunk)
+                            body_seconds += time.perf_counter() - body_started
+                    elif spill_bytes>0:
+                        table = spill.collect(pd.read_sql_query(statement,
+                                                                active_conn,
+                                                                params=statement_params,
+                                                                chunksize=spill.SPILL_CHUNK_ROWS,
+                                                                **read_options),
+                                              spill_bytes,
+                                              arrow_dtypes=read_options.get('dtype_backend')=='pyarrow')
+                        rows = len(table)
+                    else:
+                        table = pd.read_sql_query(statement,
+                                                  active_conn,
+                                                  params=statement_params,
+                                                  **read_options)
+                        rows = len(table)
+                        nbytes = int(table.memory_usage(index=True).sum())
                 else:
-                    active_conn.execute(text(sqlstatement), parameters)
+                    rows = max(active_conn.execute(statement, statement_params).rowcount, 0)
+                seconds = time.perf_counter() - started - body_seconds
+
+                logging.getLogger('PyFlow.DataNodes').debug(
+                    "%s statement %d: %.3fs, %d rows, %d bytes", self.name, i, seconds, rows, nbytes)
+                if 0<slow_threshold<=seconds:
+                    plan = explain(active_conn, script.statements[i], statement_params) \
+                           if explain_slow else None
+                    SLOW_QUERY_LOG.record(make_stats(self.name, conn.engine.url,
+                                                     script.statements[i],
+                                                     seconds, rows, nbytes, plan))
+
+        return table
+
+
+    def _finish(self, table: Optional[pd.DataFrame],
+                cache_key: Optional[str], cache_ttl: float, disk_cache: bool):
+        """Store the result in the caches, set it and continue the graph"""
+        if cache_key is not None and table is not None:
+            # a spilled result is kept out of the memory budget of the cache
+            if cache_ttl>0 and spill.spill_path(table) is None:
+                QUERY_CACHE.put(cache_key, table, cache_ttl)
+            if disk_cache:
+                DISK_CACHE.put(cache_key, spill.unmarked(table))
 
         # set result and continue graph
-        self.setData('result', table)
+        self._set_result(table)
+        self.p_completed.call()
+
+
+    def _check_incremental(self, script: sqlscript.SQLScript):
+        """Raise if the query can not run incrementally: it must bind the mark
+        and fetch everything while there is none (the mark is NULL then)"""
+        statements = [statement for statement, names in zip(script.statements, script.bind_names)
+                      if WATERMARK_PARAM in names]
+        if not statements:
+            raise ValueError(f"Incremental mode needs the :{WATERMARK_PARAM} "
+                             "parameter in the query")
+        if not all(is_null_safe(statement, WATERMARK_PARAM) for statement in statements):
+            raise ValueError(f"The query must handle an unset :{WATERMARK_PARAM} (NULL on "
+                             f"the first run), e.g. ':{WATERMARK_PARAM} is null or "
+                             f"ts > :{WATERMARK_PARAM}'")
+
+
+    def _finish_increment(self, previous: Optional[pd.DataFrame], increment_key: str,  # pylint: disable=too-many-arguments
+                          watermark_column: str, disk_cache: bool,
+                          delta: Optional[pd.DataFrame]):
+        """Append the newly fetched rows to the previous ones, store them and
+        the new mark for the next run, set the result and continue the graph
+
+        With disk_cache only the new rows are written, as the next part of the
+        stored rows (all rows when the earlier parts are gone)"""
+        table = WATERMARKS.advance(increment_key, previous, delta, watermark_column)
+        if table is not None:
+            self._increment = (increment_key, table)
+            if disk_cache and (previous is None or delta is None or
+                               not DISK_CACHE.append(increment_key, spill.unmarked(delta))):
+                DISK_CACHE.append(increment_key, spill.unmarked(table), new=True)
+
+        # set result and continue graph
+        self._set_result(table)
         self.p_completed.call()
+
+
+    def _set_result(self, table: Optional[pd.DataFrame]):
+        """Set the result, optimizing its dtypes first if requested"""
+        # the previous spill file is not needed any more
+        if self._spill_path is not None and self._spill_path!=spill.spill_path(table):
+            spill.remove_spilled(self._spill_path)
+        self._spill_path = spill.spill_path(table)
+
+        memory_before = memory_after = 0
+        if self.getData('optimize_dtypes') and table is not None and self._spill_path is None:
+            memory_before = dtypeopt.frame_memory(table)
+            table = dtypeopt.optimize_dtypes(table, self.getData('dtype_overrides'))
+            memory_after = dtypeopt.frame_memory(table)
+        self.setData('result', table)
+        self.setData('memory_before', memory_before)
+        self.setData('memory_after', memory_after)
+
+
+    def Tick(self, delta):
+        super().Tick(delta)
+        if self._pending is None or not self._pending[0].done():
+            return
+        future, on_done = self._pending
+        self._pending = None
+        error = future.exception()
+        if error is not None:
+            logging.getLogger('PyFlow.DataNodes').error(
+                "%s failed: %s", self.name, error)
+            self.setError(error)
+            return
+        self.clearError()
+        on_done(future.result())
+
+
+    def cancel(self):
+        """Interrupt the running query of this node"""
+        if self._pending is not None:
+            self._pending[0].cancel()
+        if self._canceller is not None:
+            self._canceller.cancel()
+
+
+    def kill(self, *args, **kwargs):
+        self.cancel()
+        self._pending = None
+        if self._spill_path is not None:
+            spill.remove_spilled(self._spill_path)
+            self._spill_path = None
+        self._increment = None
+        super().kill(*args, **kwargs)
@@ -1,10 +1,11 @@
 """Implementation of a PyFlow Pin to carry database connections"""
 import json
-from sqlalchemy import Engine, create_engine, exc
+from sqlalchemy import Engine, exc
 
 from PyFlow.Core.Common import PinOptions
 from PyFlow.Core import PinBase
 from ..constants import DB_ENGINE_PIN_COLOR  # pylint: disable=relative-beyond-top-level
+from ..engines import get_engine  # pylint: disable=relative-beyond-top-level
 
 class DBEngineData:
     """Internal data structure for DBEnginePin"""
@@ -34,7 +35,8 @@ class DBEngineDecoder(json.JSONDecoder):
         if '_type' in o:
             if o['_type']=='DBEngineData':
                 try:
-                    return create_engine(o['engineurl'])
+                    # a new engine is pre-warmed in the background
+                    return get_engine(o['engineurl'])
                 except exc.DBAPIError:
                     return None
         if callable(self._passed_object_hook):
@@ -56,7 +58,8 @@ class DBEnginePin(PinBase):
 
     @staticmethod
     def supportedDataTypes():  # type: ignore
-        return ('DBEnginePin', )
+        # sessions run the queries on their shared connection
+        return ('DBEnginePin', 'DBSessionPin')
 
     @staticmethod
     def pinDataTypeHint():  # type: ignore
@@ -0,0 +1,43 @@
+"""Implementation of a PyFlow Pin to carry database sessions (open connections)"""
+from PyFlow.Core.Common import PinOptions
+from PyFlow.Core import PinBase
+from ..constants import DB_SESSION_PIN_COLOR  # pylint: disable=relative-beyond-top-level
+
+class DBSessionData:
+    """Internal data structure for DBSessionPin"""
+    def __init__(self, value = None) -> None:
+        self.value = value
+
+
+class DBSessionPin(PinBase):
+    """Pin transferring an open DB connection and its transaction between
+    nodes (it can be connected to DBEnginePin inputs too)"""
+
+    def __init__(self, name, owningNode, direction, **kwargs):
+        super().__init__(name, owningNode, direction, **kwargs)
+        self.disableOptions(PinOptions.Storable)
+        self.setDefaultValue(None)
+
+    @staticmethod
+    def IsValuePin():
+        return True
+
+    @staticmethod
+    def supportedDataTypes():  # type: ignore
+        return ('DBSessionPin', )
+
+    @staticmethod
+    def pinDataTypeHint():  # type: ignore
+        return 'DBSessionPin', None
+
+    @staticmethod
+    def color():  # type: ignore
+        return DB_SESSION_PIN_COLOR
+
+    @staticmethod
+    def internalDataStructure():
+        return DBSessionData
+
+    @staticmethod
+    def processData(data):
+        return data
@@ -0,0 +1,38 @@
+"""The UI handling of the database connection nodes: pre-warming the
+connection pool when a graph is loaded
+"""  # pylint: disable=invalid-name
+import logging
+
+from PyFlow.UI.Canvas.UICommon import Colors
+from PyFlow.UI.Canvas.UINodeBase import UINodeBase
+
+from ..FunctionLibraries.DBLib import DBLib
+
+
+class UIDBConnNode(UINodeBase):
+    """UI of the SQLServerConn and GenericDBConn nodes"""
+
+    def __init__(self, raw_node, w=80, color=Colors.NodeBackgrounds, headColorOverride=None):
+        super().__init__(raw_node, w, color, headColorOverride)
+
+
+    def postCreate(self, jsonTemplate=None):  # pylint: disable=invalid-name
+        super().postCreate(jsonTemplate)
+        if jsonTemplate is not None:
+            self.prewarm()
+
+
+    def prewarm(self):
+        """Create the engine from the current pin values, which opens its
+        pooled connections in the background (failures are only logged)"""
+        node_function = getattr(DBLib, self._rawNode.__class__.__name__)
+        kwargs = {pin.name: pin.getData() for pin in self._rawNode.inputs.values()
+                  if not pin.isExec()}
+        if not any(isinstance(v, str) and v for v in kwargs.values()):
+            # a new node without a server or url yet
+            return
+        try:
+            node_function(**kwargs)
+        except Exception as err:  # pylint: disable=broad-except
+            logging.getLogger('PyFlow.DataNodes').warning(
+                "Pre-warming %s failed: %s", self._rawNode.name, err)
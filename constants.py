@@ -2,6 +2,7 @@
 
 DB_HEADER_COLOR = (100, 156, 136, 255) #649C88
 DB_ENGINE_PIN_COLOR = (115, 156, 141, 255)  #739c8d
+DB_SESSION_PIN_COLOR = ( 86, 130, 156, 255)  #56829c
 DB_DATAFRAME_PIN_COLOR = (155, 156, 115, 255)  #9b9c73
 
 PDLIB_HEADER_COLOR = (157, 133, 112, 255)  #9d8570
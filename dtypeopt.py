@@ -0,0 +1,114 @@
+"""Shrinking the memory footprint of fetched DataFrames by choosing narrower dtypes"""
+
+from typing import Optional
+
+import pandas as pd
+
+
+CATEGORY_MAX_RATIO = 0.5
+"""Text columns with at most this ratio of distinct values become categoricals"""
+
+
+def frame_memory(df: pd.DataFrame) -> int:
+    """The memory used by a DataFrame in bytes (including the index and the
+    contents of object columns)"""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def optimize_column(s: pd.Series) -> pd.Series:
+    """Convert repeated strings to `category` and downcast numerics to the
+    smallest width which still holds every value exactly (integers stay
+    signed, unsigned ones would wrap around in later arithmetic)"""
+    if len(s)==0 or isinstance(s.dtype, pd.CategoricalDtype):
+        return s
+    if pd.api.types.is_object_dtype(s.dtype) or pd.api.types.is_string_dtype(s.dtype):
+        try:
+            distinct = s.nunique(dropna=False)
+        except TypeError:
+            # unhashable values (lists, dicts) can not be categories
+            return s
+        if distinct<=len(s)*CATEGORY_MAX_RATIO:
+            return s.astype('category')
+        return s
+    if pd.api.types.is_extension_array_dtype(s.dtype) or pd.api.types.is_bool_dtype(s.dtype):
+        return s
+    if pd.api.types.is_integer_dtype(s.dtype):
+        return pd.to_numeric(s, downcast='integer')
+    if pd.api.types.is_float_dtype(s.dtype):
+        narrow = s.astype('float32')
+        if ((narrow==s) | s.isna()).all():
+            return narrow
+    return s
+
+
+def optimize_dtypes(df: pd.DataFrame, overrides: Optional[dict] = None) -> pd.DataFrame:
+    """Optimize the dtypes of all columns of `df`
+
+    `overrides` maps column names to the dtype they should be converted to
+    instead, or to 'keep' to leave the column as it was fetched"""
+    overrides = overrides or {}
+    result = df.copy(deep=False)
+    for col in df.columns:
+        dtype = overrides.get(col)
+        if dtype=='keep':
+            continue
+        if dtype is not None:
+            result[col] = df[col].astype(dtype)
+        else:
+            result[col] = optimize_column(df[col])
+    return result
+
+
+DTYPEOPT_STR = '''CATEGORY_MAX_RATIO = 0.5
+"""Text columns with at most this ratio of distinct values become categoricals"""
+
+
+def frame_memory(df: pd.DataFrame) -> int:
+    """The memory used by a DataFrame in bytes (including the index and the
+    contents of object columns)"""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def optimize_column(s: pd.Series) -> pd.Series:
+    """Convert repeated strings to `category` and downcast numerics to the
+    smallest width which still holds every value exactly (integers stay
+    signed, unsigned ones would wrap around in later arithmetic)"""
+    if len(s)==0 or isinstance(s.dtype, pd.CategoricalDtype):
+        return s
+    if pd.api.types.is_object_dtype(s.dtype) or pd.api.types.is_string_dtype(s.dtype):
+        try:
+            distinct = s.nunique(dropna=False)
+        except TypeError:
+            # unhashable values (lists, dicts) can not be categories
+            return s
+        if distinct<=len(s)*CATEGORY_MAX_RATIO:
+            return s.astype('category')
+        return s
+    if pd.api.types.is_extension_array_dtype(s.dtype) or pd.api.types.is_bool_dtype(s.dtype):
+        return s
+    if pd.api.types.is_integer_dtype(s.dtype):
+        return pd.to_numeric(s, downcast='integer')
+    if pd.api.types.is_float_dtype(s.dtype):
+        narrow = s.astype('float32')
+        if ((narrow==s) | s.isna()).all():
+            return narrow
+    return s
+
+
+def optimize_dtypes(df: pd.DataFrame, overrides: Optional[dict] = None) -> pd.DataFrame:
+    """Optimize the dtypes of all columns of `df`
+
+    `overrides` maps column names to the dtype they should be converted to
+    instead, or to 'keep' to leave the column as it was fetched"""
+    overrides = overrides or {}
+    result = df.copy(deep=False)
+    for col in df.columns:
+        dtype = overrides.get(col)
+        if dtype=='keep':
+            continue
+        if dtype is not None:
+            result[col] = df[col].astype(dtype)
+        else:
+            result[col] = optimize_column(df[col])
+    return result
+'''
@@ -0,0 +1,186 @@
+"""Running SQL on Pandas DataFrames with DuckDB (an optional dependency)"""
+
+import re
+
+import pandas as pd
+
+
+_DUCKDB_TOKEN = re.compile(r"""
+     (?P<comment>--[^\n]*|/\*.*?(?:\*/|$))
+    |(?P<quoted>[eE]'(?:[^'\\]|\\.|'')*'?|'(?:[^']|'')*'?|"(?:[^"]|"")*"?
+               |\$(?P<tag>(?:[A-Za-z_]\w*)?)\$.*?(?:\$(?P=tag)\$|$))
+    |(?P<cast>::)
+    |(?P<name>\w+)
+    |(?<![\w\\]):(?P<param>\w+)""", re.VERBOSE | re.DOTALL)
+"""The tokens of a DuckDB statement: SQLAlchemy style `:name` parameters and
+what may contain a colon without being one (comments, strings, quoted
+identifiers, `::type` casts and names)"""
+
+_RESULT_STATEMENTS = frozenset(['SELECT', 'EXPLAIN'])
+
+
+class DuckDBSQL:
+    """Runs SQL statements against Pandas DataFrames in an in-memory DuckDB
+    database, a drop-in for a persistent `PandaSQL`
+
+    The DataFrames are registered as views (without copying them) and the
+    statements run vectorized on all cores. Parameters are written as
+    `:name` like with `PandaSQL`"""
+
+    def __init__(self) -> None:
+        import duckdb  # pylint: disable=import-outside-toplevel
+        self.conn = duckdb.connect()
+        self.registered: set[str] = set()
+
+    def __call__(self, query, env, params=None, dtype_backend=None):
+        """Execute the SQL query (the DataFrames of `env` can be used as
+        tables), returns the result as a DataFrame or None if the statement
+        has no result"""
+        for table_name, df in env.items():
+            if isinstance(df, pd.DataFrame):
+                self.conn.register(table_name, df)
+                self.registered.add(table_name)
+
+        names = set()
+        def to_duckdb(match):
+            if match.group('param') is None:
+                return match.group(0)
+            names.add(match.group('param'))
+            return '$' + match.group('param')
+        query = _DUCKDB_TOKEN.sub(to_duckdb, query)
+        bound = {k: v for k, v in (params or {}).items() if k in names}
+
+        statements = self.conn.extract_statements(query)
+        result = self.conn.execute(query, bound or None)
+        if not statements or statements[-1].type.name not in _RESULT_STATEMENTS:
+            return None
+        if dtype_backend=='pyarrow':
+            table = result.to_arrow_table() if hasattr(result, 'to_arrow_table') \
+                    else result.fetch_arrow_table()
+            return table.to_pandas(types_mapper=pd.ArrowDtype)
+        df = result.fetchdf()
+        if dtype_backend is not None:
+            df = df.convert_dtypes(dtype_backend=dtype_backend)
+        return df
+
+    def end_run(self) -> None:
+        """Drop the tables created by the queries of a script and release
+        the registered DataFrames"""
+        for (table_name,) in self.conn.execute(
+                "select table_name from duckdb_tables()").fetchall():
+            self.conn.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+        for table_name in self.registered:
+            self.conn.unregister(table_name)
+        self.registered.clear()
+
+    def close(self) -> None:
+        """Close the database"""
+        self.conn.close()
+
+    @staticmethod
+    def uniquify(df_columns) -> list[str]:
+        """Make a list of columns unique"""
+        seen = set()
+        result = []
+        for item in df_columns:
+            fudge = 1
+            newitem = item
+
+            while newitem in seen:
+                fudge += 1
+                newitem = f"{item}_{fudge}"
+
+            result.append(newitem)
+            seen.add(newitem)
+        return result
+
+
+DUCKDBSQL_STR = '''_DUCKDB_TOKEN = re.compile(r"""
+     (?P<comment>--[^\\n]*|/\\*.*?(?:\\*/|$))
+    |(?P<quoted>[eE]'(?:[^'\\\\]|\\\\.|'')*'?|'(?:[^']|'')*'?|"(?:[^"]|"")*"?
+               |\\$(?P<tag>(?:[A-Za-z_]\\w*)?)\\$.*?(?:\\$(?P=tag)\\$|$))
+    |(?P<cast>::)
+    |(?P<name>\\w+)
+    |(?<![\\w\\\\]):(?P<param>\\w+)""", re.VERBOSE | re.DOTALL)
+"""The tokens of a DuckDB statement: SQLAlchemy style `:name` parameters and
+what may contain a colon without being one (comments, strings, quoted
+identifiers, `::type` casts and names)"""
+
+_RESULT_STATEMENTS = frozenset(['SELECT', 'EXPLAIN'])
+
+
+class DuckDBSQL:
+    """Runs SQL statements against Pandas DataFrames in an in-memory DuckDB
+    database, a drop-in for a persistent `PandaSQL`
+
+    The DataFrames are registered as views (without copying them) and the
+    statements run vectorized on all cores. Parameters are written as
+    `:name` like with `PandaSQL`"""
+
+    def __init__(self) -> None:
+        import duckdb  # pylint: disable=import-outside-toplevel
+        self.conn = duckdb.connect()
+        self.registered: set[str] = set()
+
+    def __call__(self, query, env, params=None, dtype_backend=None):
+        """Execute the SQL query (the DataFrames of `env` can be used as
+        tables), returns the result as a DataFrame or None if the statement
+        has no result"""
+        for table_name, df in env.items():
+            if isinstance(df, pd.DataFrame):
+                self.conn.register(table_name, df)
+                self.registered.add(table_name)
+
+        names = set()
+        def to_duckdb(match):
+            if match.group('param') is None:
+                return match.group(0)
+            names.add(match.group('param'))
+            return '$' + match.group('param')
+        query = _DUCKDB_TOKEN.sub(to_duckdb, query)
+        bound = {k: v for k, v in (params or {}).items() if k in names}
+
+        statements = self.conn.extract_statements(query)
+        result = self.conn.execute(query, bound or None)
+        if not statements or statements[-1].type.name not in _RESULT_STATEMENTS:
+            return None
+        if dtype_backend=='pyarrow':
+            table = result.to_arrow_table() if hasattr(result, 'to_arrow_table') \\
+                    else result.fetch_arrow_table()
+            return table.to_pandas(types_mapper=pd.ArrowDtype)
+        df = result.fetchdf()
+        if dtype_backend is not None:
+            df = df.convert_dtypes(dtype_backend=dtype_backend)
+        return df
+
+    def end_run(self) -> None:
+        """Drop the tables created by the queries of a script and release
+        the registered DataFrames"""
+        for (table_name,) in self.conn.execute(
+                "select table_name from duckdb_tables()").fetchall():
+            self.conn.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+        for table_name in self.registered:
+            self.conn.unregister(table_name)
+        self.registered.clear()
+
+    def close(self) -> None:
+        """Close the database"""
+        self.conn.close()
+
+    @staticmethod
+    def uniquify(df_columns) -> list[str]:
+        """Make a list of columns unique"""
+        seen = set()
+        result = []
+        for item in df_columns:
+            fudge = 1
+            newitem = item
+
+            while newitem in seen:
+                fudge += 1
+                newitem = f"{item}_{fudge}"
+
+            result.append(newitem)
+            seen.add(newitem)
+        return result
+'''
@@ -0,0 +1,99 @@
+"""A process-wide registry of SQLAlchemy engines so that repeated runs of the
+connection nodes reuse the same connection pool"""
+
+import logging
+import threading
+from typing import Any, Optional, Union
+
+from sqlalchemy import URL, Engine, QueuePool, create_engine
+
+
+DEFAULT_POOL_SIZE = 5
+DEFAULT_MAX_OVERFLOW = 10
+DEFAULT_POOL_PRE_PING = False
+DEFAULT_POOL_RECYCLE = -1
+DEFAULT_PREWARM_CONNECTIONS = 1
+"""Connections opened in the background when an engine is created"""
+
+_QUEUE_POOL_OPTIONS = ('pool_size', 'max_overflow')
+"""Options which only pools with a queue (not the SQLite memory pools) accept"""
+
+_lock = threading.Lock()
+_engines: dict[tuple, Engine] = {}
+
+
+def _key(url: Union[str, URL], options: dict[str, Any]) -> tuple:
+    if isinstance(url, URL):
+        url = url.render_as_string(hide_password=False)
+    return (url, tuple(sorted((k, repr(v)) for k, v in options.items())))
+
+
+def _prewarm(engine: Engine, connections: int) -> None:
+    opened = []
+    try:
+        for _ in range(connections):
+            conn = engine.raw_connection()
+            opened.append(conn)
+            engine.dialect.do_ping(conn.dbapi_connection)
+    except Exception as err:  # pylint: disable=broad-except
+        logging.getLogger('PyFlow.DataNodes').warning(
+            "Pre-warming %s failed after %d connection(s): %s",
+            engine.url, len(opened), err)
+    else:
+        logging.getLogger('PyFlow.DataNodes').debug(
+            "Pre-warmed %d connection(s) of %s", len(opened), engine.url)
+    finally:
+        for conn in opened:
+            conn.close()
+
+
+def prewarm(engine: Engine, connections: int = DEFAULT_PREWARM_CONNECTIONS
+            ) -> Optional[threading.Thread]:
+    """Open and validate up to `connections` pooled connections of `engine`
+    on a background thread so that the first query finds them ready
+
+    Failures are logged, not raised. Returns the started thread, or None if
+    there is nothing to warm (no connections asked or a pool without a queue,
+    e.g. in-memory SQLite)"""
+    if connections<=0 or not isinstance(engine.pool, QueuePool):
+        return None
+    # connections above the pool size would be discarded when returned
+    connections = min(connections, engine.pool.size())
+    thread = threading.Thread(target=_prewarm, args=(engine, connections),
+                              name='DataNodes-prewarm', daemon=True)
+    thread.start()
+    return thread
+
+
+def get_engine(url: Union[str, URL],
+               prewarm_connections: int = DEFAULT_PREWARM_CONNECTIONS,
+               **options) -> Engine:
+    """The engine of `url` with the given `create_engine` options, created on
+    the first request (and pre-warmed with `prewarm_connections`) and returned
+    from the registry afterwards"""
+    key = _key(url, options)
+    with _lock:
+        engine = _engines.get(key)
+        if engine is None:
+            try:
+                engine = create_engine(url, **options)
+            except TypeError as err:
+                # the pool of this dialect has no size (e.g. in-memory SQLite)
+                logging.getLogger('PyFlow.DataNodes').debug(
+                    "Creating the engine without pool sizing: %s", err)
+                engine = create_engine(url, **{k: v for k, v in options.items()
+                                               if k not in _QUEUE_POOL_OPTIONS})
+            _engines[key] = engine
+            prewarm(engine, prewarm_connections)
+        return engine
+
+
+def dispose_all() -> int:
+    """Close the pooled connections of every registered engine and empty the
+    registry, returns the number of engines disposed"""
+    with _lock:
+        engines = list(_engines.values())
+        _engines.clear()
+    for engine in engines:
+        engine.dispose()
+    return len(engines)
@@ -0,0 +1,309 @@
+"""In-memory and on-disk (Parquet) result caches for the query nodes"""
+
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from typing import Any, Optional
+
+import pandas as pd
+
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_DISK_MAX_BYTES = 8 * 1024 * 1024 * 1024
+DEFAULT_DISK_CACHE_DIR = os.path.join(
+    os.environ.get('LOCALAPPDATA', os.path.join(os.path.expanduser('~'), '.cache')),
+    'PyFlowDataNodes', 'querycache')
+
+
+def make_key(url: Any, sql: str, params: Optional[dict] = None) -> str:
+    """Build a cache key from the connection url, the whitespace
+    normalized sql text and the query parameters"""
+    norm_sql = re.sub(r"\s+", " ", sql).strip()
+    norm_params = json.dumps(params or {}, sort_keys=True, default=repr)
+    return hashlib.sha256(
+        "\0".join([str(url), norm_sql, norm_params]).encode('utf8')
+    ).hexdigest()
+
+
+def frame_fingerprint(df: pd.DataFrame) -> Optional[str]:
+    """A content hash of a DataFrame (values, index, columns and dtypes)
+    or None if the values cannot be hashed"""
+    try:
+        hashed = pd.util.hash_pandas_object(df, index=True).values
+    except TypeError:
+        return None
+    digest = hashlib.sha256(hashed.tobytes())
+    digest.update(repr(list(df.columns)).encode('utf8'))
+    digest.update(repr(list(df.dtypes.astype(str))).encode('utf8'))
+    return digest.hexdigest()
+
+
+class QueryCache:
+    """A thread-safe LRU cache of query results, evicting entries by
+    their time-to-live and by a total byte budget (measured with
+    `DataFrame.memory_usage(deep=True)`)"""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, tuple[pd.DataFrame, int, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """Return a copy of the cached result or None if there is no
+        live entry for the key"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0].copy()
+
+    def put(self, key: str, df: pd.DataFrame, ttl: float) -> None:
+        """Store a copy of the result for `ttl` seconds (results larger
+        than the whole budget are not cached)"""
+        size = int(df.memory_usage(deep=True).sum())
+        with self._lock:
+            if key in self._entries:
+                self._remove(key, evicted=False)
+            if size > self.max_bytes:
+                return
+            self._purge_expired()
+            while self._entries and self.total_bytes + size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+            self._entries[key] = (df.copy(), size, time.monotonic() + ttl)
+            self.total_bytes += size
+
+    def invalidate(self, key: str) -> None:
+        """Drop a single entry"""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key, evicted=False)
+
+    def clear(self) -> None:
+        """Drop all entries (the counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> dict[str, int]:
+        """The cache counters"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _purge_expired(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, entry in self._entries.items() if entry[2] < now]:
+            self._remove(key)
+
+    def _remove(self, key: str, evicted: bool = True) -> None:
+        _, size, _ = self._entries.pop(key)
+        self.total_bytes -= size
+        if evicted:
+            self.evictions += 1
+
+
+class DiskQueryCache:
+    """A persistent cache of query results stored as Parquet files in a
+    directory, evicting the least recently used files to stay in a total
+    byte budget
+
+    A result growing over the runs (see `append`) is kept as a directory of
+    part files, which is used and evicted as one entry"""
+
+    def __init__(self,
+                 directory: str = DEFAULT_DISK_CACHE_DIR,
+                 max_bytes: int = DEFAULT_DISK_MAX_BYTES) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.parquet")
+
+    def _parts_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.parts")
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """Load the cached result or return None if it is not cached"""
+        path = self._path(key)
+        with self._lock:
+            if not os.path.exists(path):
+                self.misses += 1
+                return None
+            # mark as recently used
+            os.utime(path)
+            self.hits += 1
+        try:
+            return pd.read_parquet(path)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logging.getLogger('PyFlow.DataNodes').warning(
+                "Dropping unreadable query cache file %s: %s", path, e)
+            self.invalidate(key)
+            return None
+
+    def put(self, key: str, df: pd.DataFrame) -> None:
+        """Store the result (failures are logged, not raised)"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            df.to_parquet(tmp_path)
+            os.replace(tmp_path, path)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logging.getLogger('PyFlow.DataNodes').warning(
+                "Could not write query cache file %s: %s", path, e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        with self._lock:
+            self._evict()
+
+    def get_parts(self, key: str) -> Optional[pd.DataFrame]:
+        """Load all parts of an appended result or return None if there are none"""
+        path = self._parts_path(key)
+        with self._lock:
+            if not os.path.isdir(path):
+                self.misses += 1
+                return None
+            # mark as recently used
+            os.utime(path)
+            self.hits += 1
+            parts = sorted(entry.path for entry in os.scandir(path)
+                           if entry.name.endswith('.parquet'))
+        try:
+            return pd.concat([pd.read_parquet(part) for part in parts], ignore_index=True)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logging.getLogger('PyFlow.DataNodes').warning(
+                "Dropping unreadable query cache parts %s: %s", path, e)
+            self.invalidate(key)
+            return None
+
+    def append(self, key: str, df: pd.DataFrame, new: bool = False) -> bool:
+        """Store `df` as the next part of an appended result (the first one if
+        `new`, dropping the earlier parts), writing only these rows
+
+        Returns False without writing if the earlier parts are gone (evicted
+        or cleared), the whole result has to be stored as new then. Failures
+        are logged, not raised"""
+        path = self._parts_path(key)
+        with self._lock:
+            if new:
+                shutil.rmtree(path, ignore_errors=True)
+                os.makedirs(path)
+            elif not os.path.isdir(path):
+                return False
+            if len(df)==0 and not new:
+                return True
+            count = sum(1 for entry in os.scandir(path) if entry.name.endswith('.parquet'))
+            part = os.path.join(path, f"{count:08d}.parquet")
+            tmp_path = f"{part}.{threading.get_ident()}.tmp"
+            try:
+                df.to_parquet(tmp_path)
+                os.replace(tmp_path, part)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logging.getLogger('PyFlow.DataNodes').warning(
+                    "Could not write query cache part %s: %s", part, e)
+                # a missing part would lose rows, the result is stored anew
+                shutil.rmtree(path, ignore_errors=True)
+                return True
+            self._evict()
+        return True
+
+    def invalidate(self, key: str) -> None:
+        """Drop a single entry"""
+        with self._lock:
+            if os.path.exists(self._path(key)):
+                os.remove(self._path(key))
+            shutil.rmtree(self._parts_path(key), ignore_errors=True)
+
+    def clear(self) -> None:
+        """Drop all entries (the counters are kept)"""
+        with self._lock:
+            for path, _, _ in self._files():
+                self._remove(path)
+
+    def stats(self) -> dict[str, int]:
+        """The cache counters"""
+        with self._lock:
+            files = self._files()
+            return {
+                'entries': len(files),
+                'bytes': sum(size for _, size, _ in files),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _files(self) -> list[tuple[str, int, float]]:
+        """The cache files (and part directories) with their sizes and last
+        use times"""
+        if not os.path.isdir(self.directory):
+            return []
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith('.parquet'):
+                stat = entry.stat()
+                files.append((entry.path, stat.st_size, stat.st_mtime))
+            elif entry.is_dir() and entry.name.endswith('.parts'):
+                size = sum(part.stat().st_size for part in os.scandir(entry.path)
+                           if part.name.endswith('.parquet'))
+                files.append((entry.path, size, entry.stat().st_mtime))
+        return files
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.remove(path)
+
+    def _evict(self) -> None:
+        files = sorted(self._files(), key=lambda f: f[2])
+        total = sum(size for _, size, _ in files)
+        while files and total > self.max_bytes:
+            path, size, _ = files.pop(0)
+            self._remove(path)
+            total -= size
+            self.evictions += 1
+
+
+QUERY_CACHE = QueryCache()
+DISK_CACHE = DiskQueryCache()
+
+
+FINGERPRINT_STR = '''def frame_fingerprint(df: pd.DataFrame) -> Optional[str]:
+    """A content hash of a DataFrame (values, index, columns and dtypes)
+    or None if the values cannot be hashed"""
+    try:
+        hashed = pd.util.hash_pandas_object(df, index=True).values
+    except TypeError:
+        return None
+    digest = hashlib.sha256(hashed.tobytes())
+    digest.update(repr(list(df.columns)).encode('utf8'))
+    digest.update(repr(list(df.dtypes.astype(str))).encode('utf8'))
+    return digest.hexdigest()
+'''
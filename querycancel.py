@@ -0,0 +1,115 @@
+"""Timeouts and cancellation of running queries using the mechanism of the
+database driver (sqlite3 interrupt, libpq cancel, ODBC query timeout)"""
+
+from contextlib import contextmanager
+import logging
+import math
+import threading
+from typing import Any, Optional
+
+from sqlalchemy import event
+
+
+class QueryCanceledError(Exception):
+    """The query was canceled or ran out of time"""
+
+
+class QueryCanceller:
+    """Interrupts the statement running on a connection when canceled or when
+    `timeout` seconds (if positive) have passed since it was attached"""
+
+    def __init__(self, timeout: float = 0.0) -> None:
+        self.timeout = timeout
+        self.reason: Optional[str] = None
+        self._lock = threading.Lock()
+        self._dbapi_conn: Any = None
+        self._cursor: Any = None
+        self._timer: Optional[threading.Timer] = None
+
+    def cancel(self, reason: str = 'canceled') -> None:
+        """Interrupt the running statement (safe to call from any thread)"""
+        with self._lock:
+            if self.reason is not None:
+                return
+            self.reason = reason
+            dbapi_conn, cursor = self._dbapi_conn, self._cursor
+        if dbapi_conn is not None:
+            _interrupt(dbapi_conn, cursor)
+
+    def check(self) -> None:
+        """Raise if canceled, called between the statements of a script"""
+        if self.reason is not None:
+            raise QueryCanceledError(f"Query {self.reason}")
+
+    @contextmanager
+    def attached(self, active_conn):
+        """Watch the statements run on the SQLAlchemy connection `active_conn`
+        in this block; errors caused by the interruption are raised as
+        `QueryCanceledError` (leaving the rollback to the transaction)"""
+        dbapi_conn = active_conn.connection.dbapi_connection
+
+        def remember_cursor(conn, cursor, *args):  # pylint: disable=unused-argument
+            self._cursor = cursor
+        event.listen(active_conn, 'before_cursor_execute', remember_cursor)
+
+        # ODBC enforces the timeout in the driver, the timer is the fallback
+        odbc_timeout = getattr(dbapi_conn, 'timeout', None) \
+                       if type(dbapi_conn).__module__=='pyodbc' else None
+        if odbc_timeout is not None and self.timeout>0:
+            dbapi_conn.timeout = max(1, math.ceil(self.timeout))
+        with self._lock:
+            self._dbapi_conn = dbapi_conn
+        if self.timeout>0:
+            self._timer = threading.Timer(self.timeout, self.cancel, args=('timed out',))
+            self._timer.daemon = True
+            self._timer.start()
+        _ACTIVE.add(self)
+        try:
+            self.check()
+            yield self
+        except QueryCanceledError:
+            raise
+        except Exception as err:
+            if self.reason is not None:
+                raise QueryCanceledError(f"Query {self.reason}") from err
+            raise
+        finally:
+            _ACTIVE.discard(self)
+            if self._timer is not None:
+                self._timer.cancel()
+            with self._lock:
+                self._dbapi_conn = self._cursor = None
+            if odbc_timeout is not None:
+                dbapi_conn.timeout = odbc_timeout
+            event.remove(active_conn, 'before_cursor_execute', remember_cursor)
+
+
+def _interrupt(dbapi_conn, cursor) -> None:
+    """Ask the driver to stop the running statement"""
+    try:
+        if hasattr(dbapi_conn, 'interrupt'):
+            # sqlite3
+            dbapi_conn.interrupt()
+        elif hasattr(dbapi_conn, 'cancel'):
+            # psycopg2 and psycopg send a cancel request to the backend
+            dbapi_conn.cancel()
+        elif cursor is not None and hasattr(cursor, 'cancel'):
+            # pyodbc (SQLCancel on the statement handle)
+            cursor.cancel()
+        else:
+            logging.getLogger('PyFlow.DataNodes').warning(
+                "%s can not cancel a running statement",
+                type(dbapi_conn).__module__)
+    except Exception as err:  # pylint: disable=broad-except
+        logging.getLogger('PyFlow.DataNodes').warning("Cancel failed: %s", err)
+
+
+_ACTIVE: set[QueryCanceller] = set()
+
+
+def cancel_all() -> int:
+    """Cancel every running query, returns their number"""
+    running = list(_ACTIVE)
+    for canceller in running:
+        canceller.cancel()
+    return len(running)
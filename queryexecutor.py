@@ -0,0 +1,41 @@
+"""A bounded thread pool shared by the asynchronously running query nodes"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+import threading
+from typing import Any, Callable, Optional
+
+
+DEFAULT_MAX_WORKERS = 4
+
+_lock = threading.Lock()
+_max_workers = DEFAULT_MAX_WORKERS
+_pool: Optional[ThreadPoolExecutor] = None
+
+
+def set_max_workers(max_workers: int) -> None:
+    """Resize the pool of the package (running queries finish on the old pool)"""
+    global _max_workers, _pool  # pylint: disable=global-statement
+    if max_workers < 1:
+        raise ValueError("The query pool needs at least one worker")
+    with _lock:
+        if max_workers == _max_workers:
+            return
+        _max_workers = max_workers
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+            _pool = None
+
+
+def get_max_workers() -> int:
+    """The configured size of the pool"""
+    return _max_workers
+
+
+def submit(fn: Callable[..., Any], *args, **kwargs) -> Future:
+    """Run `fn` on the query pool (created on first use)"""
+    global _pool  # pylint: disable=global-statement
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=_max_workers,
+                                       thread_name_prefix='DataNodesQuery')
+        return _pool.submit(fn, *args, **kwargs)
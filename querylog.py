@@ -0,0 +1,104 @@
+"""Per-statement timing of the query nodes and a log of the slow statements"""
+
+from collections import deque
+from datetime import datetime
+import json
+import logging
+import threading
+from typing import Any, NamedTuple, Optional
+
+import pandas as pd
+from sqlalchemy import text
+
+
+DEFAULT_MAX_ENTRIES = 1000
+
+EXPLAIN_PREFIXES = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+}
+
+
+class StatementStats(NamedTuple):
+    """Measurements of one executed statement"""
+    timestamp: str
+    node: str
+    url: str
+    statement: str
+    seconds: float
+    rows: int
+    bytes: int
+    plan: Optional[list[str]]
+
+
+def explain(active_conn, sql: str, params: dict) -> Optional[list[str]]:
+    """The query plan of `sql` as text lines, or None if the dialect has no
+    supported EXPLAIN or the plan can not be built"""
+    prefix = EXPLAIN_PREFIXES.get(active_conn.dialect.name)
+    if prefix is None:
+        return None
+    try:
+        # a savepoint keeps a failing EXPLAIN from aborting the transaction
+        with active_conn.begin_nested():
+            rows = active_conn.execute(text(prefix + sql), params).fetchall()
+    except Exception as err:  # pylint: disable=broad-except
+        logging.getLogger('PyFlow.DataNodes').warning("EXPLAIN failed: %s", err)
+        return None
+    return [' | '.join(str(v) for v in row) for row in rows]
+
+
+class SlowQueryLog:
+    """A thread-safe, bounded log of the statements which ran longer than
+    their node's threshold, optionally mirrored to a JSONL file"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        self._entries: deque[StatementStats] = deque(maxlen=max_entries)
+        self._lock = threading.Lock()
+        self.log_file: Optional[str] = None
+
+    def record(self, entry: StatementStats) -> None:
+        """Add an entry (and append it to the log file if one is set)"""
+        with self._lock:
+            self._entries.append(entry)
+            if self.log_file:
+                try:
+                    with open(self.log_file, 'a', encoding='utf8') as f:
+                        f.write(json.dumps(entry._asdict()) + '\n')
+                except OSError as err:
+                    logging.getLogger('PyFlow.DataNodes').warning(
+                        "Could not write slow query log %s: %s", self.log_file, err)
+        logging.getLogger('PyFlow.DataNodes').info(
+            "Slow statement in %s (%.3fs, %d rows): %s",
+            entry.node, entry.seconds, entry.rows, entry.statement)
+
+    def entries(self, node: Optional[str] = None) -> list[StatementStats]:
+        """The logged entries, oldest first, optionally of one node only"""
+        with self._lock:
+            return [e for e in self._entries if node is None or e.node==node]
+
+    def to_frame(self, node: Optional[str] = None) -> pd.DataFrame:
+        """The logged entries as a DataFrame"""
+        return pd.DataFrame(self.entries(node), columns=list(StatementStats._fields))
+
+    def write_jsonl(self, path: str, node: Optional[str] = None) -> None:
+        """Write the logged entries to a JSONL file"""
+        with open(path, 'w', encoding='utf8') as f:
+            for entry in self.entries(node):
+                f.write(json.dumps(entry._asdict()) + '\n')
+
+    def clear(self) -> None:
+        """Drop all entries"""
+        with self._lock:
+            self._entries.clear()
+
+
+def make_stats(node: str, url: Any, sql: str, seconds: float,  # pylint: disable=too-many-arguments
+               rows: int, nbytes: int, plan: Optional[list[str]] = None) -> StatementStats:
+    """Build a log entry (hiding the password of the connection url)"""
+    if hasattr(url, 'render_as_string'):
+        url = url.render_as_string(hide_password=True)
+    return StatementStats(datetime.now().isoformat(timespec='milliseconds'),
+                          node, str(url), sql, seconds, rows, nbytes, plan)
+
+
+SLOW_QUERY_LOG = SlowQueryLog()
@@ -0,0 +1,43 @@
+"""Database sessions: one connection and transaction shared by several query nodes"""
+
+from contextlib import contextmanager, nullcontext
+from typing import Union
+
+from sqlalchemy import Connection, Engine
+
+
+def open_session(conn: Union[Engine, Connection]) -> Connection:
+    """Check out a connection and begin the transaction of the session"""
+    session = conn.engine.connect()
+    session.begin()
+    return session
+
+
+def commit_session(session: Connection) -> None:
+    """Commit the work of the session and give the connection back to the pool"""
+    try:
+        session.commit()
+    finally:
+        session.close()
+
+
+def rollback_session(session: Connection) -> None:
+    """Undo the work of the session and give the connection back to the pool"""
+    try:
+        session.rollback()
+    finally:
+        session.close()
+
+
+def is_session(conn: Union[Engine, Connection]) -> bool:
+    """Whether `conn` is a session (one connection, which is not thread-safe)
+    rather than an engine"""
+    return isinstance(conn, Connection)
+
+
+@contextmanager
+def transaction(conn: Union[Engine, Connection]):
+    """Run the block in a transaction of its own on an engine, or in the
+    already running transaction of a session"""
+    with (nullcontext(conn) if is_session(conn) else conn.begin()) as active_conn:
+        yield active_conn
@@ -0,0 +1,175 @@
+"""Spilling large query results to memory-mapped Arrow IPC (Feather) files"""
+
+import logging
+import os
+import tempfile
+from typing import Iterable, Optional
+import uuid
+
+import pandas as pd
+
+
+DEFAULT_SPILL_DIR = os.path.join(tempfile.gettempdir(), 'PyFlowDataNodes', 'spill')
+SPILL_CHUNK_ROWS = 100_000
+"""Rows fetched at a time while the size of a spillable result is measured"""
+
+
+class SpillSchemaError(TypeError):
+    """A chunk has a column type which the spilled chunks can not be promoted to"""
+
+
+def _spill_file_path(directory: str) -> str:
+    return os.path.join(directory, f"{os.getpid()}-{uuid.uuid4().hex}.arrow")
+
+
+class SpillWriter:
+    """Writes DataFrame chunks into one Arrow IPC file"""
+
+    def __init__(self, directory: str = DEFAULT_SPILL_DIR) -> None:
+        self.path = _spill_file_path(directory)
+        self._writer = None
+        self._schema = None
+
+    def write(self, df: pd.DataFrame) -> None:
+        """Append a chunk
+
+        When the types of a chunk differ from the file (e.g. a column which
+        was all NULL so far holds strings now), the file is rewritten with the
+        promoted types. Raises `SpillSchemaError` if they can not be promoted
+        (e.g. numbers followed by strings)"""
+        import pyarrow as pa  # pylint: disable=import-outside-toplevel
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is None:
+            self._schema = table.schema
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._writer = pa.ipc.new_file(self.path, self._schema)
+        elif not table.schema.equals(self._schema):
+            try:
+                schema = pa.unify_schemas([self._schema, table.schema],
+                                          promote_options='permissive')
+                if not schema.equals(self._schema):
+                    self._rewrite(schema)
+                table = table.cast(schema)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as err:
+                raise SpillSchemaError(f"Can not spill the chunk to {self.path}: {err}") from err
+        self._writer.write_table(table)
+
+    def _rewrite(self, schema) -> None:
+        """Copy the chunks written so far into a new file with `schema`"""
+        import pyarrow as pa  # pylint: disable=import-outside-toplevel
+        old_path = self.path
+        self._writer.close()
+        written = pa.ipc.open_file(old_path).read_all().cast(schema)
+        self.path = _spill_file_path(os.path.dirname(old_path))
+        self._schema = schema
+        self._writer = pa.ipc.new_file(self.path, schema)
+        self._writer.write_table(written)
+        del written
+        remove_spilled(old_path)
+
+    def read(self) -> pd.DataFrame:
+        """The chunks written so far as an in-memory DataFrame"""
+        import pyarrow as pa  # pylint: disable=import-outside-toplevel
+        if self._writer is None:
+            return pd.DataFrame()
+        self._writer.close()
+        self._writer = None
+        return pa.ipc.open_file(self.path).read_all().to_pandas()
+
+    def close(self, arrow_dtypes: bool = True) -> pd.DataFrame:
+        """Finish the file and return a memory-mapped view of it
+
+        Without `arrow_dtypes` the data is read back to the heap with the
+        dtypes of an in-memory result instead and the file is removed"""
+        if not arrow_dtypes:
+            df = self.read()
+            remove_spilled(self.path)
+            return df
+        if self._writer is not None:
+            self._writer.close()
+        return open_spilled(self.path)
+
+    def abort(self) -> None:
+        """Drop the partially written file"""
+        if self._writer is not None:
+            self._writer.close()
+        remove_spilled(self.path)
+
+
+def open_spilled(path: str) -> pd.DataFrame:
+    """A DataFrame backed by the memory-mapped Arrow file (without copying
+    the data to the heap), its path is kept in `attrs['spill_path']`"""
+    import pyarrow as pa  # pylint: disable=import-outside-toplevel
+    table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    df = table.to_pandas(types_mapper=pd.ArrowDtype)
+    df.attrs['spill_path'] = path
+    return df
+
+
+def spill_path(df: Optional[pd.DataFrame]) -> Optional[str]:
+    """The file backing a spilled DataFrame (None if it is in memory)"""
+    return None if df is None else df.attrs.get('spill_path')
+
+
+def unmarked(df: pd.DataFrame) -> pd.DataFrame:
+    """A shallow copy without the spill marker, for storing the data
+    elsewhere (Parquet keeps `attrs`)"""
+    if spill_path(df) is None:
+        return df
+    copy = df.copy(deep=False)
+    copy.attrs.pop('spill_path', None)
+    return copy
+
+
+def remove_spilled(path: str) -> None:
+    """Delete a spill file (where the OS allows deleting a mapped file)"""
+    try:
+        os.remove(path)
+    except OSError as err:
+        logging.getLogger('PyFlow.DataNodes').debug("Could not remove %s: %s", path, err)
+
+
+def collect(chunks: Iterable[pd.DataFrame], threshold_bytes: int,
+            directory: str = DEFAULT_SPILL_DIR, arrow_dtypes: bool = False) -> pd.DataFrame:
+    """Concatenate the chunks in memory until they exceed `threshold_bytes`,
+    then write them and all the following chunks to a spill file
+
+    Only a result with `arrow_dtypes` stays memory-mapped (pandas can not
+    view the file with numpy dtypes), otherwise the spilled chunks are read
+    back to the heap at the end, with the same dtypes as a result collected
+    in memory, so that the chunks are not held twice while fetching
+
+    If a later chunk has types the file can not take, the spilled chunks are
+    read back and the result is collected in memory instead"""
+    buffered: list[pd.DataFrame] = []
+    size = 0
+    writer = None
+    spillable = True
+    try:
+        for chunk in chunks:
+            if writer is not None:
+                try:
+                    writer.write(chunk)
+                    continue
+                except SpillSchemaError as err:
+                    logging.getLogger('PyFlow.DataNodes').warning(
+                        "Keeping the result in memory: %s", err)
+                    buffered = [writer.read()]
+                    writer.abort()
+                    writer = None
+                    spillable = False
+            buffered.append(chunk)
+            size += int(chunk.memory_usage(index=True, deep=True).sum())
+            if spillable and size>threshold_bytes:
+                writer = SpillWriter(directory)
+                writer.write(pd.concat(buffered, ignore_index=True))
+                buffered = []
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+    if writer is not None:
+        return writer.close(arrow_dtypes)
+    if len(buffered)==1:
+        return buffered[0]
+    return pd.concat(buffered, ignore_index=True) if buffered else pd.DataFrame()
@@ -0,0 +1,157 @@
+"""Splitting SQL scripts into statements with a memoized, dependency-free parser"""
+
+from functools import lru_cache
+import re
+from typing import NamedTuple
+
+from sqlalchemy import text, TextClause
+
+
+_READ_ONLY_START = frozenset(['SELECT', 'WITH', 'VALUES', 'SHOW'])
+_WRITING_WORDS = frozenset(['INSERT', 'UPDATE', 'DELETE', 'MERGE', 'INTO', 'CREATE', 'DROP',
+                            'ALTER', 'TRUNCATE', 'EXEC', 'EXECUTE', 'CALL'])
+
+
+def is_read_only(statement: str) -> bool:
+    """Whether a statement only reads: it starts with SELECT, WITH, VALUES or
+    SHOW and has none of the keywords of a statement writing data (outside of
+    literals and comments)"""
+    words = [match.group().upper() for match in _SQL_SEGMENT.finditer(statement)
+             if match.lastgroup == 'word']
+    return bool(words) and words[0] in _READ_ONLY_START and \
+           _WRITING_WORDS.isdisjoint(words)
+
+
+class SQLScript(NamedTuple):
+    """A parsed SQL script"""
+    statements: tuple[str, ...]
+    clauses: tuple[TextClause, ...]
+    bind_names: tuple[frozenset[str], ...]
+
+
+_SQL_SEGMENT = re.compile(r"""
+     (?P<comment>--[^\n]*|/\*.*?(?:\*/|$))
+    |(?P<quoted>'(?:[^']|'')*'?|"(?:[^"]|"")*"?|`(?:[^`]|``)*`?|\[[^\]]*\]?
+               |\$(?P<tag>(?:[A-Za-z_]\w*)?)\$.*?(?:\$(?P=tag)\$|$))
+    |(?P<semicolon>;)
+    |(?P<word>\w+)
+    |(?P<code>[^-/'"`\[;$\w]+|.)""", re.VERBOSE | re.DOTALL)
+"""The parts of an SQL script which can not contain a splitting semicolon"""
+
+
+def _is_trigger(words: list[str]) -> bool:
+    """Whether the first words of a statement create a trigger"""
+    return len(words)>1 and words[0]=='CREATE' and 'TRIGGER' in words[1:4]
+
+
+def split_sql(sql: str) -> list[str]:
+    """Split an SQL script at the semicolons which are not inside string
+    literals (also dollar quoted ones), quoted or bracketed identifiers,
+    comments or the BEGIN ... END body of a CREATE TRIGGER"""
+    statements = []
+    current = []
+    has_code = False
+    words: list[str] = []
+    depth = 0
+    for match in _SQL_SEGMENT.finditer(sql):
+        if match.lastgroup == 'semicolon' and depth == 0:
+            if has_code:
+                statements.append(''.join(current).strip())
+            current = []
+            has_code = False
+            words = []
+            continue
+        current.append(match.group())
+        if match.lastgroup != 'comment' and match.group().strip() != '':
+            has_code = True
+        if match.lastgroup == 'word':
+            word = match.group().upper()
+            if len(words) < 4:
+                words.append(word)
+            if word == 'BEGIN' and _is_trigger(words):
+                depth += 1
+            elif word == 'CASE' and depth > 0:
+                depth += 1
+            elif word == 'END' and depth > 0:
+                depth -= 1
+    if has_code:
+        statements.append(''.join(current).strip())
+    return statements
+
+
+@lru_cache(maxsize=256)
+def parse_sql_script(sql: str) -> SQLScript:
+    """Parse an SQL script into its statements, their compiled `TextClause`s
+    and the names of their bind parameters (memoized per script)"""
+    statements = tuple(split_sql(sql))
+    clauses = tuple(text(statement) for statement in statements)
+    bind_names = tuple(frozenset(clause.compile().params) for clause in clauses)
+    return SQLScript(statements, clauses, bind_names)
+
+
+SQLSCRIPT_STR = '''class SQLScript(NamedTuple):
+    """A parsed SQL script"""
+    statements: tuple[str, ...]
+    clauses: tuple[TextClause, ...]
+    bind_names: tuple[frozenset[str], ...]
+
+
+_SQL_SEGMENT = re.compile(r"""
+     (?P<comment>--[^\\n]*|/\\*.*?(?:\\*/|$))
+    |(?P<quoted>'(?:[^']|'')*'?|"(?:[^"]|"")*"?|`(?:[^`]|``)*`?|\\[[^\\]]*\\]?
+               |\\$(?P<tag>(?:[A-Za-z_]\\w*)?)\\$.*?(?:\\$(?P=tag)\\$|$))
+    |(?P<semicolon>;)
+    |(?P<word>\\w+)
+    |(?P<code>[^-/'"`\\[;$\\w]+|.)""", re.VERBOSE | re.DOTALL)
+"""The parts of an SQL script which can not contain a splitting semicolon"""
+
+
+def _is_trigger(words: list[str]) -> bool:
+    """Whether the first words of a statement create a trigger"""
+    return len(words)>1 and words[0]=='CREATE' and 'TRIGGER' in words[1:4]
+
+
+def split_sql(sql: str) -> list[str]:
+    """Split an SQL script at the semicolons which are not inside string
+    literals (also dollar quoted ones), quoted or bracketed identifiers,
+    comments or the BEGIN ... END body of a CREATE TRIGGER"""
+    statements = []
+    current = []
+    has_code = False
+    words: list[str] = []
+    depth = 0
+    for match in _SQL_SEGMENT.finditer(sql):
+        if match.lastgroup == 'semicolon' and depth == 0:
+            if has_code:
+                statements.append(''.join(current).strip())
+            current = []
+            has_code = False
+            words = []
+            continue
+        current.append(match.group())
+        if match.lastgroup != 'comment' and match.group().strip() != '':
+            has_code = True
+        if match.lastgroup == 'word':
+            word = match.group().upper()
+            if len(words) < 4:
+                words.append(word)
+            if word == 'BEGIN' and _is_trigger(words):
+                depth += 1
+            elif word == 'CASE' and depth > 0:
+                depth += 1
+            elif word == 'END' and depth > 0:
+                depth -= 1
+    if has_code:
+        statements.append(''.join(current).strip())
+    return statements
+
+
+@lru_cache(maxsize=256)
+def parse_sql_script(sql: str) -> SQLScript:
+    """Parse an SQL script into its statements, their compiled `TextClause`s
+    and the names of their bind parameters (memoized per script)"""
+    statements = tuple(split_sql(sql))
+    clauses = tuple(text(statement) for statement in statements)
+    bind_names = tuple(frozenset(clause.compile().params) for clause in clauses)
+    return SQLScript(statements, clauses, bind_names)
+'''
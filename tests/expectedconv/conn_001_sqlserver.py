@@ -23,7 +23,7 @@ from sqlalchemy import (create_engine,
 
 
 # ================================ SYSTEM FUNCTIONS ===============================
-def connect_sqlserver(db_host, db_name, trusted_conn):
+def connect_sqlserver(db_host, db_name, trusted_conn, fast_executemany):
     """Connect to an SQL server according to the parameters"""
     engine = create_engine(
         URL.create('mssql+pyodbc', query={'odbc_connect':
@@ -31,8 +31,7 @@ def connect_sqlserver(db_host, db_name, trusted_conn):
             f"Database={db_name};" + \
             f"Trusted_Connection={'yes' if trusted_conn else 'no'};"}
         ),
-        fast_executemany=False,
-        use_setinputsizes=False
+        fast_executemany=fast_executemany
     )
     return engine
 
@@ -45,4 +44,4 @@ def connect_sqlserver(db_host, db_name, trusted_conn):
 
 
 # ------- SQLServerConn_inExec -------
-SQLServerConn_out = connect_sqlserver('aaa', 'bbb', True)
+SQLServerConn_out = connect_sqlserver('aaa', 'bbb', True, True)
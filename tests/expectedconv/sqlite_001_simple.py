@@ -16,12 +16,82 @@ VARS = {}
 # ================================ PACKAGE IMPORTS ================================
 # pylint: disable=wrong-import-position
 from sqlalchemy import (create_engine,
-                        text)
+                        text,
+                        TextClause,
+                        Connection)
 import pandas as pd
+from contextlib import (nullcontext)
+from functools import (lru_cache)
+from typing import (NamedTuple)
 import re
 # pylint: enable=wrong-import-position
 
 # ================================= PACKAGE SETUPS ================================
+class SQLScript(NamedTuple):
+    """A parsed SQL script"""
+    statements: tuple[str, ...]
+    clauses: tuple[TextClause, ...]
+    bind_names: tuple[frozenset[str], ...]
+
+
+_SQL_SEGMENT = re.compile(r"""
+     (?P<comment>--[^\n]*|/\*.*?(?:\*/|$))
+    |(?P<quoted>'(?:[^']|'')*'?|"(?:[^"]|"")*"?|`(?:[^`]|``)*`?|\[[^\]]*\]?
+               |\$(?P<tag>(?:[A-Za-z_]\w*)?)\$.*?(?:\$(?P=tag)\$|$))
+    |(?P<semicolon>;)
+    |(?P<word>\w+)
+    |(?P<code>[^-/'"`\[;$\w]+|.)""", re.VERBOSE | re.DOTALL)
+"""The parts of an SQL script which can not contain a splitting semicolon"""
+
+
+def _is_trigger(words: list[str]) -> bool:
+    """Whether the first words of a statement create a trigger"""
+    return len(words)>1 and words[0]=='CREATE' and 'TRIGGER' in words[1:4]
+
+
+def split_sql(sql: str) -> list[str]:
+    """Split an SQL script at the semicolons which are not inside string
+    literals (also dollar quoted ones), quoted or bracketed identifiers,
+    comments or the BEGIN ... END body of a CREATE TRIGGER"""
+    statements = []
+    current = []
+    has_code = False
+    words: list[str] = []
+    depth = 0
+    for match in _SQL_SEGMENT.finditer(sql):
+        if match.lastgroup == 'semicolon' and depth == 0:
+            if has_code:
+                statements.append(''.join(current).strip())
+            current = []
+            has_code = False
+            words = []
+            continue
+        current.append(match.group())
+        if match.lastgroup != 'comment' and match.group().strip() != '':
+            has_code = True
+        if match.lastgroup == 'word':
+            word = match.group().upper()
+            if len(words) < 4:
+                words.append(word)
+            if word == 'BEGIN' and _is_trigger(words):
+                depth += 1
+            elif word == 'CASE' and depth > 0:
+                depth += 1
+            elif word == 'END' and depth > 0:
+                depth -= 1
+    if has_code:
+        statements.append(''.join(current).strip())
+    return statements
+
+
+@lru_cache(maxsize=256)
+def parse_sql_script(sql: str) -> SQLScript:
+    """Parse an SQL script into its statements, their compiled `TextClause`s
+    and the names of their bind parameters (memoized per script)"""
+    statements = tuple(split_sql(sql))
+    clauses = tuple(text(statement) for statement in statements)
+    bind_names = tuple(frozenset(clause.compile().params) for clause in clauses)
+    return SQLScript(statements, clauses, bind_names)
 
 
 # ================================ SYSTEM FUNCTIONS ===============================
@@ -30,7 +100,9 @@ def connect_genericdb(connection_url):
     engine = create_engine(connection_url)
     return engine
 
-def queryDatabase(conn, sql, has_result, param_dict={}, **kwargs):
+def queryDatabase(conn, sql, has_result, param_dict={}, yield_per=0, dtype_backend=None,
+                  optimize=False, dtype_overrides={}, param_rows=None, batch_size=1000,
+                  **kwargs):
     # tranform parameters
     parameters = {}
     for k, v in kwargs.items():
@@ -41,21 +113,91 @@ def queryDatabase(conn, sql, has_result, param_dict={}, **kwargs):
             parameters[k] = v
 
     # query
-    sqlstatements = [s
-                     for s in sql.split(';\n')
-                     if not re.search(r"^[;\s]*$", s)]
+    script = parse_sql_script(sql)
+    read_options = {} if dtype_backend is None else {'dtype_backend': dtype_backend}
     table = None
 
-    with conn.begin() as active_conn:
-        for i, sqlstatement in enumerate(sqlstatements):
-            if has_result and i==len(sqlstatements)-1: # only last statement can have result
-                table = pd.read_sql_query(text(sqlstatement),
+    # a session (Connection) is already in a transaction
+    with (nullcontext(conn) if isinstance(conn, Connection) else conn.begin()) as active_conn:
+        for i, statement in enumerate(script.clauses):
+            statement_params = {k: v for k, v in parameters.items()
+                                if k in script.bind_names[i]}
+            row_columns = [] if param_rows is None else \
+                          [c for c in param_rows.columns if c in script.bind_names[i]]
+            if row_columns: # run once per parameter row (executemany) batch by batch
+                step = batch_size if batch_size>0 else max(len(param_rows), 1)
+                for start in range(0, len(param_rows), step):
+                    batch = param_rows[row_columns].iloc[start:start+step]
+                    batch = batch.astype(object).where(batch.notna(), None)
+                    active_conn.execute(statement, [{**statement_params, **row}
+                                                    for row in batch.to_dict('records')])
+            elif has_result and i==len(script.clauses)-1: # only last statement can have result
+                if yield_per>0: # use a server-side cursor
+                    statement = statement.execution_options(stream_results=True,
+                                                            yield_per=yield_per)
+                table = pd.read_sql_query(statement,
                                             active_conn,
-                                            params=parameters)
+                                            params=statement_params,
+                                            **read_options)
             else:
-                active_conn.execute(text(sqlstatement), parameters)
-    
-    return table
+                active_conn.execute(statement, statement_params)
+
+    # shrink the result
+    memory_before = memory_after = 0
+    if optimize and table is not None:
+        memory_before = frame_memory(table)
+        table = optimize_dtypes(table, dtype_overrides)
+        memory_after = frame_memory(table)
+
+    return table, memory_before, memory_after
+
+def queryDatabaseChunks(conn, sql, chunksize, param_dict={}, yield_per=0, dtype_backend=None,
+                        optimize=False, dtype_overrides={}, param_rows=None, batch_size=1000,
+                        **kwargs):
+    # tranform parameters
+    parameters = {}
+    for k, v in kwargs.items():
+        if not k in parameters:
+            parameters[k] = v
+    for k, v in param_dict.items():
+        if not k in parameters:
+            parameters[k] = v
+
+    # query (the result of the last statement is yielded chunk by chunk)
+    script = parse_sql_script(sql)
+    read_options = {} if dtype_backend is None else {'dtype_backend': dtype_backend}
+
+    # a session (Connection) is already in a transaction
+    with (nullcontext(conn) if isinstance(conn, Connection) else conn.begin()) as active_conn:
+        for i, statement in enumerate(script.clauses):
+            statement_params = {k: v for k, v in parameters.items()
+                                if k in script.bind_names[i]}
+            row_columns = [] if param_rows is None else \
+                          [c for c in param_rows.columns if c in script.bind_names[i]]
+            if row_columns: # run once per parameter row (executemany) batch by batch
+                step = batch_size if batch_size>0 else max(len(param_rows), 1)
+                for start in range(0, len(param_rows), step):
+                    batch = param_rows[row_columns].iloc[start:start+step]
+                    batch = batch.astype(object).where(batch.notna(), None)
+                    active_conn.execute(statement, [{**statement_params, **row}
+                                                    for row in batch.to_dict('records')])
+            elif i==len(script.clauses)-1:
+                if yield_per>0: # use a server-side cursor
+                    statement = statement.execution_options(stream_results=True,
+                                                            yield_per=yield_per)
+                for chunk in pd.read_sql_query(statement,
+                                               active_conn,
+                                               params=statement_params,
+                                               chunksize=chunksize,
+                                               **read_options):
+                    if optimize:
+                        memory_before = frame_memory(chunk)
+                        chunk = optimize_dtypes(chunk, dtype_overrides)
+                        yield chunk, memory_before, frame_memory(chunk)
+                    else:
+                        yield chunk, 0, 0
+            else:
+                active_conn.execute(statement, statement_params)
 
 
 
@@ -67,12 +209,12 @@ def queryDatabase(conn, sql, has_result, param_dict={}, **kwargs):
 
 # ------- GenericDBConn_inExec -------
 GenericDBConn_out = connect_genericdb('sqlite:///tests/temp/db.sdb')
-SQLQuery_result = queryDatabase(GenericDBConn_out, """drop table if exists tableA;
-                                                      create table tableA as
-                                                      select 1 as id, 'aaa' as name;""", False)
-SQLQuery1_result = queryDatabase(GenericDBConn_out, """select * from tableA;""", True)
+SQLQuery_result, SQLQuery_memory_before, SQLQuery_memory_after = queryDatabase(GenericDBConn_out, """drop table if exists tableA;
+                                                                                                     create table tableA as
+                                                                                                     select 1 as id, 'aaa' as name;""", False)
+SQLQuery1_result, SQLQuery1_memory_before, SQLQuery1_memory_after = queryDatabase(GenericDBConn_out, """select * from tableA;""", True)
 makeString_out = 'aaa'
 makeDictElement_out = ('name', makeString_out)
 makeDict_out, makeDict_result = dict([makeDictElement_out]), True
-SQLQuery2_result = queryDatabase(GenericDBConn_out, """select * from tableA where name=:name;""", True, param_dict=makeDict_out)
-SQLQuery3_result = queryDatabase(GenericDBConn_out, """select * from tableA where name=:name;""", True, name = 'aaa')
+SQLQuery2_result, SQLQuery2_memory_before, SQLQuery2_memory_after = queryDatabase(GenericDBConn_out, """select * from tableA where name=:name;""", True, param_dict=makeDict_out)
+SQLQuery3_result, SQLQuery3_memory_before, SQLQuery3_memory_after = queryDatabase(GenericDBConn_out, """select * from tableA where name=:name;""", True, name = 'aaa')
@@ -16,12 +16,436 @@ VARS = {}
 # ================================ PACKAGE IMPORTS ================================
 # pylint: disable=wrong-import-position
 from sqlalchemy import (create_engine,
-                        text)
+                        text,
+                        TextClause,
+                        Connection,
+                        Index,
+                        MetaData,
+                        Table,
+                        inspect,
+                        NVARCHAR)
 import pandas as pd
+from contextlib import (nullcontext)
+from functools import (lru_cache)
+from typing import (NamedTuple,
+                    Iterable,
+                    Union,
+                    Optional)
 import re
+import io
 # pylint: enable=wrong-import-position
 
 # ================================= PACKAGE SETUPS ================================
+class SQLScript(NamedTuple):
+    """A parsed SQL script"""
+    statements: tuple[str, ...]
+    clauses: tuple[TextClause, ...]
+    bind_names: tuple[frozenset[str], ...]
+
+
+_SQL_SEGMENT = re.compile(r"""
+     (?P<comment>--[^\n]*|/\*.*?(?:\*/|$))
+    |(?P<quoted>'(?:[^']|'')*'?|"(?:[^"]|"")*"?|`(?:[^`]|``)*`?|\[[^\]]*\]?
+               |\$(?P<tag>(?:[A-Za-z_]\w*)?)\$.*?(?:\$(?P=tag)\$|$))
+    |(?P<semicolon>;)
+    |(?P<word>\w+)
+    |(?P<code>[^-/'"`\[;$\w]+|.)""", re.VERBOSE | re.DOTALL)
+"""The parts of an SQL script which can not contain a splitting semicolon"""
+
+
+def _is_trigger(words: list[str]) -> bool:
+    """Whether the first words of a statement create a trigger"""
+    return len(words)>1 and words[0]=='CREATE' and 'TRIGGER' in words[1:4]
+
+
+def split_sql(sql: str) -> list[str]:
+    """Split an SQL script at the semicolons which are not inside string
+    literals (also dollar quoted ones), quoted or bracketed identifiers,
+    comments or the BEGIN ... END body of a CREATE TRIGGER"""
+    statements = []
+    current = []
+    has_code = False
+    words: list[str] = []
+    depth = 0
+    for match in _SQL_SEGMENT.finditer(sql):
+        if match.lastgroup == 'semicolon' and depth == 0:
+            if has_code:
+                statements.append(''.join(current).strip())
+            current = []
+            has_code = False
+            words = []
+            continue
+        current.append(match.group())
+        if match.lastgroup != 'comment' and match.group().strip() != '':
+            has_code = True
+        if match.lastgroup == 'word':
+            word = match.group().upper()
+            if len(words) < 4:
+                words.append(word)
+            if word == 'BEGIN' and _is_trigger(words):
+                depth += 1
+            elif word == 'CASE' and depth > 0:
+                depth += 1
+            elif word == 'END' and depth > 0:
+                depth -= 1
+    if has_code:
+        statements.append(''.join(current).strip())
+    return statements
+
+
+@lru_cache(maxsize=256)
+def parse_sql_script(sql: str) -> SQLScript:
+    """Parse an SQL script into its statements, their compiled `TextClause`s
+    and the names of their bind parameters (memoized per script)"""
+    statements = tuple(split_sql(sql))
+    clauses = tuple(text(statement) for statement in statements)
+    bind_names = tuple(frozenset(clause.compile().params) for clause in clauses)
+    return SQLScript(statements, clauses, bind_names)
+
+
+MSSQL_MAX_PARAMS = 2100
+"""SQL Server rejects statements with more bound parameters than this"""
+DEFAULT_CHUNKSIZE = 10000
+"""Rows sent to the database in one batch"""
+MSSQL_MAX_NVARCHAR = 4000
+"""The longest NVARCHAR(n), longer texts need NVARCHAR(max)"""
+
+
+def to_sql_options(conn, df: pd.DataFrame, with_index: bool,
+                   chunksize: int = DEFAULT_CHUNKSIZE) -> dict:
+    """The insert options of `DataFrame.to_sql` for the engine or session `conn`
+
+    Engines with pyodbc's `fast_executemany` get plain executemany batches
+    (the driver packs them into arrays sized by the column types, see
+    `BulkLoader`), others get multi-row INSERTs which stay within the parameter
+    limit of SQL Server. Batches have at most `chunksize` rows (if positive)"""
+    chunksize = chunksize if chunksize>0 else None
+    dialect = conn.dialect
+    if getattr(dialect, 'fast_executemany', False):
+        return {'method': None, 'chunksize': chunksize}
+    if dialect.name=='mssql':
+        columns = len(df.columns) + (df.index.nlevels if with_index else 0)
+        limit = max(1, (MSSQL_MAX_PARAMS-1)//max(1, columns))
+        return {'method': 'multi', 'chunksize': min(chunksize or limit, limit)}
+    return {'method': 'multi', 'chunksize': chunksize}
+
+
+def text_lengths(df: pd.DataFrame) -> dict[str, Optional[int]]:
+    """The NVARCHAR lengths of the text columns of `df`: the longest text
+    rounded up to a power of two (at most MSSQL_MAX_NVARCHAR), None for max"""
+    lengths: dict[str, Optional[int]] = {}
+    for col in df.columns:
+        s = df[col]
+        if not (pd.api.types.is_string_dtype(s.dtype)
+                and pd.api.types.infer_dtype(s, skipna=True) in ('string', 'empty')):
+            continue
+        longest = int(s.str.len().max()) if s.notna().any() else 1
+        if longest>MSSQL_MAX_NVARCHAR:
+            lengths[str(col)] = None
+        else:
+            lengths[str(col)] = min(1 << max(longest-1, 0).bit_length(), MSSQL_MAX_NVARCHAR)
+    return lengths
+
+
+def nvarchar_types(lengths: dict[str, Optional[int]]) -> dict:
+    """The `dtype` argument of `DataFrame.to_sql` for the text lengths"""
+    return {col: NVARCHAR(length) for col, length in lengths.items()}
+
+
+_COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def _copy_field(value) -> str:
+    """A value in the text format of COPY"""
+    if value is None:
+        return '\\N'
+    return str(value).translate(_COPY_ESCAPES)
+
+
+def copy_rows(pd_table, conn, keys, data_iter) -> None:
+    """A `DataFrame.to_sql` method streaming the rows through PostgreSQL's
+    `COPY FROM STDIN` in its text format (psycopg2 or psycopg 3)"""
+    buffer = io.StringIO()
+    for row in data_iter:
+        buffer.write('\t'.join(_copy_field(v) for v in row) + '\n')
+    buffer.seek(0)
+    quote = conn.dialect.identifier_preparer.quote
+    table = quote(pd_table.name)
+    if pd_table.schema:
+        table = f"{quote(pd_table.schema)}.{table}"
+    sql = f"COPY {table} ({', '.join(quote(k) for k in keys)}) FROM STDIN"
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        if hasattr(cursor, 'copy_expert'):
+            cursor.copy_expert(sql, buffer)
+        else:
+            with cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+    finally:
+        cursor.close()
+
+
+class BulkLoader:
+    """Loads the frames of one upload with `DataFrame.to_sql` (multi-row
+    INSERTs or pyodbc's fast_executemany), the base of the other strategies
+
+    `before` runs on the connection ahead of the transaction of the upload,
+    `after` once the transaction is finished
+
+    On SQL Server the text columns of a created table are NVARCHAR(n) sized
+    by the texts instead of pandas' NVARCHAR(max): pyodbc sizes the parameter
+    arrays of fast_executemany from the described column types and sends
+    values for a max column one at a time. The columns are widened when a
+    later frame of the upload has longer texts"""
+
+    def __init__(self, conn: Connection, tablename: str, with_index: bool,
+                 chunksize: int) -> None:
+        self.conn = conn
+        self.tablename = tablename
+        self.with_index = with_index
+        self.chunksize = chunksize
+        self.text_lengths: dict[str, Optional[int]] = {}
+
+    def before(self) -> None:
+        """Prepare the connection"""
+
+    def column_types(self, df: pd.DataFrame, if_exists: str) -> dict:
+        """The `dtype` argument of `DataFrame.to_sql` for loading `df` into
+        the table, widening the text columns this upload created if needed"""
+        if self.conn.dialect.name!='mssql':
+            return {}
+        lengths = text_lengths(df)
+        if if_exists!='append' or not inspect(self.conn).has_table(self.tablename):
+            self.text_lengths = lengths
+            return nvarchar_types(lengths)
+        quote = self.conn.dialect.identifier_preparer.quote
+        for col, length in lengths.items():
+            if col not in self.text_lengths:
+                continue
+            created = self.text_lengths[col]
+            if created is not None and (length is None or length>created):
+                self.conn.exec_driver_sql(
+                    f"ALTER TABLE {quote(self.tablename)} ALTER COLUMN {quote(col)} "
+                    f"NVARCHAR({'max' if length is None else length})")
+                self.text_lengths[col] = length
+        return nvarchar_types(lengths)
+
+    def load(self, df: pd.DataFrame, if_exists: str) -> None:
+        """Insert the rows of one frame"""
+        df.to_sql(self.tablename, self.conn, index=self.with_index, if_exists=if_exists,
+                  dtype=self.column_types(df, if_exists),
+                  **to_sql_options(self.conn, df, self.with_index, self.chunksize))
+
+    def after(self) -> None:
+        """Restore the connection"""
+
+
+class CopyLoader(BulkLoader):
+    """PostgreSQL: `COPY FROM STDIN`"""
+
+    def load(self, df: pd.DataFrame, if_exists: str) -> None:
+        df.to_sql(self.tablename, self.conn, index=self.with_index, if_exists=if_exists,
+                  method=copy_rows, chunksize=self.chunksize if self.chunksize>0 else None)
+
+
+class SQLiteLoader(BulkLoader):
+    """SQLite: plain executemany without waiting for the disk (synchronous=OFF)
+    in the single transaction of the upload"""
+
+    def __init__(self, conn: Connection, tablename: str, with_index: bool,
+                 chunksize: int) -> None:
+        super().__init__(conn, tablename, with_index, chunksize)
+        self._synchronous = None
+
+    def before(self) -> None:
+        # the commit of a session (a transaction already running) is left durable
+        if not self.conn.in_transaction():
+            self._synchronous = self.conn.exec_driver_sql('PRAGMA synchronous').scalar()
+            self.conn.exec_driver_sql('PRAGMA synchronous=OFF')
+            self.conn.commit()
+
+    def load(self, df: pd.DataFrame, if_exists: str) -> None:
+        df.to_sql(self.tablename, self.conn, index=self.with_index, if_exists=if_exists,
+                  method=None, chunksize=self.chunksize if self.chunksize>0 else None)
+
+    def after(self) -> None:
+        if self._synchronous is not None:
+            self.conn.exec_driver_sql(f"PRAGMA synchronous={int(self._synchronous)}")
+            self.conn.commit()
+
+
+def staging_name(tablename: str) -> str:
+    """The name of the staging table of a target table (next to it)"""
+    return f"{tablename}_staging"
+
+
+def column_names(df: pd.DataFrame, with_index: bool) -> list[str]:
+    """The table columns `DataFrame.to_sql` creates for `df`"""
+    names = [str(n) for n in df.columns]
+    if with_index:
+        names = [str(n) if n is not None else ('index' if df.index.nlevels==1 else f"level_{i}")
+                 for i, n in enumerate(df.index.names)] + names
+    return names
+
+
+class StagingLoader(BulkLoader):
+    """Any database: load the frame into a staging table, then move the rows
+    into the target table with one `INSERT ... SELECT`"""
+
+    def load(self, df: pd.DataFrame, if_exists: str) -> None:
+        # create (or replace) the target table with the columns of the frame
+        dtype = self.column_types(df, if_exists)
+        df.head(0).to_sql(self.tablename, self.conn, index=self.with_index,
+                          if_exists=if_exists, dtype=dtype)
+        staging = staging_name(self.tablename)
+        df.to_sql(staging, self.conn, index=self.with_index, if_exists='replace', dtype=dtype,
+                  **to_sql_options(self.conn, df, self.with_index, self.chunksize))
+        quote = self.conn.dialect.identifier_preparer.quote
+        columns = ', '.join(quote(n) for n in column_names(df, self.with_index))
+        self.conn.exec_driver_sql(f"INSERT INTO {quote(self.tablename)} ({columns}) "
+                                  f"SELECT {columns} FROM {quote(staging)}")
+        self.conn.exec_driver_sql(f"DROP TABLE {quote(staging)}")
+
+
+LOADERS: dict[str, type[BulkLoader]] = {
+    'insert': BulkLoader,
+    'copy': CopyLoader,
+    'sqlite': SQLiteLoader,
+    'staging': StagingLoader,
+}
+"""The bulk load strategies by name, other modules may register more"""
+
+
+def auto_strategy(conn) -> str:
+    """The fastest strategy known to work with the dialect of `conn`"""
+    dialect = conn.dialect
+    if dialect.name=='postgresql' and dialect.driver in ('psycopg2', 'psycopg'):
+        return 'copy'
+    if dialect.name=='sqlite':
+        return 'sqlite'
+    return 'insert'
+
+
+def split_keys(keys: str) -> list[str]:
+    """The column names of a comma separated list"""
+    return [k.strip() for k in keys.split(',') if k.strip()]
+
+
+def merge_statement(dialect, target: str, staging: str, columns: list[str],
+                    keys: list[str]) -> str:
+    """The statement inserting the new rows of `staging` into `target` and
+    updating the rows with the same `keys` (only where a value changed)
+
+    PostgreSQL and SQLite (3.24+) need a unique index or primary key on the
+    keys of the target table for `ON CONFLICT`"""
+    quote = dialect.identifier_preparer.quote
+    cols = ', '.join(quote(c) for c in columns)
+    values = [quote(c) for c in columns if c not in keys]
+    target, staging = quote(target), quote(staging)
+    if dialect.name in ('postgresql', 'sqlite'):
+        conflict = ', '.join(quote(k) for k in keys)
+        if not values:
+            action = 'DO NOTHING'
+        elif dialect.name=='postgresql':
+            action = f"DO UPDATE SET {', '.join(f'{v} = excluded.{v}' for v in values)} " + \
+                     f"WHERE ({', '.join(f'{target}.{v}' for v in values)}) IS DISTINCT FROM " + \
+                     f"({', '.join(f'excluded.{v}' for v in values)})"
+        else:
+            action = f"DO UPDATE SET {', '.join(f'{v} = excluded.{v}' for v in values)} " + \
+                     f"WHERE {' OR '.join(f'{target}.{v} IS NOT excluded.{v}' for v in values)}"
+        # the WHERE keeps SQLite from reading ON as a join constraint
+        return f"INSERT INTO {target} ({cols}) SELECT {cols} FROM {staging} WHERE true " + \
+               f"ON CONFLICT ({conflict}) {action}"
+    if dialect.name=='mssql':
+        on = ' AND '.join(f"t.{quote(k)} = s.{quote(k)}" for k in keys)
+        matched = ''
+        if values:
+            matched = f"WHEN MATCHED AND EXISTS (SELECT {', '.join(f's.{v}' for v in values)} " + \
+                      f"EXCEPT SELECT {', '.join(f't.{v}' for v in values)}) " + \
+                      f"THEN UPDATE SET {', '.join(f't.{v} = s.{v}' for v in values)} "
+        return f"MERGE INTO {target} t USING {staging} s ON ({on}) {matched}" + \
+               f"WHEN NOT MATCHED THEN INSERT ({cols}) " + \
+               f"VALUES ({', '.join(f's.{quote(c)}' for c in columns)});"
+    if dialect.name in ('mysql', 'mariadb'):
+        action = ', '.join(f"{v} = s.{v}" for v in values or [quote(keys[0])])
+        return f"INSERT INTO {target} ({cols}) SELECT {cols} FROM {staging} s " + \
+               f"ON DUPLICATE KEY UPDATE {action}"
+    raise ValueError(f"Merging is not supported on {dialect.name}")
+
+
+def _drop_indexes(conn: Connection, tablename: str) -> list[Index]:
+    """Drop the indexes of the table (if it exists), returns them for rebuilding"""
+    if not inspect(conn).has_table(tablename):
+        return []
+    table = Table(tablename, MetaData(), autoload_with=conn)
+    indexes = [index for index in table.indexes if index.name]
+    for index in indexes:
+        index.drop(conn)
+    return indexes
+
+
+def _merge_frame(loader: BulkLoader, df: pd.DataFrame, keys: list[str]) -> None:
+    """Load `df` into the staging table of the loader's table and merge it"""
+    conn = loader.conn
+    staging = staging_name(loader.tablename)
+    columns = column_names(df, loader.with_index)
+    missing = [k for k in keys if k not in columns]
+    if missing:
+        raise ValueError(f"Merge key columns not in the uploaded data: {', '.join(missing)}")
+    # the staging table is filled with the same strategy (but directly)
+    stager = type(loader) if not isinstance(loader, StagingLoader) else BulkLoader
+    stager(conn, staging, loader.with_index, loader.chunksize).load(df, 'replace')
+    conn.exec_driver_sql(merge_statement(conn.dialect, loader.tablename, staging, columns, keys))
+    conn.exec_driver_sql(f"DROP TABLE {conn.dialect.identifier_preparer.quote(staging)}")
+
+
+def upload_frames(conn, data: Union[pd.DataFrame, Iterable[pd.DataFrame]],  # pylint: disable=too-many-arguments
+                  tablename: str, with_index: bool, if_exists: str,
+                  chunksize: int = DEFAULT_CHUNKSIZE, strategy: str = 'auto',
+                  rebuild_indexes: bool = False, merge_keys: Iterable[str] = ()) -> int:
+    """Upload a DataFrame or an iterator of DataFrame chunks (appending the
+    chunks after the first one) in one transaction with the bulk load
+    `strategy` (a name from `LOADERS` or 'auto'), optionally dropping the
+    indexes of an appended table during the load, returns the number of
+    rows uploaded
+
+    With `if_exists='merge'` the rows are loaded into a staging table and
+    merged into the existing table on the `merge_keys` columns (its indexes
+    are kept, the merge uses them)"""
+    if strategy=='auto':
+        strategy = auto_strategy(conn)
+    if strategy not in LOADERS:
+        raise ValueError(f"Unknown bulk load strategy: {strategy}")
+    keys = list(merge_keys)
+    if if_exists=='merge' and not keys:
+        raise ValueError("Merging needs the key columns")
+    frames = [data] if isinstance(data, pd.DataFrame) else data
+    rows = 0
+    with (nullcontext(conn) if isinstance(conn, Connection) else conn.connect()) as active_conn:
+        loader = LOADERS[strategy](active_conn, tablename, with_index, chunksize)
+        loader.before()
+        try:
+            with (nullcontext() if isinstance(conn, Connection) else active_conn.begin()):
+                merging = if_exists=='merge' and inspect(active_conn).has_table(tablename)
+                if if_exists=='merge' and not merging:
+                    # a new table: every row is new (and it has no keys to merge on)
+                    if_exists = 'append'
+                indexes = _drop_indexes(active_conn, tablename) \
+                          if rebuild_indexes and if_exists=='append' else []
+                for df in frames:
+                    if not with_index and not isinstance(df.index, pd.RangeIndex):
+                        df = df.reset_index(drop=True)
+                    if merging:
+                        _merge_frame(loader, df, keys)
+                    else:
+                        loader.load(df, if_exists)
+                        if_exists = 'append'
+                    rows += len(df)
+                for index in indexes:
+                    index.create(active_conn)
+        finally:
+            loader.after()
+    return rows
 
 
 # ================================ SYSTEM FUNCTIONS ===============================
@@ -30,7 +454,9 @@ def connect_genericdb(connection_url):
     engine = create_engine(connection_url)
     return engine
 
-def queryDatabase(conn, sql, has_result, param_dict={}, **kwargs):
+def queryDatabase(conn, sql, has_result, param_dict={}, yield_per=0, dtype_backend=None,
+                  optimize=False, dtype_overrides={}, param_rows=None, batch_size=1000,
+                  **kwargs):
     # tranform parameters
     parameters = {}
     for k, v in kwargs.items():
@@ -41,26 +467,96 @@ def queryDatabase(conn, sql, has_result, param_dict={}, **kwargs):
             parameters[k] = v
 
     # query
-    sqlstatements = [s
-                     for s in sql.split(';\n')
-                     if not re.search(r"^[;\s]*$", s)]
+    script = parse_sql_script(sql)
+    read_options = {} if dtype_backend is None else {'dtype_backend': dtype_backend}
     table = None
 
-    with conn.begin() as active_conn:
-        for i, sqlstatement in enumerate(sqlstatements):
-            if has_result and i==len(sqlstatements)-1: # only last statement can have result
-                table = pd.read_sql_query(text(sqlstatement),
+    # a session (Connection) is already in a transaction
+    with (nullcontext(conn) if isinstance(conn, Connection) else conn.begin()) as active_conn:
+        for i, statement in enumerate(script.clauses):
+            statement_params = {k: v for k, v in parameters.items()
+                                if k in script.bind_names[i]}
+            row_columns = [] if param_rows is None else \
+                          [c for c in param_rows.columns if c in script.bind_names[i]]
+            if row_columns: # run once per parameter row (executemany) batch by batch
+                step = batch_size if batch_size>0 else max(len(param_rows), 1)
+                for start in range(0, len(param_rows), step):
+                    batch = param_rows[row_columns].iloc[start:start+step]
+                    batch = batch.astype(object).where(batch.notna(), None)
+                    active_conn.execute(statement, [{**statement_params, **row}
+                                                    for row in batch.to_dict('records')])
+            elif has_result and i==len(script.clauses)-1: # only last statement can have result
+                if yield_per>0: # use a server-side cursor
+                    statement = statement.execution_options(stream_results=True,
+                                                            yield_per=yield_per)
+                table = pd.read_sql_query(statement,
                                             active_conn,
-                                            params=parameters)
+                                            params=statement_params,
+                                            **read_options)
+            else:
+                active_conn.execute(statement, statement_params)
+
+    # shrink the result
+    memory_before = memory_after = 0
+    if optimize and table is not None:
+        memory_before = frame_memory(table)
+        table = optimize_dtypes(table, dtype_overrides)
+        memory_after = frame_memory(table)
+
+    return table, memory_before, memory_after
+
+def queryDatabaseChunks(conn, sql, chunksize, param_dict={}, yield_per=0, dtype_backend=None,
+                        optimize=False, dtype_overrides={}, param_rows=None, batch_size=1000,
+                        **kwargs):
+    # tranform parameters
+    parameters = {}
+    for k, v in kwargs.items():
+        if not k in parameters:
+            parameters[k] = v
+    for k, v in param_dict.items():
+        if not k in parameters:
+            parameters[k] = v
+
+    # query (the result of the last statement is yielded chunk by chunk)
+    script = parse_sql_script(sql)
+    read_options = {} if dtype_backend is None else {'dtype_backend': dtype_backend}
+
+    # a session (Connection) is already in a transaction
+    with (nullcontext(conn) if isinstance(conn, Connection) else conn.begin()) as active_conn:
+        for i, statement in enumerate(script.clauses):
+            statement_params = {k: v for k, v in parameters.items()
+                                if k in script.bind_names[i]}
+            row_columns = [] if param_rows is None else \
+                          [c for c in param_rows.columns if c in script.bind_names[i]]
+            if row_columns: # run once per parameter row (executemany) batch by batch
+                step = batch_size if batch_size>0 else max(len(param_rows), 1)
+                for start in range(0, len(param_rows), step):
+                    batch = param_rows[row_columns].iloc[start:start+step]
+                    batch = batch.astype(object).where(batch.notna(), None)
+                    active_conn.execute(statement, [{**statement_params, **row}
+                                                    for row in batch.to_dict('records')])
+            elif i==len(script.clauses)-1:
+                if yield_per>0: # use a server-side cursor
+                    statement = statement.execution_options(stream_results=True,
+                                                            yield_per=yield_per)
+                for chunk in pd.read_sql_query(statement,
+                                               active_conn,
+                                               params=statement_params,
+                                               chunksize=chunksize,
+                                               **read_options):
+                    if optimize:
+                        memory_before = frame_memory(chunk)
+                        chunk = optimize_dtypes(chunk, dtype_overrides)
+                        yield chunk, memory_before, frame_memory(chunk)
+                    else:
+                        yield chunk, 0, 0
             else:
-                active_conn.execute(text(sqlstatement), parameters)
-    
-    return table
+                active_conn.execute(statement, statement_params)
 
-def uploadPandas(conn, df, tablename, with_index, if_exists):
-    if not with_index:
-        df = df.reset_index(drop=True)
-    df.to_sql(tablename, conn, method='multi', index=with_index, if_exists=if_exists)
+def uploadPandas(conn, df, tablename, with_index, if_exists, chunksize, strategy,
+                 rebuild_indexes, merge_keys):
+    upload_frames(conn, df, tablename, with_index, if_exists, chunksize, strategy,
+                  rebuild_indexes, split_keys(merge_keys))
 
 
 
@@ -73,9 +569,9 @@ def uploadPandas(conn, df, tablename, with_index, if_exists):
 
 # ------- GenericDBConn_inExec -------
 GenericDBConn_out = connect_genericdb('sqlite:///tests/temp/db.sdb')
-SQLQuery_result = queryDatabase(GenericDBConn_out, """select 1 as id, 'aaa' as name
-                                                      union all
-                                                      select 2 as id, 'bbb' as name""", True)
-uploadPandas(GenericDBConn_out, SQLQuery_result, 'temptable', False, 'replace')
-SQLQuery1_result = queryDatabase(GenericDBConn_out, """select * from temptable;""", True)
+SQLQuery_result, SQLQuery_memory_before, SQLQuery_memory_after = queryDatabase(GenericDBConn_out, """select 1 as id, 'aaa' as name
+                                                                                                     union all
+                                                                                                     select 2 as id, 'bbb' as name""", True)
+uploadPandas(GenericDBConn_out, SQLQuery_result, 'temptable', False, 'replace', 10000, 'auto', False, '')
+SQLQuery1_result, SQLQuery1_memory_before, SQLQuery1_memory_after = queryDatabase(GenericDBConn_out, """select * from temptable;""", True)
 print(SQLQuery1_result)
@@ -16,8 +16,16 @@ VARS = {}
 # ================================ PACKAGE IMPORTS ================================
 # pylint: disable=wrong-import-position
 from sqlalchemy import (create_engine,
-                        text)
+                        text,
+                        TextClause,
+                        Connection,
+                        inspect)
 import pandas as pd
+from contextlib import (nullcontext)
+from functools import (lru_cache)
+from typing import (NamedTuple,
+                    Optional,
+                    Callable)
 import re
 from pandasql.sqldf import (extract_table_names,
                             write_table,
@@ -26,11 +34,503 @@ from pandasql.sqldf import (extract_table_names,
                             PandaSQL as pSQL)
 from sqlalchemy.exc import (DatabaseError,
                             ResourceClosedError)
+import hashlib
+import logging
+import operator
 # pylint: enable=wrong-import-position
 
 # ================================= PACKAGE SETUPS ================================
+class SQLScript(NamedTuple):
+    """A parsed SQL script"""
+    statements: tuple[str, ...]
+    clauses: tuple[TextClause, ...]
+    bind_names: tuple[frozenset[str], ...]
+
+
+_SQL_SEGMENT = re.compile(r"""
+     (?P<comment>--[^\n]*|/\*.*?(?:\*/|$))
+    |(?P<quoted>'(?:[^']|'')*'?|"(?:[^"]|"")*"?|`(?:[^`]|``)*`?|\[[^\]]*\]?
+               |\$(?P<tag>(?:[A-Za-z_]\w*)?)\$.*?(?:\$(?P=tag)\$|$))
+    |(?P<semicolon>;)
+    |(?P<word>\w+)
+    |(?P<code>[^-/'"`\[;$\w]+|.)""", re.VERBOSE | re.DOTALL)
+"""The parts of an SQL script which can not contain a splitting semicolon"""
+
+
+def _is_trigger(words: list[str]) -> bool:
+    """Whether the first words of a statement create a trigger"""
+    return len(words)>1 and words[0]=='CREATE' and 'TRIGGER' in words[1:4]
+
+
+def split_sql(sql: str) -> list[str]:
+    """Split an SQL script at the semicolons which are not inside string
+    literals (also dollar quoted ones), quoted or bracketed identifiers,
+    comments or the BEGIN ... END body of a CREATE TRIGGER"""
+    statements = []
+    current = []
+    has_code = False
+    words: list[str] = []
+    depth = 0
+    for match in _SQL_SEGMENT.finditer(sql):
+        if match.lastgroup == 'semicolon' and depth == 0:
+            if has_code:
+                statements.append(''.join(current).strip())
+            current = []
+            has_code = False
+            words = []
+            continue
+        current.append(match.group())
+        if match.lastgroup != 'comment' and match.group().strip() != '':
+            has_code = True
+        if match.lastgroup == 'word':
+            word = match.group().upper()
+            if len(words) < 4:
+                words.append(word)
+            if word == 'BEGIN' and _is_trigger(words):
+                depth += 1
+            elif word == 'CASE' and depth > 0:
+                depth += 1
+            elif word == 'END' and depth > 0:
+                depth -= 1
+    if has_code:
+        statements.append(''.join(current).strip())
+    return statements
+
+
+@lru_cache(maxsize=256)
+def parse_sql_script(sql: str) -> SQLScript:
+    """Parse an SQL script into its statements, their compiled `TextClause`s
+    and the names of their bind parameters (memoized per script)"""
+    statements = tuple(split_sql(sql))
+    clauses = tuple(text(statement) for statement in statements)
+    bind_names = tuple(frozenset(clause.compile().params) for clause in clauses)
+    return SQLScript(statements, clauses, bind_names)
+
+
+def frame_fingerprint(df: pd.DataFrame) -> Optional[str]:
+    """A content hash of a DataFrame (values, index, columns and dtypes)
+    or None if the values cannot be hashed"""
+    try:
+        hashed = pd.util.hash_pandas_object(df, index=True).values
+    except TypeError:
+        return None
+    digest = hashlib.sha256(hashed.tobytes())
+    digest.update(repr(list(df.columns)).encode('utf8'))
+    digest.update(repr(list(df.dtypes.astype(str))).encode('utf8'))
+    return digest.hexdigest()
+
+
+_SQL_TOKEN = re.compile(r"""
+     (?P<comment>--[^\n]*|/\*.*?(?:\*/|$))
+    |(?P<quoted>"(?:[^"]|"")*"|`(?:[^`]|``)*`|\[[^\]]*\])
+    |(?P<string>'(?:[^']|'')*')
+    |(?P<name>[A-Za-z_][\w$]*)
+    |(?P<number>\d+(?:\.\d*)?(?:[eE][-+]?\d+)?|\.\d+)
+    |(?P<param>[:@$?]\w*)
+    |(?P<op><=|>=|<>|!=|==|\|\||\S)""", re.VERBOSE | re.DOTALL)
+
+_MODIFYING_KEYWORDS = frozenset(['insert', 'update', 'delete', 'replace', 'alter', 'drop'])
+"""Keywords of statements which may modify the loaded tables"""
+
+_STAR_PREFIXES = frozenset(['select', 'distinct', 'all', ',', '.'])
+"""Tokens before a `*` selecting all columns (not a multiplication or count(*))"""
+
+
+def sql_tokens(query: str) -> list[tuple[str, str]]:
+    """Split an SQL statement into (kind, text) tokens, dropping the comments
+
+    The kinds are name, quoted (an identifier, returned without the quotes),
+    string, number, param and op"""
+    tokens = []
+    for match in _SQL_TOKEN.finditer(query):
+        kind = match.lastgroup
+        text = match.group()
+        if kind=='comment':
+            continue
+        if kind=='quoted':
+            text = text[1:-1].replace(text[0]*2, text[0]) if text[0]!='[' else text[1:-1]
+        tokens.append((kind, text))
+    return tokens
+
+
+def referenced_columns(query: str, columns) -> Optional[list]:
+    """The `columns` of a DataFrame which `query` may reference, None if it
+    may need all of them (`*`, a natural join or a statement modifying data)
+
+    Any word of the query matching a column name counts as a reference, so
+    the result can include unused columns but never misses a used one"""
+    tokens = sql_tokens(query)
+    words = set()
+    for pos, (kind, text) in enumerate(tokens):
+        if kind=='name':
+            word = text.lower()
+            if word=='natural' or (word in _MODIFYING_KEYWORDS and
+                                   # the replace() string function
+                                   tokens[pos+1:pos+2]!=[('op', '(')]):
+                return None
+            words.add(word)
+        elif kind in ('quoted', 'string'):
+            words.add(text.lower())
+        elif text=='*' and pos>0 and tokens[pos-1][1].lower() in _STAR_PREFIXES \
+             and tokens[pos-1][0] in ('name', 'op'):
+            return None
+    used = [column for column in columns if str(column).lower() in words]
+    # keep a column for the row count of e.g. count(*)
+    return used or list(columns[:1])
+
+
+_COMPARISONS = {'=': '==', '==': '==', '!=': '!=', '<>': '!=',
+                '<': '<', '<=': '<=', '>': '>', '>=': '>='}
+_FLIPPED = {'==': '==', '!=': '!=', '<': '>', '<=': '>=', '>': '<', '>=': '<='}
+_OPERATORS = {'==': operator.eq, '!=': operator.ne, '<': operator.lt,
+              '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+
+_NOT_SINGLE_TABLE = frozenset(['join', 'union', 'intersect', 'except', 'with', 'over'])
+"""Keywords of queries which read more than a single table scan"""
+
+_CLAUSE_ENDS = frozenset(['group', 'order', 'limit', 'having', 'window'])
+
+
+def _split_conjuncts(tokens: list[tuple[str, str]]) -> Optional[list[list[tuple[str, str]]]]:
+    """Split a WHERE clause at its top level ANDs, None if it is not a plain
+    conjunction (a top level OR or a CASE expression)"""
+    conjuncts: list[list[tuple[str, str]]] = [[]]
+    depth = 0
+    in_between = False
+    for kind, text in tokens:
+        word = text.lower() if kind=='name' else None
+        if word=='case' or (word=='or' and depth==0):
+            return None
+        if text=='(' and kind=='op':
+            depth += 1
+        elif text==')' and kind=='op':
+            depth -= 1
+        elif word=='between' and depth==0:
+            in_between = True
+        elif word=='and' and depth==0:
+            if not in_between:
+                conjuncts.append([])
+                continue
+            in_between = False
+        conjuncts[-1].append((kind, text))
+    return conjuncts
+
+
+def _parse_predicate(tokens: list[tuple[str, str]],
+                     qualifiers: set[str]) -> Optional[tuple[str, str, tuple]]:
+    """A (column, operator, values) predicate if `tokens` are a comparison,
+    [NOT] IN, BETWEEN or IS [NOT] NULL of a column with literals or parameters"""
+    def column(pos):
+        if tokens[pos:pos+1] and tokens[pos][0] in ('name', 'quoted'):
+            if tokens[pos+1:pos+2]==[('op', '.')]:
+                if tokens[pos][1].lower() not in qualifiers or \
+                   not tokens[pos+2:pos+3] or tokens[pos+2][0] not in ('name', 'quoted'):
+                    return None, pos
+                pos += 2
+            return tokens[pos][1], pos+1
+        return None, pos
+    def value(pos):
+        if tokens[pos:pos+2] and tokens[pos]==('op', '-') and tokens[pos+1][0]=='number':
+            return ('number', '-'+tokens[pos+1][1]), pos+2
+        if tokens[pos:pos+1] and (tokens[pos][0] in ('number', 'string') or
+                                  (tokens[pos][0]=='param' and len(tokens[pos][1])>1)):
+            return tokens[pos], pos+1
+        return None, pos
+
+    words = [text.lower() if kind=='name' else text for kind, text in tokens]
+    name, pos = column(0)
+    if name is None:
+        # a value compared to a column
+        val, pos = value(0)
+        if val is None or pos>=len(tokens) or tokens[pos][1] not in _COMPARISONS:
+            return None
+        name, end = column(pos+1)
+        if name is None or end!=len(tokens):
+            return None
+        return name, _FLIPPED[_COMPARISONS[tokens[pos][1]]], (val,)
+    rest = words[pos:]
+    if rest in (['is', 'null'], ['is', 'not', 'null']):
+        return name, ' '.join(rest), ()
+    if rest and tokens[pos][0]=='op' and rest[0] in _COMPARISONS:
+        val, end = value(pos+1)
+        if val is None or end!=len(tokens):
+            return None
+        return name, _COMPARISONS[rest[0]], (val,)
+    if rest[:1]==['between']:
+        low, end = value(pos+1)
+        if low is None or words[end:end+1]!=['and']:
+            return None
+        high, end = value(end+1)
+        if high is None or end!=len(tokens):
+            return None
+        return name, 'between', (low, high)
+    op = 'not in' if rest[:2]==['not', 'in'] else 'in' if rest[:1]==['in'] else None
+    if op is None:
+        return None
+    pos += len(op.split())
+    if words[pos:pos+1]!=['(']:
+        return None
+    values = []
+    while True:
+        val, pos = value(pos+1)
+        if val is None:
+            return None
+        values.append(val)
+        if words[pos:pos+1]!=[',']:
+            break
+    if words[pos:]!=[')']:
+        return None
+    return name, op, tuple(values)
+
+
+def pushdown_predicates(query: str, table_name: str) -> list[tuple[str, str, tuple]]:
+    """The predicates of a single table SELECT on `table_name` which can
+    filter its DataFrame before loading it
+
+    These are the comparisons, [NOT] IN, BETWEEN and IS [NOT] NULL tests of a
+    column with literals or parameters among the top level AND terms of the
+    WHERE clause. They are (column, operator, values) tuples with the values
+    as (kind, text) tokens. The query still applies them, so leaving out a
+    term can only load more rows than needed"""
+    tokens = sql_tokens(query)
+    words = [text.lower() if kind=='name' else text for kind, text in tokens]
+    if not words or words[0]!='select' or words.count('select')!=1 or \
+       any(word in _NOT_SINGLE_TABLE for word in words) or \
+       'from' not in words or 'where' not in words:
+        return []
+    start = words.index('from')
+    where = words.index('where')
+    source = tokens[start+1:where]
+    if not source or source[0][0] not in ('name', 'quoted') or \
+       source[0][1].lower()!=table_name.lower():
+        return []
+    alias = [text for kind, text in source[1:] if kind in ('name', 'quoted')]
+    if len(alias)!=len(source)-1 or [a.lower() for a in alias[:-1]] not in ([], ['as']):
+        return []
+    qualifiers = {table_name.lower()}
+    if alias:
+        qualifiers.add(alias[-1].lower())
+
+    end = len(tokens)
+    depth = 0
+    for pos in range(where+1, len(tokens)):
+        if words[pos]=='(':
+            depth += 1
+        elif words[pos]==')':
+            depth -= 1
+        elif depth==0 and tokens[pos][0]=='name' and words[pos] in _CLAUSE_ENDS:
+            end = pos
+            break
+    conjuncts = _split_conjuncts(tokens[where+1:end])
+    if conjuncts is None:
+        return []
+    predicates = []
+    for conjunct in conjuncts:
+        predicate = _parse_predicate(conjunct, qualifiers)
+        if predicate is not None:
+            predicates.append(predicate)
+    return predicates
+
+
+def _literal(token: tuple[str, str], params: dict):
+    kind, text = token
+    if kind=='number':
+        return float(text) if any(c in text for c in '.eE') else int(text)
+    if kind=='string':
+        return text[1:-1].replace("''", "'")
+    return params.get(text[1:])
+
+
+def predicate_mask(df: pd.DataFrame, predicates: list[tuple[str, str, tuple]],
+                   params: Optional[dict]) -> tuple[tuple, Optional[pd.Series]]:
+    """Evaluate pushed down predicates on `df` as a boolean mask
+
+    A predicate is skipped when its column is ambiguous or its values do not
+    have the type of the column (SQLite would convert them, pandas does not
+    and could drop rows the query keeps). Returns the applied predicates
+    with their values and the mask (None if no predicate applied)"""
+    by_name: dict[str, list] = {}
+    for col in df.columns:
+        by_name.setdefault(str(col).lower(), []).append(col)
+    applied = []
+    mask = None
+    for name, op, tokens in predicates:
+        columns = by_name.get(name.lower(), [])
+        if len(columns)!=1:
+            continue
+        series = df[columns[0]]
+        values = [_literal(token, params or {}) for token in tokens]
+        if pd.api.types.is_numeric_dtype(series) and \
+           not pd.api.types.is_complex_dtype(series):
+            comparable = all(isinstance(v, (int, float)) for v in values)
+        elif pd.api.types.is_string_dtype(series):
+            comparable = all(isinstance(v, str) for v in values) and \
+                         pd.api.types.infer_dtype(series, skipna=True) in ('string', 'empty')
+        else:
+            comparable = not values
+        if not comparable:
+            continue
+
+        if op=='is null':
+            condition = series.isna()
+        else:
+            # NULL never satisfies the other predicates
+            condition = series.notna()
+            if op=='in':
+                condition &= series.isin(values)
+            elif op=='not in':
+                condition &= ~series.isin(values)
+            elif op=='between':
+                condition &= series.between(values[0], values[1])
+            elif op!='is not null':
+                condition[condition] = _OPERATORS[op](series[condition], values[0])
+        applied.append((name.lower(), op, tuple(values)))
+        mask = condition if mask is None else mask & condition
+    return tuple(applied), mask
+
+
+AUTO_INDEX_MIN_ROWS = 10000
+"""Tables with fewer rows get no automatic indexes (a scan is cheap enough)"""
+
+_EQUALITY_BOUNDARIES = frozenset(['where', 'on', 'and', 'or', 'not', '('])
+"""Tokens before a column compared as a whole (not a part of an expression)"""
+
+_NOT_ALIASES = frozenset(['where', 'on', 'using', 'join', 'inner', 'left', 'right', 'full',
+                          'cross', 'natural', 'outer', 'group', 'order', 'limit', 'having',
+                          'window', 'union', 'intersect', 'except', 'indexed', 'not'])
+
+_INDEX_DECLARATION = re.compile(r'\s*("[^"]+"|[^\s(),]+)\s*\(([^)]*)\)\s*(?:,|$)')
+
+
+def _table_aliases(tokens: list[tuple[str, str]]) -> dict[str, str]:
+    """Map the tables of the FROM and JOIN clauses and their aliases to the
+    lowercase table names"""
+    aliases = {}
+    pos = 0
+    while pos<len(tokens):
+        if tokens[pos][0]=='name' and tokens[pos][1].lower() in ('from', 'join') or \
+           (tokens[pos]==('op', ',') and pos>0 and tokens[pos-1][0] in ('name', 'quoted')
+            and aliases.get(tokens[pos-1][1].lower()) is not None):
+            pos += 1
+            if pos>=len(tokens) or tokens[pos][0] not in ('name', 'quoted'):
+                continue
+            table = tokens[pos][1].lower()
+            aliases[table] = table
+            if tokens[pos+1:pos+2] and tokens[pos+1][0]=='name' and \
+               tokens[pos+1][1].lower()=='as':
+                pos += 1
+            if tokens[pos+1:pos+2] and tokens[pos+1][0] in ('name', 'quoted') and \
+               tokens[pos+1][1].lower() not in _NOT_ALIASES:
+                pos += 1
+                aliases[tokens[pos][1].lower()] = table
+        pos += 1
+    return aliases
+
+
+def index_columns(query: str) -> dict[str, set[str]]:
+    """The lowercase columns which `query` joins on or compares for equality
+    by table (the columns without a table qualifier are under '')
+
+    These are the columns of `a.x = b.y`, `x = :value`, `x IN (...)` and
+    `USING (x, y)` terms, an index on them lets SQLite seek instead of scan"""
+    tokens = sql_tokens(query)
+    aliases = _table_aliases(tokens)
+    columns: dict[str, set[str]] = {}
+
+    def add(qualifier: Optional[str], name: str) -> None:
+        table = '' if qualifier is None else aliases.get(qualifier.lower())
+        if table is not None:
+            columns.setdefault(table, set()).add(name.lower())
+
+    def operand_before(pos: int) -> None:
+        if pos<0 or tokens[pos][0] not in ('name', 'quoted'):
+            return
+        qualifier = None
+        if pos>=2 and tokens[pos-1]==('op', '.'):
+            qualifier = tokens[pos-2][1]
+            pos -= 2
+        if pos==0 or tokens[pos-1][1].lower() in _EQUALITY_BOUNDARIES:
+            add(qualifier, tokens[pos+2 if qualifier else pos][1])
+
+    def operand_after(pos: int) -> None:
+        if pos>=len(tokens) or tokens[pos][0] not in ('name', 'quoted'):
+            return
+        qualifier = None
+        if tokens[pos+1:pos+2]==[('op', '.')] and tokens[pos+2:pos+3] and \
+           tokens[pos+2][0] in ('name', 'quoted'):
+            qualifier = tokens[pos][1]
+            pos += 2
+        following = tokens[pos+1:pos+2]
+        if not following or following[0][0] not in ('op', 'name') or \
+           following[0][1] in (')', ',', ';') or \
+           (following[0][0]=='name' and following[0][1].lower()!='collate'):
+            add(qualifier, tokens[pos][1])
+
+    for pos, (kind, text) in enumerate(tokens):
+        if kind=='op' and text in ('=', '=='):
+            operand_before(pos-1)
+            operand_after(pos+1)
+        elif kind=='name' and text.lower()=='in':
+            operand_before(pos-1)
+        elif kind=='name' and text.lower()=='using' and tokens[pos+1:pos+2]==[('op', '(')]:
+            for inner_kind, inner_text in tokens[pos+2:]:
+                if inner_text==')':
+                    break
+                if inner_kind in ('name', 'quoted'):
+                    add(None, inner_text)
+    return columns
+
+
+def parse_indexes(declarations: str) -> dict[str, list[tuple[str, ...]]]:
+    """Parse index declarations like `tableA(id), tableA(region, day), tableB(id)`
+    into the lists of indexed columns by lowercase table name"""
+    indexes: dict[str, list[tuple[str, ...]]] = {}
+    pos = 0
+    declarations = declarations.strip()
+    while pos<len(declarations):
+        match = _INDEX_DECLARATION.match(declarations, pos)
+        if match is None:
+            raise ValueError(f"Invalid index declaration: {declarations[pos:]!r}")
+        table = match.group(1).strip('"').lower()
+        columns = tuple(c.strip().strip('"') for c in match.group(2).split(',') if c.strip())
+        if not columns:
+            raise ValueError(f"No columns in the index declaration of {table}")
+        indexes.setdefault(table, []).append(columns)
+        pos = match.end()
+    return indexes
+
+
 class PandaSQL(pSQL):
-    """A patched subclass of PandaSQL providing parameterized queries against Pandas DataFrames"""
+    """A patched subclass of PandaSQL providing parameterized queries against Pandas DataFrames
+
+    A persistent instance keeps its connection (and the prepared statements
+    cached on it) between the calls and uploads a DataFrame again only when
+    its `fingerprint` (a content hash such as querycache.frame_fingerprint,
+    without one every call uploads again) changed
+
+    Only the columns a query references are loaded, the memory not loaded is
+    kept per table in `bytes_saved`. The simple WHERE terms of a single table
+    query filter the rows before loading
+
+    The loaded tables are indexed on the columns declared in `indexes` (by
+    lowercase table name) and, from `auto_index_min_rows` rows on, on the
+    columns the queries join on or compare for equality"""
+
+    def __init__(self, db_uri='sqlite:///:memory:', persist=False,
+                 fingerprint: Optional[Callable[[pd.DataFrame], Optional[str]]] = None,
+                 indexes: Optional[dict[str, list[tuple[str, ...]]]] = None,
+                 auto_index_min_rows: Optional[int] = AUTO_INDEX_MIN_ROWS):
+        super().__init__(db_uri, persist)
+        self.fingerprint = fingerprint
+        self.indexes = indexes or {}
+        self.auto_index_min_rows = auto_index_min_rows
+        self.table_indexes: dict[str, set[tuple[str, ...]]] = {}
+        self.table_rows: dict[str, int] = {}
+        self.table_fingerprints: dict[str, Optional[str]] = {}
+        self.table_columns: dict[str, Optional[frozenset]] = {}
+        self.table_filters: dict[str, Optional[tuple]] = {}
+        self.bytes_saved: dict[str, int] = {}
+        self._modified = False
 
     @staticmethod
     def sql_power(x: float, y: float) -> float | None:
@@ -46,7 +546,7 @@ class PandaSQL(pSQL):
                 'power', 2, self.sql_power)
         super()._init_connection(conn)
 
-    def __call__(self, query, env=None, params=None):
+    def __call__(self, query, env=None, params=None, dtype_backend=None):
         """
         Execute the SQL query.
         Automatically creates tables mentioned in the query from dataframes before executing.
@@ -54,35 +554,149 @@ class PandaSQL(pSQL):
         :param query: SQL query string, which can reference pandas dataframes as SQL tables.
         :param env: Variables environment - a dict mapping table names to pandas dataframes.
         If not specified use local and global variables of the caller.
+        :param dtype_backend: Backend of the result dtypes ('numpy_nullable' or 'pyarrow'),
+        None keeps the default numpy dtypes.
         :return: Pandas dataframe with the result of the SQL query.
         """
         if env is None:
             env = get_outer_frame_variables()
 
         result = None
+        read_options = {} if dtype_backend is None else {'dtype_backend': dtype_backend}
+
+        join_columns = index_columns(query)
 
         with self.conn as conn:
             for table_name in extract_table_names(query):
                 if table_name not in env:
                     # don't raise error because the table may be already in the database
                     continue
-                if self.persist and table_name in self.loaded_tables:
-                    # table was loaded before using the same instance, don't do it again
+                df = env[table_name]
+                if not isinstance(df, pd.DataFrame):
                     continue
-                if isinstance(env[table_name], pd.DataFrame):
-                    self.loaded_tables.add(table_name)
-                    write_table(env[table_name], table_name, conn)
-
+                columns = referenced_columns(query, df.columns)
+                needed = None if columns is None or len(columns)==len(df.columns) \
+                         else frozenset(columns)
+                predicates = pushdown_predicates(query, table_name)
+                row_filter, mask = predicate_mask(df, predicates, params) if predicates \
+                                   else ((), None)
+                if self.persist:
+                    fingerprint = self.fingerprint(df) if self.fingerprint is not None else None
+                    if table_name in self.loaded_tables:
+                        loaded = self.table_columns.get(table_name)
+                        loaded_filter = self.table_filters.get(table_name)
+                        unchanged = fingerprint is not None and \
+                                    self.table_fingerprints.get(table_name)==fingerprint
+                        if unchanged and (loaded is None or (needed is not None and
+                                                             needed<=loaded)) and \
+                           loaded_filter in (None, row_filter or None) and \
+                           inspect(conn).has_table(table_name):
+                            # loaded before by this instance and unchanged since
+                            self._create_indexes(conn, table_name, df, join_columns)
+                            continue
+                        if unchanged and needed is not None and loaded is not None:
+                            # keep the columns of the previous statements too
+                            needed |= loaded
+                        conn.exec_driver_sql(f'DROP TABLE IF EXISTS "{table_name}"')
+                    self.table_fingerprints[table_name] = fingerprint
+                self.table_columns[table_name] = needed
+                self.table_filters[table_name] = row_filter or None
+                self.loaded_tables.add(table_name)
+                if mask is not None:
+                    logging.getLogger('PyFlow.DataNodes').info(
+                        "Filtering %s by %d pushed down predicate(s): loading %d of %d rows",
+                        table_name, len(row_filter), int(mask.sum()), len(df))
+                    df = df[mask]
+                write_table(self._prune(df, table_name, needed), table_name, conn)
+                self.table_rows[table_name] = len(df)
+                self.table_indexes[table_name] = set()
+                self._create_indexes(conn, table_name, env[table_name], join_columns)
+
+            changes = self._total_changes(conn)
             try:
-                result = pd.read_sql(query, conn, params=params)
+                result = pd.read_sql(query, conn, params=params, **read_options)
             except DatabaseError as ex:
                 raise PandaSQLException(ex) from ex
             except ResourceClosedError:
                 # query returns nothing
                 result = None
+            finally:
+                if changes is None or self._total_changes(conn)!=changes:
+                    # the query may have modified the uploaded tables
+                    self._modified = True
 
         return result
 
+    def _create_indexes(self, conn, table_name: str, df: pd.DataFrame,
+                        join_columns: dict[str, set[str]]) -> None:
+        """Create the declared indexes and those on the join and equality
+        columns of the query (unless the table is small) of a loaded table"""
+        wanted = list(self.indexes.get(table_name.lower(), []))
+        if self.auto_index_min_rows is not None and \
+           self.table_rows.get(table_name, 0)>=self.auto_index_min_rows:
+            wanted += [(column,) for column in sorted(join_columns.get(table_name.lower(), set()) |
+                                                      join_columns.get('', set()))]
+        loaded = self.table_columns.get(table_name)
+        names = {str(column).lower(): str(column) for column in df.columns
+                 if loaded is None or column in loaded}
+        created = self.table_indexes.setdefault(table_name, set())
+        for columns in wanted:
+            key = tuple(column.lower() for column in columns)
+            if key in created or any(column not in names for column in key):
+                continue
+            index_name = f"ix_{table_name}_{'_'.join(key)}"
+            column_list = ', '.join(f'"{names[column]}"' for column in key)
+            conn.exec_driver_sql(
+                f'CREATE INDEX IF NOT EXISTS "{index_name}" ON "{table_name}" ({column_list})')
+            created.add(key)
+            logging.getLogger('PyFlow.DataNodes').debug(
+                "Created the index %s on %s", index_name, table_name)
+
+    def _prune(self, df: pd.DataFrame, table_name: str,
+               needed: Optional[frozenset]) -> pd.DataFrame:
+        """The `needed` columns of `df` (all if None), recording the bytes saved"""
+        dropped = [] if needed is None else [c for c in df.columns if c not in needed]
+        self.bytes_saved[table_name] = 0
+        if not dropped:
+            return df
+        saved = int(df[dropped].memory_usage(index=False, deep=True).sum())
+        self.bytes_saved[table_name] = saved
+        logging.getLogger('PyFlow.DataNodes').info(
+            "Loading %d of %d columns of %s, %d bytes saved",
+            len(df.columns)-len(dropped), len(df.columns), table_name, saved)
+        return df[[c for c in df.columns if c in needed]]
+
+    @staticmethod
+    def _total_changes(conn) -> Optional[int]:
+        """The number of rows modified on the SQLite connection so far"""
+        return getattr(conn.connection.driver_connection, 'total_changes', None)
+
+    def end_run(self) -> None:
+        """Drop the tables created by the queries of a script and forget the
+        uploads if a query modified data, so that the next run of the script
+        starts clean"""
+        if not self.persist:
+            return
+        if self._modified:
+            self.table_fingerprints.clear()
+            self._modified = False
+        with self.conn as conn:
+            for table_name in inspect(conn).get_table_names():
+                if table_name not in self.loaded_tables:
+                    conn.exec_driver_sql(f'DROP TABLE IF EXISTS "{table_name}"')
+
+    def close(self) -> None:
+        """Close the persistent connection"""
+        if self.persist:
+            self._conn.close()
+        self.engine.dispose()
+        self.loaded_tables.clear()
+        self.table_fingerprints.clear()
+        self.table_columns.clear()
+        self.table_filters.clear()
+        self.table_indexes.clear()
+        self.table_rows.clear()
+
     @staticmethod
     def uniquify(df_columns) -> list[str]:
         """Make a list of columns unique"""
@@ -101,13 +715,18 @@ class PandaSQL(pSQL):
         return result
 
 
+PandasSQLQuery_psql = PandaSQL(persist=True, fingerprint=frame_fingerprint)
+
+
 # ================================ SYSTEM FUNCTIONS ===============================
 def connect_genericdb(connection_url):
     """Connect to a generic database according to the connection url"""
     engine = create_engine(connection_url)
     return engine
 
-def queryDatabase(conn, sql, has_result, param_dict={}, **kwargs):
+def queryDatabase(conn, sql, has_result, param_dict={}, yield_per=0, dtype_backend=None,
+                  optimize=False, dtype_overrides={}, param_rows=None, batch_size=1000,
+                  **kwargs):
     # tranform parameters
     parameters = {}
     for k, v in kwargs.items():
@@ -118,35 +737,108 @@ def queryDatabase(conn, sql, has_result, param_dict={}, **kwargs):
             parameters[k] = v
 
     # query
-    sqlstatements = [s
-                     for s in sql.split(';\n')
-                     if not re.search(r"^[;\s]*$", s)]
+    script = parse_sql_script(sql)
+    read_options = {} if dtype_backend is None else {'dtype_backend': dtype_backend}
     table = None
 
-    with conn.begin() as active_conn:
-        for i, sqlstatement in enumerate(sqlstatements):
-            if has_result and i==len(sqlstatements)-1: # only last statement can have result
-                table = pd.read_sql_query(text(sqlstatement),
+    # a session (Connection) is already in a transaction
+    with (nullcontext(conn) if isinstance(conn, Connection) else conn.begin()) as active_conn:
+        for i, statement in enumerate(script.clauses):
+            statement_params = {k: v for k, v in parameters.items()
+                                if k in script.bind_names[i]}
+            row_columns = [] if param_rows is None else \
+                          [c for c in param_rows.columns if c in script.bind_names[i]]
+            if row_columns: # run once per parameter row (executemany) batch by batch
+                step = batch_size if batch_size>0 else max(len(param_rows), 1)
+                for start in range(0, len(param_rows), step):
+                    batch = param_rows[row_columns].iloc[start:start+step]
+                    batch = batch.astype(object).where(batch.notna(), None)
+                    active_conn.execute(statement, [{**statement_params, **row}
+                                                    for row in batch.to_dict('records')])
+            elif has_result and i==len(script.clauses)-1: # only last statement can have result
+                if yield_per>0: # use a server-side cursor
+                    statement = statement.execution_options(stream_results=True,
+                                                            yield_per=yield_per)
+                table = pd.read_sql_query(statement,
                                             active_conn,
-                                            params=parameters)
+                                            params=statement_params,
+                                            **read_options)
+            else:
+                active_conn.execute(statement, statement_params)
+
+    # shrink the result
+    memory_before = memory_after = 0
+    if optimize and table is not None:
+        memory_before = frame_memory(table)
+        table = optimize_dtypes(table, dtype_overrides)
+        memory_after = frame_memory(table)
+
+    return table, memory_before, memory_after
+
+def queryDatabaseChunks(conn, sql, chunksize, param_dict={}, yield_per=0, dtype_backend=None,
+                        optimize=False, dtype_overrides={}, param_rows=None, batch_size=1000,
+                        **kwargs):
+    # tranform parameters
+    parameters = {}
+    for k, v in kwargs.items():
+        if not k in parameters:
+            parameters[k] = v
+    for k, v in param_dict.items():
+        if not k in parameters:
+            parameters[k] = v
+
+    # query (the result of the last statement is yielded chunk by chunk)
+    script = parse_sql_script(sql)
+    read_options = {} if dtype_backend is None else {'dtype_backend': dtype_backend}
+
+    # a session (Connection) is already in a transaction
+    with (nullcontext(conn) if isinstance(conn, Connection) else conn.begin()) as active_conn:
+        for i, statement in enumerate(script.clauses):
+            statement_params = {k: v for k, v in parameters.items()
+                                if k in script.bind_names[i]}
+            row_columns = [] if param_rows is None else \
+                          [c for c in param_rows.columns if c in script.bind_names[i]]
+            if row_columns: # run once per parameter row (executemany) batch by batch
+                step = batch_size if batch_size>0 else max(len(param_rows), 1)
+                for start in range(0, len(param_rows), step):
+                    batch = param_rows[row_columns].iloc[start:start+step]
+                    batch = batch.astype(object).where(batch.notna(), None)
+                    active_conn.execute(statement, [{**statement_params, **row}
+                                                    for row in batch.to_dict('records')])
+            elif i==len(script.clauses)-1:
+                if yield_per>0: # use a server-side cursor
+                    statement = statement.execution_options(stream_results=True,
+                                                            yield_per=yield_per)
+                for chunk in pd.read_sql_query(statement,
+                                               active_conn,
+                                               params=statement_params,
+                                               chunksize=chunksize,
+                                               **read_options):
+                    if optimize:
+                        memory_before = frame_memory(chunk)
+                        chunk = optimize_dtypes(chunk, dtype_overrides)
+                        yield chunk, memory_before, frame_memory(chunk)
+                    else:
+                        yield chunk, 0, 0
             else:
-                active_conn.execute(text(sqlstatement), parameters)
-    
-    return table
+                active_conn.execute(statement, statement_params)
 
-def queryPandas(sql, tables, params):
-    psql = PandaSQL(persist=True)
+def queryPandas(sql, tables, params, dtype_backend=None, psql=None):
+    if psql is None:
+        psql = PandaSQL(persist=True, fingerprint=frame_fingerprint)
 
-    sqlstatements = [s
-                        for s in sql.split(';\n')
-                        if not re.search(r"^[;\s]*$", s)]
+    sqlstatements = parse_sql_script(sql).statements
     results = []
 
-    for sqlstatement in sqlstatements:
-        res = psql(sqlstatement, tables, params=params)  # type: ignore
-        if res is not None:
-            res.columns = psql.uniquify(res.columns)
-            results.append(res)
+    try:
+        for sqlstatement in sqlstatements:
+            res = psql(sqlstatement, tables, params=params,  # type: ignore
+                       dtype_backend=dtype_backend)
+            if res is not None:
+                res.columns = psql.uniquify(res.columns)
+                results.append(res)
+    finally:
+        psql.end_run()
 
     if len(results)==0:
         return None
@@ -165,11 +857,12 @@ def queryPandas(sql, tables, params):
 
 # ------- GenericDBConn_inExec -------
 GenericDBConn_out = connect_genericdb('sqlite:///tests/temp/db.sdb')
-SQLQuery_result = queryDatabase(GenericDBConn_out, """select 1 as id, 'aaa' as name
-                                                      union all
-                                                      select 2 as id, 'bbb' as name""", True)
+SQLQuery_result, SQLQuery_memory_before, SQLQuery_memory_after = queryDatabase(GenericDBConn_out, """select 1 as id, 'aaa' as name
+                                                                                                     union all
+                                                                                                     select 2 as id, 'bbb' as name""", True)
 PandasSQLQuery_result = queryPandas("""select count(*) from tableA""",
                                     tables={'tableA': SQLQuery_result,
                                             },
-                                    params={})
+                                    params={},
+                                    psql=PandasSQLQuery_psql)
 print(PandasSQLQuery_result)
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+"""This file was auto-generated by PyFlow exporter
+    'Python exporter v1.0.0'
+    Created: 10:12AM on October 18, 2026
+"""
+
+EXPORTER_NAME = 'Python exporter'
+EXPORTER_VERSION = '1.0.0'
+
+
+# ======================== VARIABLES AND PARAMETERS SETUP =========================
+VARS = {}
+
+
+# ================================ PACKAGE IMPORTS ================================
+# pylint: disable=wrong-import-position
+from sqlalchemy import (create_engine)
+# pylint: enable=wrong-import-position
+
+# ================================= PACKAGE SETUPS ================================
+
+
+# ================================ SYSTEM FUNCTIONS ===============================
+def connect_genericdb(connection_url):
+    """Connect to a generic database according to the connection url"""
+    engine = create_engine(connection_url)
+    return engine
+
+
+
+# ============================== GRAPH IMPLEMENTATION =============================
+
+
+# ================================== MAIN PROGRAM =================================
+
+
+# ------- GenericDBConn_inExec -------
+GenericDBConn_out = connect_genericdb('sqlite:///tests/temp/db.sdb')
+# ClearQueryCache: the script has no result cache
+CancelQueries_out = 0  # the script runs no queries in the background
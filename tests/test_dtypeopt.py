@@ -0,0 +1,45 @@
+"""Tests for the post-fetch dtype optimization"""
+import pandas as pd
+
+from dtypeopt import frame_memory, optimize_dtypes  # pylint: disable=import-error
+
+
+def test_repeated_strings_become_categories():
+    df = pd.DataFrame({'status': ['open', 'closed'] * 50,
+                       'name': [f'n{i}' for i in range(100)]})
+    opt = optimize_dtypes(df)
+    assert isinstance(opt['status'].dtype, pd.CategoricalDtype)
+    assert not isinstance(opt['name'].dtype, pd.CategoricalDtype)
+    assert frame_memory(opt) < frame_memory(df)
+    pd.testing.assert_frame_equal(opt.astype({'status': df['status'].dtype}), df)
+
+
+def test_numerics_downcast_safely():
+    df = pd.DataFrame({'small': [0, 1, 200],
+                       'signed': [-5, 0, 1000],
+                       'big': [0, 1, 2**40],
+                       'half': [0.5, 1.25, None],
+                       'precise': [0.1, 0.2, 0.3]})
+    opt = optimize_dtypes(df)
+    assert opt['small'].dtype=='int16'
+    assert opt['signed'].dtype=='int16'
+    assert opt['big'].dtype=='int64'
+    assert opt['half'].dtype=='float32'
+    assert opt['precise'].dtype=='float64'
+    assert (opt['big']==df['big']).all()
+
+
+def test_downcast_integers_do_not_wrap():
+    opt = optimize_dtypes(pd.DataFrame({'a': [0, 3, 200]}))
+    assert opt['a'].dtype=='int16'
+    assert (opt['a']-5).tolist() == [-5, -2, 195]
+
+
+def test_overrides():
+    df = pd.DataFrame({'a': [1, 2, 3], 'b': ['x', 'x', 'x'], 'c': [1, 1, 1]})
+    opt = optimize_dtypes(df, {'a': 'float64', 'b': 'keep'})
+    assert opt['a'].dtype=='float64'
+    assert opt['b'].dtype==df['b'].dtype
+    assert opt['c'].dtype=='int8'
+    # the input frame is left untouched
+    assert df['c'].dtype=='int64'
@@ -0,0 +1,49 @@
+"""Tests for the DuckDB execution backend"""
+import pandas as pd
+import pytest
+
+pytest.importorskip('duckdb')
+
+from duckdbsql import DuckDBSQL  # pylint: disable=import-error,wrong-import-position
+
+
+def test_query_dataframes_with_parameters():
+    psql = DuckDBSQL()
+    df = pd.DataFrame({'a': [1, 2, 3], 'b': ['x', 'y', 'z']})
+    result = psql("select b, a::varchar as s from t where a >= :low", {'t': df},
+                  params={'low': 2, 'unused': 0})
+    assert result.values.tolist() == [['y', '2'], ['z', '3']]
+    assert psql("create table c as select * from t", {'t': df}) is None
+    assert psql("select count(*) as n from c", {})['n'][0] == 3
+    psql.close()
+
+
+def test_end_run_drops_script_tables():
+    psql = DuckDBSQL()
+    df = pd.DataFrame({'a': [1, 2]})
+    psql("create table c as select * from t", {'t': df})
+    psql.end_run()
+    assert psql.conn.execute("select count(*) from duckdb_tables()").fetchone()[0] == 0
+    assert psql.conn.execute("select count(*) from duckdb_views() "
+                             "where not internal").fetchone()[0] == 0
+    # the next run sees the new data of the same name
+    assert psql("select max(a) as m from t", {'t': pd.DataFrame({'a': [7]})})['m'][0] == 7
+    psql.close()
+
+
+def test_arrow_dtypes():
+    psql = DuckDBSQL()
+    result = psql("select a, 'x' as s from t", {'t': pd.DataFrame({'a': [1]})},
+                  dtype_backend='pyarrow')
+    assert all(isinstance(dtype, pd.ArrowDtype) for dtype in result.dtypes)
+    assert psql.uniquify(['a', 'a', 'b']) == ['a', 'a_2', 'b']
+    psql.close()
+
+
+def test_colons_in_strings_comments_and_casts_are_not_parameters():
+    psql = DuckDBSQL()
+    result = psql("select '12:30 :x' as t, \"a:b\" as q, e'x\\':y' as e, $$:z$$ as d, "
+                  ":x::varchar as x  -- :y\n"
+                  "from (select 1 as \"a:b\") /* :z */", {}, params={'x': 1})
+    assert result.values.tolist() == [['12:30 :x', 1, "x':y", ':z', '1']]
+    psql.close()
@@ -0,0 +1,45 @@
+"""Tests for the engine registry"""
+import logging
+
+import sqlalchemy as sa
+
+from engines import dispose_all, get_engine, prewarm  # pylint: disable=import-error
+
+
+def test_engines_are_reused_per_url_and_options(tmp_path):
+    url = f"sqlite:///{tmp_path / 'db.sqlite'}"
+    engine = get_engine(url, pool_size=2, pool_pre_ping=True)
+    assert get_engine(url, pool_pre_ping=True, pool_size=2) is engine
+    assert get_engine(sa.make_url(url), pool_size=2, pool_pre_ping=True) is engine
+    assert get_engine(url, pool_size=3, pool_pre_ping=True) is not engine
+    assert engine.pool.size() == 2
+    assert dispose_all() == 2
+    assert get_engine(url, pool_size=2, pool_pre_ping=True) is not engine
+    dispose_all()
+
+
+def test_pool_sizing_is_dropped_where_not_supported():
+    engine = get_engine('sqlite://', pool_size=5, max_overflow=10, pool_recycle=60)
+    with engine.connect() as conn:
+        assert conn.execute(sa.text('select 1')).scalar() == 1
+    dispose_all()
+
+
+def test_prewarm_fills_the_pool(tmp_path):
+    url = f"sqlite:///{tmp_path / 'db.sqlite'}"
+    engine = get_engine(url, prewarm_connections=0, pool_size=2)
+    assert engine.pool.checkedin() == 0
+    prewarm(engine, 5).join()
+    assert engine.pool.checkedin() == 2
+    assert prewarm(get_engine('sqlite://'), 2) is None
+    dispose_all()
+
+
+def test_prewarm_failures_are_logged(tmp_path, caplog):
+    url = f"sqlite:///{tmp_path / 'missing' / 'db.sqlite'}"
+    engine = get_engine(url, prewarm_connections=0)
+    with caplog.at_level(logging.WARNING, logger='PyFlow.DataNodes'):
+        prewarm(engine, 1).join()
+    assert 'Pre-warming' in caplog.text
+    assert engine.pool.checkedin() == 0
+    dispose_all()
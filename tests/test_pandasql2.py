@@ -0,0 +1,159 @@
+"""Tests for the persistent PandaSQL instance"""
+import pandas as pd
+import pytest
+
+import pandasql2  # pylint: disable=import-error
+from querycache import frame_fingerprint  # pylint: disable=import-error
+
+
+def _count_uploads(monkeypatch):
+    uploads = []
+    write_table = pandasql2.write_table
+    def counting_write_table(df, tablename, conn):
+        uploads.append(tablename)
+        write_table(df, tablename, conn)
+    monkeypatch.setattr(pandasql2, 'write_table', counting_write_table)
+    return uploads
+
+
+def test_unchanged_tables_are_not_uploaded_again(monkeypatch):
+    uploads = _count_uploads(monkeypatch)
+    psql = pandasql2.PandaSQL(persist=True, fingerprint=frame_fingerprint)
+    df = pd.DataFrame({'a': [1, 2, 3]})
+    for _ in range(3):
+        assert psql('select sum(a) as s from t', {'t': df})['s'][0] == 6
+        psql.end_run()
+    assert uploads == ['t']
+    df2 = pd.DataFrame({'a': [1, 2, 4]})
+    assert psql('select sum(a) as s from t', {'t': df2})['s'][0] == 7
+    assert uploads == ['t', 't']
+    psql.close()
+
+
+def test_tables_are_uploaded_every_run_without_a_fingerprint(monkeypatch):
+    uploads = _count_uploads(monkeypatch)
+    psql = pandasql2.PandaSQL(persist=True)
+    df = pd.DataFrame({'a': [1, 2, 3]})
+    for _ in range(2):
+        assert psql('select sum(a) as s from t', {'t': df})['s'][0] == 6
+        psql.end_run()
+    assert uploads == ['t', 't']
+    psql.close()
+
+
+def test_modified_and_scratch_tables_are_reset_between_runs(monkeypatch):
+    uploads = _count_uploads(monkeypatch)
+    psql = pandasql2.PandaSQL(persist=True, fingerprint=frame_fingerprint)
+    df = pd.DataFrame({'a': [1, 2, 3]})
+    for _ in range(2):
+        psql('create table scratch as select a from t where a>1', {'t': df})
+        psql('delete from t where a=1', {'t': df})
+        assert psql('select count(*) as n from scratch join t using (a)', {'t': df})['n'][0] == 2
+        psql.end_run()
+    # the deleted row is restored by uploading the table again
+    assert uploads == ['t', 't']
+    psql.close()
+
+
+def test_referenced_columns():
+    columns = pd.Index(['a', 'b', 'My Col', 'date'])
+    assert pandasql2.referenced_columns('select a, "my col" from t', columns) == ['a', 'My Col']
+    assert pandasql2.referenced_columns('select [date], a*2 from t -- b', columns) == ['a', 'date']
+    assert pandasql2.referenced_columns("select replace(b, 'x', 'y') from t", columns) == ['b']
+    assert pandasql2.referenced_columns('select count(*) from t', columns) == ['a']
+    for query in ['select * from t', 'select t.* from t', 'update t set a=1',
+                  'select a from t natural join u']:
+        assert pandasql2.referenced_columns(query, columns) is None
+
+
+def test_only_referenced_columns_are_loaded(monkeypatch):
+    uploads = []
+    write_table = pandasql2.write_table
+    def recording_write_table(df, tablename, conn):
+        uploads.append(list(df.columns))
+        write_table(df, tablename, conn)
+    monkeypatch.setattr(pandasql2, 'write_table', recording_write_table)
+    psql = pandasql2.PandaSQL(persist=True, fingerprint=frame_fingerprint)
+    df = pd.DataFrame({'a': [1, 2], 'b': [3, 4], 'wide': ['x'*100, 'y'*100]})
+    assert psql('select sum(a) as s from t', {'t': df})['s'][0] == 3
+    assert psql.bytes_saved['t'] > 200
+    assert psql('select sum(a) as s from t where a>1', {'t': df})['s'][0] == 2
+    assert psql('select sum(b) as s from t', {'t': df})['s'][0] == 7
+    assert psql('select * from t', {'t': df}).shape == (2, 3)
+    psql.end_run()
+    assert uploads == [['a'], ['a', 'b'], ['a', 'b', 'wide']]
+    assert psql.bytes_saved['t'] == 0
+    psql.close()
+
+
+def test_pushdown_predicates():
+    assert pandasql2.pushdown_predicates(
+        "select a from big b where region = :r and 5 < b.x and y in ('a', 'b') "
+        "and z between 1 and -3 and w is not null and f(a) = 1 order by a", 'big') == [
+            ('region', '==', (('param', ':r'),)),
+            ('x', '>', (('number', '5'),)),
+            ('y', 'in', (('string', "'a'"), ('string', "'b'"))),
+            ('z', 'between', (('number', '1'), ('number', '-3'))),
+            ('w', 'is not null', ())]
+    for query in ['select a from big where a=1 or b=2',
+                  'select a from big join c on big.a=c.a where a=1',
+                  'select a from big where a in (select a from c)',
+                  'select a from big where case when a=1 and b=2 then 1 end']:
+        assert pandasql2.pushdown_predicates(query, 'big') == []
+
+
+def test_predicate_mask_skips_values_of_another_type():
+    df = pd.DataFrame({'region': ['n', 's', None, 'n'], 'x': [1, 7, 9, None]})
+    predicates = pandasql2.pushdown_predicates(
+        'select * from big where region = :r and x >= :v', 'big')
+    applied, mask = pandasql2.predicate_mask(df, predicates, {'r': 'n', 'v': '7'})
+    # SQLite compares the text '7' with the numbers, pandas would not
+    assert applied == (('region', '==', ('n',)),)
+    assert mask.tolist() == [True, False, False, True]
+
+
+def test_filtered_rows_are_loaded(monkeypatch):
+    uploads = []
+    write_table = pandasql2.write_table
+    def recording_write_table(df, tablename, conn):
+        uploads.append(len(df))
+        write_table(df, tablename, conn)
+    monkeypatch.setattr(pandasql2, 'write_table', recording_write_table)
+    psql = pandasql2.PandaSQL(persist=True, fingerprint=frame_fingerprint)
+    df = pd.DataFrame({'region': ['n', 's'] * 50, 'v': range(100)})
+    query = 'select count(*) as n from big where region = :r'
+    for _ in range(2):
+        assert psql(query, {'big': df}, params={'r': 'n'})['n'][0] == 50
+        psql.end_run()
+    assert psql(query, {'big': df}, params={'r': 's'})['n'][0] == 50
+    assert psql('select count(*) as n from big', {'big': df})['n'][0] == 100
+    assert psql(query, {'big': df}, params={'r': 'n'})['n'][0] == 50
+    psql.end_run()
+    assert uploads == [50, 50, 100]
+    psql.close()
+
+
+def test_index_columns():
+    assert pandasql2.index_columns(
+        "select * from orders o join customers as c on o.cust = c.id "
+        "where c.region = :r and o.total + o.tax = 3 and state in ('a', 'b')") == {
+            'orders': {'cust'}, 'customers': {'id', 'region'}, '': {'state'}}
+    assert pandasql2.index_columns("select * from a join b using (k1, k2)") == {'': {'k1', 'k2'}}
+    assert pandasql2.parse_indexes('tableA(id), tableA(region, day), "Table B"(id)') == {
+        'tablea': [('id',), ('region', 'day')], 'table b': [('id',)]}
+    with pytest.raises(ValueError):
+        pandasql2.parse_indexes('tableA id')
+
+
+def test_join_and_declared_indexes_are_created():
+    psql = pandasql2.PandaSQL(persist=True, fingerprint=frame_fingerprint,
+                              indexes={'small': [('v', 'id')]}, auto_index_min_rows=100)
+    big = pd.DataFrame({'id': range(200), 'v': range(200)})
+    small = pd.DataFrame({'id': range(10), 'v': range(10)})
+    query = 'select count(*) as n from big b join small s on b.id = s.id where b.v = :v'
+    assert psql(query, {'big': big, 'small': small}, params={'v': 3})['n'][0] == 1
+    with psql.conn as conn:
+        indexes = conn.exec_driver_sql(
+            "select tbl_name, name from sqlite_master where type='index' order by name").fetchall()
+    assert indexes == [('big', 'ix_big_id'), ('big', 'ix_big_v'), ('small', 'ix_small_v_id')]
+    psql.close()
@@ -0,0 +1,90 @@
+"""Tests for the query result caches"""
+import os
+import time
+import pandas as pd
+
+from querycache import QueryCache, DiskQueryCache, make_key  # pylint: disable=import-error
+
+
+def test_key_normalization():
+    """Whitespace differences and parameter order do not change the key"""
+    key1 = make_key('sqlite://', "select *\n  from tableA where id=:id",
+                    {'id': 1, 'name': 'aaa'})
+    key2 = make_key('sqlite://', "select * from tableA   where id=:id",
+                    {'name': 'aaa', 'id': 1})
+    key3 = make_key('sqlite://', "select * from tableA where id=:id",
+                    {'id': 2, 'name': 'aaa'})
+    assert key1 == key2
+    assert key1 != key3
+
+
+def test_hit_miss_ttl():
+    """Entries are returned until their ttl passes"""
+    cache = QueryCache()
+    df = pd.DataFrame([[1, 'aaa']], columns=['id', 'name'])
+    assert cache.get('a') is None
+    cache.put('a', df, 0.2)
+    assert cache.get('a').equals(df)
+    time.sleep(0.3)
+    assert cache.get('a') is None
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 2
+    assert cache.stats()['evictions'] == 1
+
+
+def test_byte_budget():
+    """The least recently used entries are evicted to stay in budget"""
+    df = pd.DataFrame({'id': range(100)})
+    size = int(df.memory_usage(deep=True).sum())
+    cache = QueryCache(max_bytes=2*size)
+    cache.put('a', df, 60)
+    cache.put('b', df, 60)
+    cache.get('a')
+    cache.put('c', df, 60)
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.get('c') is not None
+    assert cache.stats()['bytes'] == 2*size
+    assert cache.stats()['evictions'] == 1
+
+
+def test_disk_cache(tmp_path):
+    """Results are persisted as parquet files and evicted by size"""
+    df = pd.DataFrame([[1, 'aaa'], [2, 'bbb']], columns=['id', 'name'])
+    cache = DiskQueryCache(str(tmp_path))
+    assert cache.get('a') is None
+    cache.put('a', df)
+    assert DiskQueryCache(str(tmp_path)).get('a').equals(df)
+    cache.invalidate('a')
+    assert cache.get('a') is None
+
+    cache.put('a', df)
+    os.utime(os.path.join(str(tmp_path), 'a.parquet'), (0, 0))
+    cache.max_bytes = cache.stats()['bytes']
+    cache.put('b', df)
+    assert cache.get('a') is None
+    assert cache.get('b') is not None
+    assert cache.stats()['evictions'] == 1
+
+
+def test_disk_cache_parts(tmp_path):
+    """Appended rows are written as their own part files and evicted as one entry"""
+    df = pd.DataFrame({'id': [1, 2], 'name': ['aaa', 'bbb']})
+    cache = DiskQueryCache(str(tmp_path))
+    assert cache.get_parts('a') is None
+    assert not cache.append('a', df)
+    assert cache.append('a', df, new=True)
+    assert cache.append('a', df.iloc[:0])
+    assert cache.append('a', df.assign(id=[3, 4]))
+    parts = os.path.join(str(tmp_path), 'a.parts')
+    assert sorted(os.listdir(parts)) == ['00000000.parquet', '00000001.parquet']
+    assert DiskQueryCache(str(tmp_path)).get_parts('a')['id'].tolist() == [1, 2, 3, 4]
+    assert cache.append('a', df, new=True)
+    assert cache.get_parts('a')['id'].tolist() == [1, 2]
+
+    os.utime(parts, (0, 0))
+    cache.max_bytes = cache.stats()['bytes']
+    cache.put('b', df)
+    assert cache.get_parts('a') is None
+    assert not cache.append('a', df)
+    assert cache.stats()['evictions'] == 1
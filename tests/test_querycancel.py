@@ -0,0 +1,46 @@
+"""Tests for query timeouts and cancellation"""
+import threading
+import time
+
+import pytest
+import sqlalchemy as sa
+
+from querycancel import QueryCanceledError, QueryCanceller, cancel_all  # pylint: disable=import-error
+
+
+RUNAWAY = """with recursive r(i) as (select 1 union all select i+1 from r)
+             select count(*) from r"""
+
+
+def test_timeout_interrupts_and_rolls_back():
+    engine = sa.create_engine('sqlite://', poolclass=sa.pool.StaticPool)
+    with engine.begin() as conn:
+        conn.execute(sa.text('create table t (a int)'))
+    canceller = QueryCanceller(timeout=0.2)
+    started = time.perf_counter()
+    with pytest.raises(QueryCanceledError, match='timed out'):
+        with engine.begin() as conn, canceller.attached(conn):
+            conn.execute(sa.text('insert into t values (1)'))
+            conn.execute(sa.text(RUNAWAY))
+    assert time.perf_counter() - started < 5
+    with engine.connect() as conn:
+        assert conn.execute(sa.text('select count(*) from t')).scalar() == 0
+
+
+def test_cancel_from_another_thread():
+    engine = sa.create_engine('sqlite://')
+    canceller = QueryCanceller()
+    threading.Timer(0.2, cancel_all).start()
+    with pytest.raises(QueryCanceledError, match='canceled'):
+        with engine.connect() as conn, canceller.attached(conn):
+            conn.execute(sa.text(RUNAWAY))
+    # a canceled canceller refuses to run further statements
+    with pytest.raises(QueryCanceledError):
+        canceller.check()
+
+
+def test_no_timeout_leaves_errors_alone():
+    engine = sa.create_engine('sqlite://')
+    with pytest.raises(sa.exc.OperationalError):
+        with engine.connect() as conn, QueryCanceller().attached(conn):
+            conn.execute(sa.text('select * from nosuch'))
@@ -0,0 +1,38 @@
+"""Tests for the shared database sessions"""
+import sqlalchemy as sa
+
+from sessions import commit_session, is_session, open_session, rollback_session, transaction  # pylint: disable=import-error
+
+
+def test_session_shares_temp_tables_and_commits(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+    session = open_session(engine)
+    with transaction(session) as conn:
+        conn.execute(sa.text('create temp table staging (a int)'))
+        conn.execute(sa.text('insert into staging values (1), (2)'))
+    # the temp table is still there for the next node
+    with transaction(session) as conn:
+        conn.execute(sa.text('create table target as select * from staging'))
+    commit_session(session)
+    assert session.closed
+    with engine.connect() as conn:
+        assert conn.execute(sa.text('select count(*) from target')).scalar() == 2
+
+
+def test_rollback_session(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+    with transaction(engine) as conn:
+        conn.execute(sa.text('create table t (a int)'))
+    session = open_session(engine)
+    with transaction(session) as conn:
+        conn.execute(sa.text('insert into t values (1)'))
+    rollback_session(session)
+    with engine.connect() as conn:
+        assert conn.execute(sa.text('select count(*) from t')).scalar() == 0
+
+
+def test_is_session(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+    session = open_session(engine)
+    assert is_session(session) and not is_session(engine)
+    rollback_session(session)
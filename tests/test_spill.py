@@ -0,0 +1,84 @@
+"""Tests for spilling large results to memory-mapped Arrow files"""
+import os
+
+import pandas as pd
+
+from spill import collect, remove_spilled, spill_path, unmarked  # pylint: disable=import-error
+
+
+def _chunks(n, size):
+    for i in range(n):
+        yield pd.DataFrame({'id': range(i*size, (i+1)*size),
+                            'name': [f'row{j}' for j in range(i*size, (i+1)*size)]})
+
+
+def test_small_result_stays_in_memory(tmp_path):
+    df = collect(_chunks(3, 10), threshold_bytes=10**9, directory=str(tmp_path))
+    assert spill_path(df) is None
+    assert list(df['id']) == list(range(30))
+    assert os.listdir(tmp_path) == []
+
+
+def test_large_result_is_spilled(tmp_path):
+    df = collect(_chunks(5, 100), threshold_bytes=1000, directory=str(tmp_path),
+                 arrow_dtypes=True)
+    path = spill_path(df)
+    assert path is not None and os.path.dirname(path) == str(tmp_path)
+    assert isinstance(df['id'].dtype, pd.ArrowDtype)
+    assert list(df['id']) == list(range(500))
+    assert df['name'].iloc[-1] == 'row499'
+    assert spill_path(unmarked(df)) is None and spill_path(df) == path
+    del df
+    remove_spilled(path)
+    assert not os.path.exists(path)
+
+
+def test_spilled_result_has_in_memory_dtypes(tmp_path):
+    def chunks():
+        for i in range(5):
+            yield pd.DataFrame({'id': range(i*100, (i+1)*100),
+                                'price': [1.5 if j%3 else None for j in range(100)],
+                                'name': [f'row{j}' for j in range(100)],
+                                'day': pd.Timestamp('2024-01-01')})
+    in_memory = collect(chunks(), threshold_bytes=10**9, directory=str(tmp_path))
+    spilled = collect(chunks(), threshold_bytes=1000, directory=str(tmp_path))
+    assert spill_path(in_memory) is None and spill_path(spilled) is None
+    assert spilled.dtypes.to_dict() == in_memory.dtypes.to_dict()
+    pd.testing.assert_frame_equal(spilled, in_memory)
+    assert os.listdir(tmp_path) == []
+
+
+def test_failed_fetch_removes_partial_file(tmp_path):
+    def failing():
+        yield from _chunks(3, 100)
+        raise RuntimeError('connection lost')
+    try:
+        collect(failing(), threshold_bytes=1000, directory=str(tmp_path))
+    except RuntimeError:
+        pass
+    assert os.listdir(tmp_path) == []
+
+
+def test_null_first_column_is_promoted(tmp_path):
+    def chunks():
+        yield pd.DataFrame({'id': range(100), 'note': [None]*100})
+        yield pd.DataFrame({'id': range(100, 200), 'note': ['text']*100})
+        yield pd.DataFrame({'id': [200.5], 'note': [None]})
+    df = collect(chunks(), threshold_bytes=1000, directory=str(tmp_path), arrow_dtypes=True)
+    assert spill_path(df) is not None
+    assert df['note'].isna().sum() == 101 and df['note'].iloc[150] == 'text'
+    assert df['id'].iloc[-1] == 200.5 and len(df) == 201
+    assert os.listdir(tmp_path) == [os.path.basename(spill_path(df))]
+    path = spill_path(df)
+    del df
+    remove_spilled(path)
+
+
+def test_incompatible_chunk_falls_back_to_memory(tmp_path):
+    def chunks():
+        yield pd.DataFrame({'code': [1.5]*100})
+        yield pd.DataFrame({'code': ['A1']*100})
+    df = collect(chunks(), threshold_bytes=100, directory=str(tmp_path))
+    assert spill_path(df) is None
+    assert df['code'].tolist() == [1.5]*100 + ['A1']*100
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,54 @@
+"""Tests for the SQL script parser"""
+from sqlscript import is_read_only, parse_sql_script  # pylint: disable=import-error
+
+
+def test_split_statements():
+    """Semicolons in literals, identifiers and comments do not split"""
+    script = parse_sql_script("select 'a;b' as x -- c;\n"
+                              "/* d; */ from tableA;\n"
+                              "select \"x;y\", [a;b] from tableB where id=:theid; select 1;\n"
+                              "-- trailing comment;\n"
+                              "  ;")
+    assert script.statements == ("select 'a;b' as x -- c;\n/* d; */ from tableA",
+                                 "select \"x;y\", [a;b] from tableB where id=:theid",
+                                 "select 1")
+    assert script.bind_names == (frozenset(), frozenset({'theid'}), frozenset())
+    assert len(script.clauses) == 3
+
+
+def test_memoized():
+    """The same script is parsed only once"""
+    sql = "drop table if exists tableA;\ncreate table tableA as\nselect 1 as id;"
+    assert parse_sql_script(sql) is parse_sql_script(sql)
+    assert len(parse_sql_script(sql).statements) == 2
+
+
+def test_dollar_quoted_bodies_do_not_split():
+    """PostgreSQL dollar quoting, with and without a tag"""
+    script = parse_sql_script("select $$a;b$$; select $f$x;$$;$f$ as y;")
+    assert script.statements == ("select $$a;b$$", "select $f$x;$$;$f$ as y")
+
+
+def test_trigger_bodies_do_not_split():
+    """The statements between BEGIN and END of a trigger (CASE ... END too)"""
+    script = parse_sql_script(
+        "create trigger t after insert on a begin update b set x=1; update c set y=2; end;\n"
+        "create temp trigger u after delete on a begin\n"
+        "  update b set x=case when old.id>0 then 1 end;\nend;\n"
+        "begin; select 1;")
+    assert script.statements == (
+        "create trigger t after insert on a begin update b set x=1; update c set y=2; end",
+        "create temp trigger u after delete on a begin\n"
+        "  update b set x=case when old.id>0 then 1 end;\nend",
+        "begin",
+        "select 1")
+
+
+def test_read_only_statements():
+    """Only statements which read can be skipped by a cached result"""
+    script = parse_sql_script("insert into a values (1); update a set x=2;\n"
+                              "select * into b from a; -- delete\n"
+                              "with c as (select 'delete' as d) select * from c;\n"
+                              "select * from a")
+    assert [is_read_only(statement) for statement in script.statements] == \
+           [False, False, False, True, True]
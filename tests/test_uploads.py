@@ -0,0 +1,172 @@
+"""Tests for the upload options and the bulk load strategies"""
+import os
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+import sqlalchemy as sa
+
+import uploads  # pylint: disable=import-error
+from uploads import (MSSQL_MAX_PARAMS, BulkLoader, auto_strategy,  # pylint: disable=import-error
+                     copy_rows, merge_statement, split_keys, text_lengths, to_sql_options,
+                     upload_frames)
+
+
+def _conn(name, fast_executemany=None):
+    dialect = SimpleNamespace(name=name)
+    if fast_executemany is not None:
+        dialect.fast_executemany = fast_executemany
+    return SimpleNamespace(dialect=dialect)
+
+
+def test_fast_executemany_uses_plain_executemany():
+    df = pd.DataFrame({'a': [1, 2], 'b': ['x', 'y']})
+    assert to_sql_options(_conn('mssql', True), df, False) == {'method': None, 'chunksize': 10000}
+    assert to_sql_options(_conn('mssql', True), df, False, 0) == {'method': None, 'chunksize': None}
+
+
+def test_mssql_multi_insert_stays_within_parameter_limit():
+    df = pd.DataFrame({f"c{i}": range(3) for i in range(7)})
+    options = to_sql_options(_conn('mssql', False), df, True, 0)
+    assert options['method'] == 'multi'
+    assert options['chunksize'] * 8 < MSSQL_MAX_PARAMS
+    assert to_sql_options(_conn('mssql', False), df, True, 10)['chunksize'] == 10
+
+
+def test_mssql_text_columns_are_sized(monkeypatch):
+    df = pd.DataFrame({'code': ['a', 'bcd', None], 'note': ['x'*5000, 'y', 'z'],
+                       'n': [1, 2, 3], 'f': [0.5, 1.0, 2.0]})
+    assert text_lengths(df) == {'code': 4, 'note': None}
+    executed = []
+    conn = SimpleNamespace(dialect=SimpleNamespace(
+                               name='mssql',
+                               identifier_preparer=SimpleNamespace(quote=lambda n: f"[{n}]")),
+                           exec_driver_sql=executed.append)
+    loader = BulkLoader(conn, 't', False, 0)
+    types = loader.column_types(df, 'replace')
+    assert {c: (type(t).__name__, t.length) for c, t in types.items()} == \
+           {'code': ('NVARCHAR', 4), 'note': ('NVARCHAR', None)}
+    # a later frame of the upload with longer texts widens the created column
+    monkeypatch.setattr(uploads, 'inspect',
+                        lambda conn: SimpleNamespace(has_table=lambda name: True))
+    types = loader.column_types(pd.DataFrame({'code': ['abcdefghij'], 'note': ['q']}), 'append')
+    assert types['code'].length == 16
+    assert executed == ['ALTER TABLE [t] ALTER COLUMN [code] NVARCHAR(16)']
+    assert BulkLoader(_conn('sqlite'), 't', False, 0).column_types(df, 'replace') == {}
+
+
+def test_other_databases_use_multi_insert(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+    df = pd.DataFrame({'a': [1, 2, 3]})
+    options = to_sql_options(engine, df, False)
+    assert options == {'method': 'multi', 'chunksize': 10000}
+    df.to_sql('t', engine, index=False, **options)
+    assert pd.read_sql('select * from t', engine)['a'].tolist() == [1, 2, 3]
+    engine.dispose()
+
+
+def test_upload_frames_appends_chunks(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+    pd.DataFrame({'a': [0]}).to_sql('t', engine, index=False)
+    chunks = (pd.DataFrame({'a': range(i, i+3)}, index=range(10+i, 13+i))
+              for i in (1, 4))
+    assert upload_frames(engine, chunks, 't', False, 'replace', 2) == 6
+    assert pd.read_sql('select * from t', engine)['a'].tolist() == [1, 2, 3, 4, 5, 6]
+    engine.dispose()
+
+
+@pytest.mark.parametrize('strategy', ['insert', 'sqlite', 'staging'])
+def test_strategies_append_and_rebuild_indexes(tmp_path, strategy):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+    df = pd.DataFrame({'a': range(5), 'b': list('abcde')})
+    assert upload_frames(engine, df, 't', False, 'replace', 2, strategy) == 5
+    with engine.begin() as conn:
+        conn.exec_driver_sql('create index ix_t_a on t(a)')
+    assert upload_frames(engine, iter([df, df]), 't', False, 'append', 2, strategy, True) == 10
+    assert pd.read_sql('select count(*) as n from t', engine)['n'][0] == 15
+    assert [ix['name'] for ix in sa.inspect(engine).get_indexes('t')] == ['ix_t_a']
+    assert not sa.inspect(engine).has_table('t_staging')
+    with engine.connect() as conn:
+        # synchronous=OFF is only used during the upload
+        assert conn.exec_driver_sql('PRAGMA synchronous').scalar() == 2
+    engine.dispose()
+
+
+def test_auto_strategy():
+    assert auto_strategy(SimpleNamespace(dialect=SimpleNamespace(
+        name='postgresql', driver='psycopg2'))) == 'copy'
+    assert auto_strategy(SimpleNamespace(dialect=SimpleNamespace(
+        name='sqlite', driver='pysqlite'))) == 'sqlite'
+    assert auto_strategy(SimpleNamespace(dialect=SimpleNamespace(
+        name='mssql', driver='pyodbc'))) == 'insert'
+    with pytest.raises(ValueError):
+        upload_frames(_conn('sqlite'), pd.DataFrame(), 't', False, 'fail', strategy='bcp')
+
+
+@pytest.mark.parametrize('strategy', ['insert', 'sqlite', 'staging'])
+def test_merge_updates_changed_and_inserts_new_rows(tmp_path, strategy):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+    df = pd.DataFrame({'id': [1, 2, 3], 'v': ['a', 'b', 'c']})
+    # a new table is created from the first upload
+    assert upload_frames(engine, df, 't', False, 'merge', 0, strategy, merge_keys=['id']) == 3
+    with engine.begin() as conn:
+        conn.exec_driver_sql('create unique index ux_t_id on t(id)')
+    changes = pd.DataFrame({'id': [3, 4], 'v': ['C', 'd']}, index=[7, 8])
+    assert upload_frames(engine, iter([df, changes]), 't', False, 'merge', 0, strategy,
+                         merge_keys=['id']) == 5
+    result = pd.read_sql('select * from t order by id', engine)
+    assert result.values.tolist() == [[1, 'a'], [2, 'b'], [3, 'C'], [4, 'd']]
+    assert sa.inspect(engine).get_table_names() == ['t']
+    with pytest.raises(ValueError):
+        upload_frames(engine, df, 't', False, 'merge', 0, strategy, merge_keys=['key'])
+    engine.dispose()
+
+
+def test_merge_statements():
+    from sqlalchemy.dialects import mssql, postgresql  # pylint: disable=import-outside-toplevel
+    assert split_keys(' id, code ,') == ['id', 'code']
+    assert merge_statement(postgresql.dialect(), 't', 's', ['id', 'v'], ['id']) == (
+        'INSERT INTO t (id, v) SELECT id, v FROM s WHERE true ON CONFLICT (id) '
+        'DO UPDATE SET v = excluded.v WHERE (t.v) IS DISTINCT FROM (excluded.v)')
+    assert merge_statement(mssql.dialect(), 't', 's', ['id', 'v'], ['id']) == (
+        'MERGE INTO t t USING s s ON (t.id = s.id) '
+        'WHEN MATCHED AND EXISTS (SELECT s.v EXCEPT SELECT t.v) THEN UPDATE SET t.v = s.v '
+        'WHEN NOT MATCHED THEN INSERT (id, v) VALUES (s.id, s.v);')
+    assert merge_statement(postgresql.dialect(), 't', 's', ['id'], ['id']).endswith('DO NOTHING')
+
+
+class _CopyCursor:
+    """Records the COPY statements like a psycopg2 cursor"""
+    def __init__(self):
+        self.copies = []
+
+    def copy_expert(self, sql, buffer):
+        self.copies.append((sql, buffer.read()))
+
+    def close(self):
+        pass
+
+
+def test_copy_rows_sends_text_format():
+    cursor = _CopyCursor()
+    conn = SimpleNamespace(
+        dialect=sa.create_engine('sqlite://').dialect,
+        connection=SimpleNamespace(dbapi_connection=SimpleNamespace(cursor=lambda: cursor)))
+    copy_rows(SimpleNamespace(name='my table', schema=None), conn, ['a', 'b'],
+              iter([(1, 'x\\y'), (2, None), (3, ''), (4, 'tab\there')]))
+    assert cursor.copies == [(
+        'COPY "my table" (a, b) FROM STDIN',
+        '1\tx\\\\y\n2\t\\N\n3\t\n4\ttab\\there\n')]
+
+
+@pytest.mark.skipif('DATANODES_TEST_POSTGRES_URL' not in os.environ,
+                    reason="no PostgreSQL to test against")
+def test_copy_into_postgres():
+    engine = sa.create_engine(os.environ['DATANODES_TEST_POSTGRES_URL'])
+    df = pd.DataFrame({'a': [1, 2, None], 'b': ['x', None, '']})
+    assert upload_frames(engine, df, 'datanodes_copy_test', False, 'replace', 0, 'copy') == 3
+    result = pd.read_sql('select * from datanodes_copy_test', engine)
+    assert result['b'].tolist() == ['x', None, '']
+    with engine.begin() as conn:
+        conn.exec_driver_sql('drop table datanodes_copy_test')
+    engine.dispose()
@@ -0,0 +1,56 @@
+"""Tests for the watermark store of the incremental fetch mode"""
+from datetime import datetime
+from decimal import Decimal
+
+import pandas as pd
+import sqlalchemy as sa
+
+from watermarks import WatermarkStore, column_max, is_null_safe  # pylint: disable=import-error
+
+
+QUERY = "select * from facts where :watermark is null or id > :watermark"
+
+
+def test_first_run_fetches_everything_then_only_newer_rows(tmp_path):
+    store = WatermarkStore(str(tmp_path / 'wm.json'))
+    engine = sa.create_engine('sqlite://')
+    with engine.begin() as conn:
+        conn.exec_driver_sql("create table facts (id int, v text)")
+        conn.exec_driver_sql("insert into facts values (1, 'a'), (2, 'b')")
+
+    def run(previous):
+        mark, previous = store.resume('k', previous)
+        delta = pd.read_sql(sa.text(QUERY), engine, params={'watermark': mark})
+        return delta, store.advance('k', previous, delta, 'id')
+
+    # no mark yet: the unset (NULL) mark fetches every row
+    delta, table = run(None)
+    assert len(delta) == 2 and store.get('k') == 2
+    with engine.begin() as conn:
+        conn.exec_driver_sql("insert into facts values (3, 'c')")
+    delta, table = run(table)
+    assert delta['id'].tolist() == [3]
+    assert table['id'].tolist() == [1, 2, 3]
+    # the rows were evicted: fetch everything instead of only the newer rows
+    delta, table = run(None)
+    assert table['id'].tolist() == [1, 2, 3]
+    assert WatermarkStore(store.path).get('k') == 3
+    engine.dispose()
+
+
+def test_marks_keep_their_types(tmp_path):
+    store = WatermarkStore(str(tmp_path / 'wm.json'))
+    for mark in [5, 2.5, 'x', datetime(2024, 1, 2, 3, 4, 5), Decimal('1.10')]:
+        store.put('k', mark)
+        assert store.get('k') == mark and type(store.get('k')) is type(mark)
+    store.clear()
+    assert store.get('k') is None
+    assert column_max(pd.DataFrame({'ts': pd.to_datetime(['2024-01-02'])}), 'ts') == \
+        datetime(2024, 1, 2)
+    assert column_max(pd.DataFrame({'id': [None]}, dtype=float), 'id') is None
+
+
+def test_null_safe_queries():
+    assert is_null_safe(QUERY, 'watermark')
+    assert is_null_safe("select * from t where ts > coalesce(:watermark, 0)", 'watermark')
+    assert not is_null_safe("select * from t where ts > :watermark", 'watermark')
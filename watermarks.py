@@ -0,0 +1,147 @@
+"""A persistent store of the high-water marks of the incremental query nodes,
+kept apart from the evictable result caches"""
+
+from datetime import date, datetime
+from decimal import Decimal
+import json
+import logging
+import os
+import re
+import threading
+from typing import Any, Optional
+
+import pandas as pd
+
+
+DEFAULT_WATERMARK_FILE = os.path.join(
+    os.environ.get('LOCALAPPDATA', os.path.join(os.path.expanduser('~'), '.cache')),
+    'PyFlowDataNodes', 'watermarks.json')
+
+
+def is_null_safe(statement: str, param: str) -> bool:
+    """Whether `statement` handles an unset (NULL) `:param` on the first run,
+    by testing it with IS NULL or replacing it with COALESCE"""
+    return re.search(rf"(?:\bcoalesce\s*\(\s*:{param}\b|:{param}\s+is\s+null\b)",
+                     statement, re.IGNORECASE) is not None
+
+
+def column_max(df: pd.DataFrame, column: str) -> Any:
+    """The maximum of a column as a python scalar (DBAPI drivers don't take
+    numpy types), None if the column has no values"""
+    mark = df[column].max() if len(df)>0 else None
+    if mark is None or pd.isna(mark):
+        return None
+    if isinstance(mark, pd.Timestamp):
+        return mark.to_pydatetime()
+    if hasattr(mark, 'item'):
+        return mark.item()
+    return mark
+
+
+def _encode(value: Any) -> dict:
+    if isinstance(value, datetime):
+        return {'datetime': value.isoformat()}
+    if isinstance(value, date):
+        return {'date': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'decimal': str(value)}
+    return {'value': value}
+
+
+def _decode(entry: dict) -> Any:
+    if 'datetime' in entry:
+        return datetime.fromisoformat(entry['datetime'])
+    if 'date' in entry:
+        return date.fromisoformat(entry['date'])
+    if 'decimal' in entry:
+        return Decimal(entry['decimal'])
+    return entry['value']
+
+
+class WatermarkStore:
+    """The last high-water mark of each incremental query in a JSON file
+
+    The accumulated rows live in a result cache, which may evict them: a mark
+    is only resumed from when its rows are still there"""
+
+    def __init__(self, path: str = DEFAULT_WATERMARK_FILE) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict[str, dict]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logging.getLogger('PyFlow.DataNodes').warning(
+                "Ignoring unreadable watermark file %s: %s", self.path, e)
+            return {}
+
+    def _save(self, marks: dict[str, dict]) -> None:
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf8') as f:
+            json.dump(marks, f)
+        os.replace(tmp_path, self.path)
+
+    def get(self, key: str) -> Any:
+        """The stored mark or None if there is none"""
+        with self._lock:
+            entry = self._load().get(key)
+        return None if entry is None else _decode(entry)
+
+    def put(self, key: str, mark: Any) -> None:
+        """Store the mark (failures are logged, not raised)"""
+        with self._lock:
+            marks = self._load()
+            marks[key] = _encode(mark)
+            try:
+                self._save(marks)
+            except (OSError, TypeError) as e:
+                logging.getLogger('PyFlow.DataNodes').warning(
+                    "Could not store the watermark in %s: %s", self.path, e)
+
+    def invalidate(self, key: str) -> None:
+        """Forget a single mark"""
+        with self._lock:
+            marks = self._load()
+            if marks.pop(key, None) is not None:
+                self._save(marks)
+
+    def clear(self) -> None:
+        """Forget all marks"""
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def resume(self, key: str, previous: Optional[pd.DataFrame]
+               ) -> tuple[Any, Optional[pd.DataFrame]]:
+        """The mark to bind and the rows to append to: (None, None) on the
+        first run or when the rows of the stored mark are gone, so that the
+        query fetches everything again instead of only the newer rows"""
+        mark = self.get(key)
+        if mark is None:
+            return None, None
+        if previous is None:
+            logging.getLogger('PyFlow.DataNodes').info(
+                "The stored rows of watermark %s are gone, fetching everything", mark)
+            return None, None
+        return mark, previous
+
+    def advance(self, key: str, previous: Optional[pd.DataFrame],
+                delta: Optional[pd.DataFrame], column: str) -> Optional[pd.DataFrame]:
+        """Append the newly fetched rows to the previous ones and store the
+        new mark, returns the combined rows"""
+        table = delta
+        if previous is not None and delta is not None:
+            table = previous if len(delta)==0 else pd.concat([previous, delta], ignore_index=True)
+        if table is not None:
+            mark = column_max(table, column)
+            if mark is not None:
+                self.put(key, mark)
+        return table
+
+
+WATERMARKS = WatermarkStore()